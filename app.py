@@ -1,18 +1,51 @@
 # app.py
 
+import asyncio
+import hmac
+import ipaddress
+import threading
 import uvicorn
 import os
 import logging
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode
 from fastapi import FastAPI, WebSocket, Request
-from fastapi.responses import Response
+from fastapi.responses import Response, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from twilio.twiml.voice_response import VoiceResponse, Start, Stream
 from services.media_stream_handler import handle_twilio_media
-from services.twilio_service import initiate_call
-from utils.google_credentials import setup_google_credentials_from_env
-setup_google_credentials_from_env()
+from services.twilio_service import initiate_call_async
+from services.session_warmer import session_warmer
+from services.dialer import start_campaign, get_campaign, load_customer_numbers
+from services.customer_directory import customer_directory
+from services.call_metrics import get_timeline, render_metrics
+from services.call_registry import call_registry
+from services.call_events import call_events
+from services.twiml import voice_twiml, overflow_twiml
+from services.admission import admission
+from services.diagnostics import loop_monitor, profiler, collapsed
+from services.prompt_audio import prompt_audio, greeting_text, PROMPTS
+from services import startup
+from services.logs import setup_logging
+from prometheus_client import CONTENT_TYPE_LATEST
+from config import (
+    DIAL_CONCURRENCY, DIAL_CALLS_PER_SECOND, TWILIO_STREAM_MODE, VOICE_GREETING, PUBLIC_URL,
+    ADMISSION_CALLBACK_DELAY_S, ADMIN_TOKEN,
+)
+
+
+# Before anything logs: lines go through a queue to a writer thread, never straight to stdout
+setup_logging()
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Credentials, clients, data and Gemini pre-warm; timings are logged and on /metrics
+    await startup.initialise()
+    yield
+    await startup.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Optional: Enable CORS for development or frontend integration
 app.add_middleware(
@@ -24,6 +57,12 @@ app.add_middleware(
 )
 
 
+def prewarm(call_sid, customer, **fields):
+    """Warm a Gemini session here and note in the registry which worker holds it."""
+    session_warmer.prewarm(call_sid, customer)
+    call_registry.update_soon(call_sid, warm_worker=call_registry.worker_id, **fields)
+
+
 @app.get("/")
 async def root():
     return {"message": "🚗 Car Service Voice Agent is running!"}
@@ -37,9 +76,86 @@ async def call_customer(request: Request):
     if not to_number:
         return {"error": "Missing 'to' number"}
 
-    result = initiate_call(to_number)
+    # At capacity: say so now rather than squeeze another call onto a full process
+    reservation = admission.admit("outbound")
+    if reservation is None:
+        return JSONResponse(status_code=429, headers={"Retry-After": "10"},
+                            content={"error": "At call capacity, try again shortly", "reason": admission.refusal()})
+    try:
+        result = await initiate_call_async(to_number)
+    except Exception:
+        admission.release(reservation)
+        raise
+    admission.bind(reservation, result.sid)
+    # Open the Gemini session while the phone rings
+    prewarm(result.sid, customer_directory.lookup(to_number), to=to_number)
     return {"status": "Call initiated", "sid": result.sid}
 
+# ✅ Route: Dial many customers (service reminder campaigns)
+@app.post("/calls/batch")
+async def call_batch(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return JSONResponse(status_code=400, content={"error": "Body must be a JSON object"})
+    numbers = data.get("to", [])
+    if not isinstance(numbers, list) or not all(isinstance(n, str) and n.strip() for n in numbers):
+        return JSONResponse(status_code=400, content={"error": "'to' must be a list of phone numbers"})
+    if not isinstance(data.get("customer_ids", []), list):
+        return JSONResponse(status_code=400, content={"error": "'customer_ids' must be a list"})
+    try:
+        concurrency = int(data.get("concurrency", DIAL_CONCURRENCY))
+        calls_per_second = float(data.get("calls_per_second", DIAL_CALLS_PER_SECOND))
+    except (TypeError, ValueError):
+        return JSONResponse(status_code=400, content={"error": "'concurrency' and 'calls_per_second' must be numbers"})
+    if concurrency <= 0 or not 0 < calls_per_second < float("inf"):
+        return JSONResponse(status_code=400, content={"error": "'concurrency' and 'calls_per_second' must be positive"})
+    targets = [{"to": number.strip()} for number in numbers]
+    missing = []
+    if data.get("customer_ids"):
+        customer_targets, missing = load_customer_numbers(data["customer_ids"])
+        targets.extend(customer_targets)
+    if not targets:
+        return JSONResponse(status_code=400, content={"error": "Provide 'to' numbers or 'customer_ids'"})
+
+    campaign = start_campaign(
+        targets,
+        concurrency=concurrency,
+        calls_per_second=calls_per_second,
+        on_initiated=lambda sid, to: prewarm(sid, customer_directory.lookup(to), to=to),
+    )
+    return {"status": "Campaign started", "campaign_id": campaign.id,
+            "total": len(targets), "unknown_customer_ids": missing}
+
+
+@app.get("/calls/batch/{campaign_id}")
+async def call_batch_status(campaign_id: str):
+    campaign = get_campaign(campaign_id)
+    if campaign is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown campaign"})
+    return campaign.summary()
+
+
+# ✅ Route: Prometheus scrape endpoint (latency histograms, active calls, queue depths, audio bytes)
+@app.get("/metrics")
+async def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+# ✅ Route: Timeline of one call (live or recently finished), to see where a slow turn went
+@app.get("/calls/{call_sid}/timeline")
+async def call_timeline(call_sid: str):
+    timeline = get_timeline(call_sid)
+    if timeline is not None:
+        return timeline.to_dict()
+    # Owned by another worker: its final snapshot, or where the call is while it's live
+    record = await call_registry.get(call_sid)
+    if record is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown call"})
+    return record.pop("timeline", None) or {"call_sid": call_sid, "active": True, **record}
+
 # ✅ Route: Twilio webhook to respond with <Start><Stream>
 # @app.post("/voice")
 # async def voice():
@@ -57,51 +173,135 @@ async def call_customer(request: Request):
 #     return Response(content=str(response), media_type="application/xml")
 
 @app.post("/voice")
-async def voice():
-    response = VoiceResponse()
-    response.say("Connecting you to the car service assistant.", voice="Polly.Joanna")
-
-    # Define the URLs explicitly and strip any potential whitespace
-    websocket_url = "wss://testcarbooking-env.up.railway.app/twilio-audio"
-    callback_url = "https://testcarbooking-env.up.railway.app/twilio-callback"
-
-    stream = Start().stream(
-        url=websocket_url.strip(),  # Strip whitespace from WebSocket URL
-        track="inbound_track",
-        status_callback=callback_url.strip(),  # Strip whitespace from callback URL
-        status_callback_event="start error end"
-    )
-    print("➡️ Adding Stream tag")
-    response.append(stream)
-
-    xml_str = str(response)
-    print("🛰️ XML sent to Twilio:\n", xml_str)
+async def voice(request: Request):
+    # Start the Gemini Live handshake now so it overlaps the greeting below
+    form_data = await request.form()
+    # For calls we placed, the customer is the "To" side
+    outbound = form_data.get("Direction", "").startswith("outbound")
+    customer_phone = form_data.get("To") if outbound else form_data.get("From")
+    customer_id = request.query_params.get("customer_id")
+    customer = (customer_directory.get(customer_id) if customer_id else None) \
+        or customer_directory.lookup(customer_phone)
+    # Calls we dialed were admitted then, on whichever worker dialed them; anyone else needs room
+    # now, or gets the overflow treatment
+    if not outbound and admission.admit("inbound", form_data.get("CallSid")) is None:
+        return Response(content=overflow(request, customer_phone, customer), media_type="application/xml")
+    prewarm(form_data.get("CallSid"), customer, status="answered")
+
+    # With the greeting clip cached, the stream plays it the moment it connects instead of
+    # Twilio's <Say> running first; a per-customer version renders now if it isn't cached yet
+    stream_greeting = bool(prompt_audio) and TWILIO_STREAM_MODE == "connect" and prompt_audio.has(PROMPTS["greeting"])
+    if stream_greeting:
+        prompt_audio.render_soon(greeting_text(customer))
+
+    # TwiML is pre-rendered; only the stream parameters are added per call
+    twiml = voice_twiml(greeting=None if stream_greeting else VOICE_GREETING).render({
+        "phone": customer_phone,
+        "customer_id": customer_id or (customer or {}).get("id"),
+        "campaign": request.query_params.get("campaign"),
+        "greeting": "stream" if stream_greeting else None,
+    })
+    return Response(content=twiml, media_type="application/xml")
+
+
+def overflow(request: Request, phone: str, customer: dict) -> bytes:
+    """Hold and retry /voice a few times; after that, promise a callback and queue it."""
+    hold_round = int(request.query_params.get("hold", 0))
+    if admission.overflow(hold_round) == "hold":
+        query = urlencode({**request.query_params, "hold": hold_round + 1})
+        return overflow_twiml("hold", f"{PUBLIC_URL}/voice?{query}")
+    if admission.request_callback(phone):
+        # A one-call campaign: it waits for capacity like any other dial
+        start_campaign([{"to": phone, "customer_id": (customer or {}).get("id")}], delay_s=ADMISSION_CALLBACK_DELAY_S,
+                       on_initiated=lambda sid, to: prewarm(sid, customer, to=to))
+    return overflow_twiml("callback")
+
+
+# ✅ Route: Admission control state (live calls, reservations, loop lag, whether new calls are refused)
+@app.get("/admission")
+async def admission_status():
+    return admission.stats()
+
+
+def _is_local(request: Request) -> bool:
+    """A client on this machine talking to us directly, not through a proxy."""
+    if request.client is None or "x-forwarded-for" in request.headers:
+        return False
+    try:
+        return ipaddress.ip_address(request.client.host).is_loopback
+    except ValueError:
+        return False
+
+
+def admin_denied(request: Request):
+    """
+    401 unless the request carries ADMIN_TOKEN (Bearer header or ?token=).
+    With no token configured only local, unproxied clients get in: these
+    routes sit on the same public URL Twilio calls.
+    """
+    if not ADMIN_TOKEN:
+        if _is_local(request):
+            return None
+        return JSONResponse(status_code=403, content={"error": "Set ADMIN_TOKEN to use /admin remotely"})
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip() \
+        or request.query_params.get("token", "")
+    if hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        return None
+    return JSONResponse(status_code=401, content={"error": "Admin token required"})
+
+
+# ✅ Route: Event-loop health: lag over the last minute and the slowest recent callbacks, by task and call
+@app.get("/admin/loop")
+async def admin_loop(request: Request):
+    return admin_denied(request) or loop_monitor.stats()
+
+
+# ✅ Route: Sample this worker's event loop for a few seconds; flamegraph-ready stacks
+# (collapsed: `curl .../admin/profile?seconds=10 > out.folded`, then flamegraph.pl or speedscope)
+@app.get("/admin/profile")
+async def admin_profile(request: Request, seconds: float = 10, hz: float = 100, format: str = "collapsed",
+                        per_call: bool = True):
+    denied = admin_denied(request)
+    if denied:
+        return denied
+    if profiler.busy:
+        return JSONResponse(status_code=409, content={"error": "A profile is already running"})
+    if not 0 < seconds or not 0 < hz <= 1000 or format not in ("collapsed", "json"):
+        return JSONResponse(status_code=400, content={"error": "Need seconds > 0, 0 < hz <= 1000, "
+                                                               "format collapsed or json"})
+    # The sampler thread watches this thread: the one running the event loop
+    try:
+        stacks, samples = await asyncio.to_thread(profiler.run, asyncio.get_running_loop(), threading.get_ident(),
+                                                  seconds, hz, per_call)
+    except RuntimeError as e:  # another request started one first
+        return JSONResponse(status_code=409, content={"error": str(e)})
+    if format == "json":
+        return {"samples": samples, "hz": hz,
+                "stacks": [{"stack": stack.split(";"), "count": count} for stack, count in stacks.most_common()]}
+    return Response(content=collapsed(stacks), media_type="text/plain")
 
-    return Response(content=xml_str, media_type="application/xml")
 
 # ✅ Route: Twilio status callback for Media Streams
 @app.post("/twilio-callback")
 async def twilio_callback(request: Request):
-    form_data = await request.form()
-    logging.info("🔔 Received Twilio Status Callback!")
-    logging.info("Callback Data: %s", dict(form_data))
-    
-    stream_status = form_data.get("StreamStatus")
-    if stream_status == "error":
-        error_code = form_data.get("ErrorCode")
-        error_message = form_data.get("ErrorMessage")
-        logging.error(f"❌ Twilio Stream Error: Code={error_code}, Message={error_message}")
-        # THIS IS THE ERROR MESSAGE YOU NEED TO SEE!
-    elif stream_status == "started":
-        logging.info("✅ Twilio Stream reported as STARTED.")
-    elif stream_status == "stopped":
-        logging.info("🛑 Twilio Stream reported as STOPPED.")
-    else:
-        logging.info(f"ℹ️ Twilio Stream status: {stream_status}")
-
+    # Acked at once: campaign bursts send thousands of these; call_events parses and stores them in batches
+    call_events.submit(await request.body())
     return Response(content="", media_type="text/plain")
 
 
+# ✅ Route: Lifecycle of one call from Twilio's status callbacks (ringing, answered, stream start delay, ...)
+@app.get("/calls/{call_sid}/status")
+async def call_status(call_sid: str):
+    state = call_events.get(call_sid)
+    if state is not None:
+        return state.to_dict()
+    # The callbacks went to another worker: the lifecycle fields it merged into the registry
+    record = await call_registry.get(call_sid)
+    if record is None or "lifecycle" not in record:
+        return JSONResponse(status_code=404, content={"error": "Unknown call"})
+    return {"call_sid": call_sid, "state": record["lifecycle"],
+            "at": {k[3:]: v for k, v in record.items() if k.startswith("at_")}}
+
 
 # # ✅ WebSocket route for real-time audio from Twilio
 # @app.websocket("/twilio-audio")
@@ -110,13 +310,11 @@ async def twilio_callback(request: Request):
 #     await handle_twilio_media(websocket)
 @app.websocket("/twilio-audio")
 async def twilio_audio_stream(websocket: WebSocket):
-    print("🎧 Incoming WebSocket connection from Twilio")
     try:
         await websocket.accept()
-        print("✅ WebSocket accepted")
         await handle_twilio_media(websocket)
-    except Exception as e:
-        print("❌ WebSocket Error:", e)
+    except Exception:
+        logging.exception("❌ WebSocket error")
 
 # Run the FastAPI app
 if __name__ == "__main__":
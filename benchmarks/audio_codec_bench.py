@@ -0,0 +1,62 @@
+# benchmarks/audio_codec_bench.py
+#
+# Per-frame CPU cost of the media bridge transcoding path.
+# Run from the repo root:  python -m benchmarks.audio_codec_bench
+
+import time
+import numpy as np
+from services.audio_codec import (
+    InboundTranscoder,
+    OutboundTranscoder,
+    TWILIO_FRAME_BYTES,
+    GEMINI_OUTPUT_RATE,
+    FRAME_MS,
+)
+
+FRAMES = 5000
+
+
+def bench(name, convert, frame):
+    for _ in range(100):  # warm-up
+        convert(frame)
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        convert(frame)
+    per_frame_us = (time.perf_counter() - start) / FRAMES * 1e6
+    # Each call converts 50 frames/s per direction
+    load = per_frame_us * 50 / 1e6 * 100
+    print(f"{name:<28} {per_frame_us:8.1f} µs/frame   {load:6.3f}% of one core per call")
+
+
+def main():
+    rng = np.random.default_rng(0)
+    ulaw_frame = rng.integers(0, 256, TWILIO_FRAME_BYTES, dtype=np.uint8).tobytes()
+    pcm_samples = GEMINI_OUTPUT_RATE * FRAME_MS // 1000
+    pcm_frame = rng.integers(-8000, 8000, pcm_samples, dtype=np.int16).tobytes()
+
+    print(f"{FRAMES} frames of {FRAME_MS} ms each")
+    bench("inbound  8k µ-law → 16k PCM", InboundTranscoder().convert, ulaw_frame)
+    bench("outbound 24k PCM → 8k µ-law", OutboundTranscoder().convert, pcm_frame)
+
+    try:
+        import audioop  # removed in Python 3.13
+    except ImportError:
+        return
+
+    state = [None, None]
+
+    def audioop_inbound(frame):
+        pcm = audioop.ulaw2lin(frame, 2)
+        out, state[0] = audioop.ratecv(pcm, 2, 1, 8000, 16000, state[0])
+        return out
+
+    def audioop_outbound(frame):
+        out, state[1] = audioop.ratecv(frame, 2, 1, 24000, 8000, state[1])
+        return audioop.lin2ulaw(out, 2)
+
+    bench("audioop inbound (reference)", audioop_inbound, ulaw_frame)
+    bench("audioop outbound (reference)", audioop_outbound, pcm_frame)
+
+
+if __name__ == "__main__":
+    main()
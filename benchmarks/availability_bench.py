@@ -0,0 +1,54 @@
+# benchmarks/availability_bench.py
+#
+# Latency of "next N free slots after T" on a busy booking book.
+# Run from the repo root:  python -m benchmarks.availability_bench
+
+import asyncio
+import datetime
+import os
+import random
+import tempfile
+import time
+from services.booking_service import BookingStore, BookingConflict
+from services.availability import AvailabilityEngine
+
+WORKSHOPS = {f"ws-{i}": {"bays": 6, "open": "08:00", "close": "20:00"} for i in range(20)}
+DAYS = 14
+QUERIES = 20000
+
+
+async def main():
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BookingStore(os.path.join(tmp, "bookings.jsonl"))
+        await store.start()
+        engine = AvailabilityEngine(store, WORKSHOPS)
+
+        today = datetime.date(2026, 1, 12)
+        booked = 0
+        for _ in range(15000):
+            day = today + datetime.timedelta(days=random.randrange(DAYS))
+            minutes = random.randrange(8 * 60, 19 * 60, 30)
+            try:
+                await engine.book("+919800000000", f"ws-{random.randrange(20)}", day.isoformat(),
+                                  f"{minutes // 60:02d}:{minutes % 60:02d}",
+                                  random.choice(["Oil Change", "Full Service", "General Checkup"]))
+                booked += 1
+            except BookingConflict:
+                pass
+        print(f"{booked} bookings across {len(WORKSHOPS)} workshops × {DAYS} days")
+
+        after = datetime.datetime(2026, 1, 12, 9, 0)
+        samples = []
+        for i in range(QUERIES):
+            start = time.perf_counter()
+            engine.next_free_slots(f"ws-{i % 20}", after, random.choice(["Oil Change", "Full Service"]), n=3)
+            samples.append((time.perf_counter() - start) * 1e6)
+        samples.sort()
+        print(f"next 3 free slots: p50 {samples[len(samples) // 2]:.1f} µs, "
+              f"p99 {samples[int(len(samples) * 0.99)]:.1f} µs, max {samples[-1]:.1f} µs")
+        await store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
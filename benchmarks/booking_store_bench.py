@@ -0,0 +1,62 @@
+# benchmarks/booking_store_bench.py
+#
+# Bookings/sec with many concurrent writers (one per simulated call), plus a
+# same-slot race to confirm only one reservation wins.
+# Run from the repo root:  python -m benchmarks.booking_store_bench
+
+import asyncio
+import os
+import tempfile
+import time
+from services.booking_service import BookingStore, BookingConflict
+
+WRITERS = 200
+BOOKINGS_PER_WRITER = 25
+
+
+async def writer(store, writer_id):
+    for i in range(BOOKINGS_PER_WRITER):
+        # Distinct bay per writer, distinct 30 min slot per booking
+        minutes = i * 30
+        await store.reserve(
+            phone=f"+9190000{writer_id:05d}",
+            workshop=f"ws-{writer_id % 10}",
+            date="2026-01-15",
+            start=f"{minutes // 60:02d}:{minutes % 60:02d}",
+            bay=writer_id,
+        )
+
+
+async def race(store, contenders=50):
+    results = await asyncio.gather(*(
+        store.reserve(phone=f"+9191111{n:05d}", workshop="race", date="2026-01-16", start="10:00")
+        for n in range(contenders)
+    ), return_exceptions=True)
+    won = sum(1 for r in results if isinstance(r, dict))
+    conflicts = sum(1 for r in results if isinstance(r, BookingConflict))
+    print(f"same-slot race: {contenders} callers → {won} booked, {conflicts} conflicts")
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BookingStore(os.path.join(tmp, "bookings.jsonl"))
+        await store.start()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(writer(store, w) for w in range(WRITERS)))
+        elapsed = time.perf_counter() - start
+        total = WRITERS * BOOKINGS_PER_WRITER
+        print(f"{total} durable bookings from {WRITERS} concurrent writers in {elapsed:.2f} s "
+              f"→ {total / elapsed:,.0f} bookings/s, {store.commits} fsync'd commits "
+              f"({total / max(store.commits, 1):.0f} bookings per commit)")
+
+        await race(store)
+        await store.close()
+
+        reloaded = BookingStore(store.path)
+        reloaded.load()
+        print(f"journal replay: {len(reloaded.bookings)} bookings")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,173 @@
+# benchmarks/call_memory_bench.py
+#
+# How much memory does a live call cost, and does it depend on how much
+# Gemini says at once? Simulates N calls on one event loop with the real
+# per-call audio path: a Twilio media message every 20 ms through the
+# parser, VAD, resampler and inbound pipeline, and a Gemini answer of
+# `burst` seconds delivered as fast as the handler reads it (24 kHz PCM
+# in 100 ms chunks) through the outbound transcoder and scheduler, paced
+# out to a null websocket. For each answer length (in its own process)
+# reports RSS per call at setup and at the end (the shared answer itself
+# included), Python heap per call at setup
+# (tracemalloc), how much audio is queued and how long the Gemini reader
+# was held back; then, for one call, heap growth per 20 ms frame.
+# Run from the repo root:  python -m benchmarks.call_memory_bench [calls] [seconds]
+
+import asyncio
+import base64
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from services.audio_codec import TWILIO_FRAME_BYTES, pcm16_to_ulaw
+from services.call_context import CallContext, planned_call_bytes
+from services.inbound_pipeline import InboundAudioPipeline
+from services.outbound_scheduler import OutboundAudioScheduler
+from services.vad import VoiceActivityGate
+
+FRAME_S = 0.02
+GEMINI_CHUNK = 2400 * 2  # 100 ms of 24 kHz PCM16
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:  # not Linux: the high-water mark will have to do
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class NullWebSocket:
+    async def send_text(self, text):
+        pass
+
+
+def media_messages(count: int):
+    t = np.arange(count * TWILIO_FRAME_BYTES) / 8000
+    pcm = (np.sin(2 * np.pi * 180 * t) * 4000 * (np.sin(2 * np.pi * 0.5 * t) > 0)).astype(np.int16)
+    return [json.dumps({"event": "media", "sequenceNumber": str(i), "streamSid": "MZ1",
+                        "media": {"track": "inbound", "chunk": str(i), "timestamp": str(i * 20),
+                                  "payload": base64.b64encode(pcm16_to_ulaw(frame)).decode("ascii")}})
+            for i, frame in enumerate(pcm.reshape(count, TWILIO_FRAME_BYTES))]
+
+
+def gemini_answer(seconds: float) -> bytes:
+    t = np.arange(int(seconds * 24000)) / 24000
+    return (np.sin(2 * np.pi * 220 * t) * 6000).astype("<i2").tobytes()
+
+
+async def _discard(_):
+    pass
+
+
+def open_call(index: int):
+    call = CallContext(f"CA{index:032d}", "MZ1")
+    call.scheduler = OutboundAudioScheduler(NullWebSocket(), "MZ1")
+    call.pipeline = InboundAudioPipeline(_discard, send_signal=_discard)
+    return call, VoiceActivityGate()
+
+
+async def caller(call, vad, messages, start: float, ticks: int):
+    for tick in range(ticks):
+        await asyncio.sleep(max(0.0, start + tick * FRAME_S - time.monotonic()))
+        event, data = call.parser.parse(messages[tick % len(messages)])
+        for frame in vad.process(data)[1]:
+            call.pipeline.put(call.inbound.resample(frame))
+
+
+async def gemini(call, answer: bytes, waits: list, index: int):
+    """The handler's read loop; waits[index] is how long it has stopped reading so far."""
+    for offset in range(0, len(answer), GEMINI_CHUNK):
+        ulaw = call.outbound.convert(answer[offset:offset + GEMINI_CHUNK])
+        started = time.monotonic()
+        await call.scheduler.wait_for_room(len(ulaw))
+        waits[index] += time.monotonic() - started
+        call.scheduler.enqueue(ulaw)
+    call.scheduler.end_turn()
+
+
+async def run(calls: int, seconds: float, burst: float):
+    messages = media_messages(250)
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    opened = [open_call(i) for i in range(calls)]
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    rss_setup = rss_bytes() - rss_before
+    # Built after the calls: its freed temporaries would otherwise be reused for their buffers
+    answer = gemini_answer(burst)
+    tasks = [asyncio.create_task(call.scheduler.run()) for call, _ in opened]
+    tasks += [asyncio.create_task(call.pipeline.run()) for call, _ in opened]
+    waits = [0.0] * calls
+    start = time.monotonic() + 0.05
+    ticks = int(seconds / FRAME_S)
+    feeders = [asyncio.create_task(gemini(call, answer, waits, i)) for i, (call, _) in enumerate(opened)]
+    await asyncio.gather(*(caller(call, vad, messages, start, ticks) for call, vad in opened))
+    # Measured with the answer still being played out: as much as each call ever holds at once
+    rss = rss_bytes() - rss_before
+    queued = sum(call.scheduler.queued_frames for call, _ in opened) / calls
+    dropped = sum(call.scheduler.dropped_frames for call, _ in opened)
+    late = time.monotonic() - (start + seconds)
+    for task in tasks + feeders:
+        task.cancel()
+    await asyncio.gather(*tasks, *feeders, return_exceptions=True)
+    return rss_setup / calls, rss / calls, heap / calls, queued * FRAME_S, sum(waits) / calls, dropped, late
+
+
+async def per_frame(frames: int = 3000):
+    """Heap growth per frame for one call in steady state (both directions), unpaced."""
+    messages = media_messages(250)
+    call, vad = open_call(0)
+    call.scheduler.lead = float("inf")  # no pacing: each frame goes out as soon as it is queued
+    answer = gemini_answer(FRAME_S)
+    sender = asyncio.create_task(call.scheduler.run())
+    pipeline = asyncio.create_task(call.pipeline.run())
+
+    async def frames_through(count: int):
+        for tick in range(count):
+            event, data = call.parser.parse(messages[tick % len(messages)])
+            for frame in vad.process(data)[1]:
+                call.pipeline.put(call.inbound.resample(frame))
+            call.scheduler.enqueue(call.outbound.convert(answer))
+            await asyncio.sleep(0)
+
+    await frames_through(frames)  # warm up: lazily built buffers, interpreter free lists, ...
+    tracemalloc.start()
+    await frames_through(frames)
+    middle = tracemalloc.get_traced_memory()[0]
+    await frames_through(frames)
+    grown = tracemalloc.get_traced_memory()[0] - middle
+    tracemalloc.stop()
+    sender.cancel()
+    pipeline.cancel()
+    await asyncio.gather(sender, pipeline, return_exceptions=True)
+    return grown / frames, call.scheduler.queued_frames
+
+
+async def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    if len(sys.argv) > 3:
+        # One burst size per process, so RSS isn't flattered by memory freed in an earlier run
+        burst = float(sys.argv[3])
+        rss_setup, rss, heap, queued_s, held_back, dropped, late = await run(calls, seconds, burst)
+        print(f"Gemini answer {burst:3.0f} s   RSS/call {rss_setup / 1024:5.1f} KB at setup, {rss / 1024:5.1f} KB"
+              f" at end   heap/call {heap / 1024:5.1f} KB"
+              f"   queued {queued_s:4.1f} s   Gemini held back {held_back:4.1f} s   dropped {dropped}"
+              f"   loop behind {late:4.1f} s")
+        return
+    planned = planned_call_bytes()
+    print(f"{calls} simulated calls, {seconds:.0f} s; planned buffers per call: "
+          + ", ".join(f"{name} {size // 1024} KB" for name, size in planned.items()), flush=True)
+    for burst in (2, 10, 60):
+        await asyncio.to_thread(subprocess.run, [sys.executable, "-m", "benchmarks.call_memory_bench",
+                                                 str(calls), str(seconds), str(burst)], check=True)
+    grown, queued = await per_frame()
+    print(f"steady state, one call: heap grows {grown:.1f} bytes per frame ({queued} frames left queued)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
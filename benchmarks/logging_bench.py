@@ -0,0 +1,114 @@
+# benchmarks/logging_bench.py
+#
+# Does logging stall the audio? Simulates N calls on one event loop, each
+# logging a line per 20 ms frame, with stdout going to a pipe that drains
+# slower than it fills (a backed-up platform log collector). Reports how
+# late the 20 ms ticks fire with:
+#   off       no handler at all
+#   direct    a StreamHandler writing on the loop (what print() does)
+#   queued    services/logs: QueueHandler -> writer thread, every frame
+#   sampled   the same, with per-frame lines through log_sampled (1/s per call)
+# Run from the repo root:  python -m benchmarks.logging_bench [calls] [seconds]
+
+import asyncio
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import numpy as np
+from services.logs import (
+    CallContextFilter, DroppingQueueHandler, JsonFormatter, bind_call, log_sampled,
+)
+
+FRAME_S = 0.02
+PIPE_DRAIN_BYTES_PER_S = 200_000
+
+
+class SlowPipe:
+    """A pipe whose reader takes 200 kB/s, like a log shipper that can't keep up."""
+
+    def __init__(self):
+        self.read_fd, write_fd = os.pipe()
+        self.stream = os.fdopen(write_fd, "w", buffering=1, encoding="utf-8")
+        self._stop = False
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        while not self._stop:
+            if not os.read(self.read_fd, 4096):
+                return
+            time.sleep(4096 / PIPE_DRAIN_BYTES_PER_S)
+
+    def close(self):
+        self._stop = True
+        self.stream.close()
+
+
+def configure(mode: str, stream):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(logging.INFO)
+    if mode == "off":
+        root.setLevel(logging.CRITICAL)
+        return None, None
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    if mode == "direct":
+        output.addFilter(CallContextFilter())
+        root.addHandler(output)
+        return None, None
+    handler = DroppingQueueHandler(queue.Queue(maxsize=10000))
+    handler.addFilter(CallContextFilter())
+    root.addHandler(handler)
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    listener.start()
+    return handler, listener
+
+
+async def simulated_call(index: int, mode: str, start: float, ticks: int, lateness: list):
+    bind_call(f"CA{index:032d}", f"MZ{index:032d}")
+    for tick in range(ticks):
+        due = start + tick * FRAME_S
+        await asyncio.sleep(max(0.0, due - time.monotonic()))
+        lateness.append((time.monotonic() - due) * 1000)
+        if mode == "sampled":
+            log_sampled(logging.INFO, "frame", 1.0, "media frame", seq=tick, inbound_depth=3)
+        else:
+            logging.info("media frame", extra={"seq": tick, "inbound_depth": 3})
+
+
+async def run(mode: str, calls: int, seconds: float):
+    pipe = SlowPipe()
+    handler, listener = configure(mode, pipe.stream)
+    lateness = []
+    start = time.monotonic() + 0.05
+    await asyncio.gather(*(simulated_call(i, mode, start, int(seconds / FRAME_S), lateness) for i in range(calls)))
+    dropped = handler.dropped if handler else 0
+    configure("off", None)
+    if listener:
+        try:
+            listener.stop()
+        except queue.Full:
+            pass
+    pipe.close()
+    return np.percentile(lateness, 50), np.percentile(lateness, 99), max(lateness), dropped
+
+
+async def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(f"{calls} simulated calls, {seconds:.0f} s, one log line per 20 ms frame, "
+          f"stdout drained at {PIPE_DRAIN_BYTES_PER_S // 1000} kB/s")
+    for mode in ("off", "direct", "queued", "sampled"):
+        p50, p99, worst, dropped = await run(mode, calls, seconds)
+        print(f"logging {mode:<8} tick lateness p50 {p50:6.2f} ms  p99 {p99:7.2f} ms  max {worst:7.1f} ms"
+              f"   dropped lines {dropped}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
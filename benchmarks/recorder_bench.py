@@ -0,0 +1,72 @@
+# benchmarks/recorder_bench.py
+#
+# Does recording add jitter to live calls? Simulates N calls on one event
+# loop, each teeing a caller and an agent frame into services/call_recorder
+# every 20 ms, and reports how late the 20 ms ticks fire with recording off
+# vs on (WAV and FLAC), plus the per-frame cost on the loop.
+# Run from the repo root:  python -m benchmarks.recorder_bench [calls] [seconds]
+
+import asyncio
+import sys
+import tempfile
+import time
+import numpy as np
+from services.audio_codec import TWILIO_FRAME_BYTES, pcm16_to_ulaw
+from services.call_recorder import RecordingWriter, CallRecorder
+
+FRAME_S = 0.02
+
+
+def speech_like_frames(count: int):
+    t = np.arange(count * TWILIO_FRAME_BYTES) / 8000
+    pcm = (np.sin(2 * np.pi * 180 * t) * 4000 * (np.sin(2 * np.pi * 0.5 * t) > 0)).astype(np.int16)
+    return pcm.reshape(count, TWILIO_FRAME_BYTES)
+
+
+async def run(calls: int, seconds: float, fmt):
+    frames = speech_like_frames(250)
+    agent = [pcm16_to_ulaw(f) for f in frames]
+    with tempfile.TemporaryDirectory() as directory:
+        writer = RecordingWriter() if fmt else None
+        recorders = []
+        if writer:
+            for i in range(calls):
+                recorder = CallRecorder(f"CA{i:032d}", directory=directory, fmt=fmt)
+                with writer._lock:
+                    writer._recorders.append(recorder)
+                recorders.append(recorder)
+            writer.start()
+
+        lateness, tee_seconds = [], 0.0
+        start = time.monotonic()
+        for tick in range(int(seconds / FRAME_S)):
+            due = start + tick * FRAME_S
+            await asyncio.sleep(max(0.0, due - time.monotonic()))
+            lateness.append((time.monotonic() - due) * 1000)
+            began = time.perf_counter()
+            for recorder in recorders:
+                recorder.caller(frames[tick % len(frames)])
+                recorder.agent(agent[tick % len(agent)], due + 0.1)
+            tee_seconds += time.perf_counter() - began
+
+        if writer:
+            for recorder in recorders:
+                writer.finish(recorder)
+            writer.stop()
+        ticks = len(lateness)
+        tee_us = tee_seconds / max(ticks * calls * 2, 1) * 1e6 if recorders else 0.0
+        return np.percentile(lateness, 50), np.percentile(lateness, 99), max(lateness), tee_us
+
+
+async def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(f"{calls} simulated calls, {seconds:.0f} s, 20 ms ticks")
+    for fmt in (None, "wav", "flac"):
+        p50, p99, worst, tee_us = await run(calls, seconds, fmt)
+        print(f"recording {fmt or 'off':<5} tick lateness p50 {p50:5.2f} ms  p99 {p99:5.2f} ms  "
+              f"max {worst:6.2f} ms   tee {tee_us:5.2f} µs/frame on the loop")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
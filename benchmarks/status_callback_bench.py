@@ -0,0 +1,125 @@
+# benchmarks/status_callback_bench.py
+#
+# A campaign burst of Twilio status callbacks against /twilio-callback.
+# Compares the old handler (form parse, two log lines and an awaited
+# registry route per request) with the fast-ack one that hands the raw body
+# to services/call_events. Client and app share one event loop in-process,
+# so µs per callback is event-loop time taken away from live calls; the
+# consumer's batched work is reported separately.
+# Run from the repo root:  python -m benchmarks.status_callback_bench [callbacks] [concurrency]
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+import httpx
+import numpy as np
+from fastapi import FastAPI, Request, Response
+from services.call_events import CallEventIngest
+from services.call_registry import call_registry
+
+
+def empty_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/twilio-callback")
+    async def twilio_callback():
+        return Response(content="", media_type="text/plain")
+
+    return app
+
+
+def legacy_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/twilio-callback")
+    async def twilio_callback(request: Request):
+        form_data = await request.form()
+        logging.info("🔔 Received Twilio Status Callback!")
+        logging.info("Callback Data: %s", dict(form_data))
+        await call_registry.route(form_data.get("CallSid"), "stream_status",
+                                  {"status": form_data.get("StreamStatus"), "details": {}})
+        return Response(content="", media_type="text/plain")
+
+    return app
+
+
+def fast_ack_app(ingest: CallEventIngest) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/twilio-callback")
+    async def twilio_callback(request: Request):
+        ingest.submit(await request.body())
+        return Response(content="", media_type="text/plain")
+
+    return app
+
+
+def burst(count: int):
+    """Initiated/ringing/answered/completed for count/4 calls, interleaved like a dialer burst."""
+    calls = count // 4
+    for status in ("initiated", "ringing", "in-progress", "completed"):
+        for i in range(calls):
+            yield urlencode({"CallSid": f"CA{i:032x}", "CallStatus": status, "AccountSid": "AC" + "0" * 32,
+                             "From": "+15550000000", "To": f"+9198{i:08d}", "Direction": "outbound-api"})
+
+
+async def run(app: FastAPI, bodies: list, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    queue = iter(bodies)
+
+    async def client():
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            for body in queue:
+                began = time.perf_counter()
+                response = await http.post("/twilio-callback", content=body,
+                                           headers={"content-type": "application/x-www-form-urlencoded"})
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - began) * 1000)
+
+    began = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - began
+    return elapsed / len(bodies) * 1e6, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def report(name: str, result, baseline_us: float):
+    per_call_us, p50, p99 = result
+    print(f"{name:<9} {per_call_us:5.0f} µs of loop per callback ({per_call_us - baseline_us:4.0f} in the handler)  "
+          f"latency p50 {p50:5.2f} ms  p99 {p99:5.2f} ms")
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    bodies = list(burst(count))
+    # Logs go to a file, as they would in production, so the terminal doesn't set the pace
+    with tempfile.TemporaryDirectory() as directory:
+        logging.basicConfig(filename=os.path.join(directory, "bench.log"), level=logging.INFO, force=True)
+        print(f"{len(bodies)} callbacks, {concurrency} concurrent senders")
+
+        # The in-process HTTP client's own cost, to subtract
+        baseline_us = (await run(empty_app(), bodies, concurrency))[0]
+        report("legacy", await run(legacy_app(), bodies, concurrency), baseline_us)
+
+        # Consumer not started yet, so the request path is measured on its own
+        ingest = CallEventIngest(path=os.path.join(directory, "call_events.jsonl"))
+        report("fast ack", await run(fast_ack_app(ingest), bodies, concurrency), baseline_us)
+
+        began = time.perf_counter()
+        ingest.start()
+        while ingest.queue_depth:
+            await asyncio.sleep(0.005)
+        await ingest.close()
+        consumer_us = (time.perf_counter() - began) / len(bodies) * 1e6
+        summary = ingest.summary()
+        print(f"consumer  {consumer_us:6.0f} µs per callback in {summary['batches']} batches, "
+              f"journal included; calls by state {summary['by_state']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
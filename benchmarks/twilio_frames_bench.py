@@ -0,0 +1,70 @@
+# benchmarks/twilio_frames_bench.py
+#
+# Per-message CPU cost of parsing inbound Twilio media events and
+# serialising outbound ones: the json/base64 path vs services/twilio_frames.
+# Run from the repo root:  python -m benchmarks.twilio_frames_bench
+
+import base64
+import json
+import time
+import numpy as np
+from services.audio_codec import TWILIO_FRAME_BYTES, ulaw_to_pcm16
+from services.twilio_frames import MediaFrameParser, OutboundFrameEncoder, orjson
+
+MESSAGES = 50000
+STREAM_SID = "MZ" + "0" * 32
+
+
+def bench(name, fn, arg):
+    for _ in range(1000):  # warm-up
+        fn(arg)
+    start = time.perf_counter()
+    for _ in range(MESSAGES):
+        fn(arg)
+    per_msg_us = (time.perf_counter() - start) / MESSAGES * 1e6
+    # 50 messages/s per direction per call
+    print(f"{name:<34} {per_msg_us:7.2f} µs/msg   {per_msg_us * 50 / 1e4:6.4f}% of one core per call")
+    return per_msg_us
+
+
+def json_parse(text):
+    data = json.loads(text)
+    if data.get("event") == "media":
+        return ulaw_to_pcm16(base64.b64decode(data["media"]["payload"]))
+    return data
+
+
+def json_serialise(frame):
+    return json.dumps({
+        "event": "media",
+        "streamSid": STREAM_SID,
+        "media": {"payload": base64.b64encode(frame).decode("utf-8")},
+    })
+
+
+def main():
+    frame = np.random.default_rng(0).integers(0, 256, TWILIO_FRAME_BYTES, dtype=np.uint8).tobytes()
+    inbound = json.dumps({
+        "event": "media",
+        "sequenceNumber": "42",
+        "media": {"track": "inbound", "chunk": "41", "timestamp": "820",
+                  "payload": base64.b64encode(frame).decode("ascii")},
+        "streamSid": STREAM_SID,
+    }, separators=(",", ":"))  # Twilio's compact layout
+
+    parser = MediaFrameParser()
+    encoder = OutboundFrameEncoder(STREAM_SID)
+    assert np.array_equal(parser.parse(inbound)[1], json_parse(inbound))
+    assert json.loads(encoder.media(frame)) == json.loads(json_serialise(frame))
+
+    print(f"{MESSAGES} messages, orjson {'available' if orjson else 'not installed'}")
+    old = bench("inbound  json.loads + b64decode", json_parse, inbound)
+    new = bench("inbound  MediaFrameParser", parser.parse, inbound)
+    print(f"{'':34} {old / new:7.1f}x faster")
+    old = bench("outbound json.dumps + b64encode", json_serialise, frame)
+    new = bench("outbound OutboundFrameEncoder", encoder.media, frame)
+    print(f"{'':34} {old / new:7.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
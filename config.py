@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,3 +10,155 @@ TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-live-2.5-flash-preview-native-audio")
+
+# Outbound audio pacing: how far ahead of real time we send audio to Twilio
+OUTBOUND_LEAD_MS = int(os.getenv("OUTBOUND_LEAD_MS", "60"))
+OUTBOUND_BUFFER_MS = int(os.getenv("OUTBOUND_BUFFER_MS", "30000"))  # unsent agent audio held per call; Gemini waits past it
+
+# Barge-in: local speech detection on inbound audio while the agent is talking
+BARGE_IN_LOCAL_VAD = os.getenv("BARGE_IN_LOCAL_VAD", "true").lower() == "true"
+BARGE_IN_THRESHOLD_DBFS = float(os.getenv("BARGE_IN_THRESHOLD_DBFS", "-35"))
+BARGE_IN_MIN_SPEECH_MS = int(os.getenv("BARGE_IN_MIN_SPEECH_MS", "60"))
+
+# Inbound pipeline: Twilio reader → bounded queue → Gemini sender
+INBOUND_QUEUE_FRAMES = int(os.getenv("INBOUND_QUEUE_FRAMES", "50"))  # 1 s of 20 ms frames
+INBOUND_BATCH_MS = int(os.getenv("INBOUND_BATCH_MS", "40"))          # audio per Gemini send
+INBOUND_OVERFLOW_POLICY = os.getenv("INBOUND_OVERFLOW_POLICY", "drop_oldest")  # or "drop_newest"
+
+# Per-call memory: audio buffers are preallocated from the settings above (plus the recorder's backlog);
+# startup refuses settings that add up to more than this
+CALL_MEMORY_BUDGET_KB = int(os.getenv("CALL_MEMORY_BUDGET_KB", "1536"))
+
+# Gemini Live session pre-warming
+SESSION_WARM_TTL_S = float(os.getenv("SESSION_WARM_TTL_S", "60"))         # unclaimed per-call sessions
+SESSION_POOL_SIZE = int(os.getenv("SESSION_POOL_SIZE", "1"))              # idle ready sessions for bursts
+SESSION_POOL_MAX_AGE_S = float(os.getenv("SESSION_POOL_MAX_AGE_S", "300"))
+
+# Gemini Live resilience: a dropped session is resumed by handle and sent the caller audio it hadn't taken in
+LIVE_REPLAY_MS = int(os.getenv("LIVE_REPLAY_MS", "5000"))                    # caller audio kept per call for replay
+LIVE_RECONNECT_BASE_MS = float(os.getenv("LIVE_RECONNECT_BASE_MS", "50"))    # retry delay after a failed attempt, doubling
+LIVE_RECONNECT_MAX_DELAY_MS = float(os.getenv("LIVE_RECONNECT_MAX_DELAY_MS", "2000"))
+LIVE_RECONNECT_GIVE_UP_S = float(os.getenv("LIVE_RECONNECT_GIVE_UP_S", "20"))
+LIVE_CONNECT_TIMEOUT_S = float(os.getenv("LIVE_CONNECT_TIMEOUT_S", "5"))      # per attempt
+LIVE_RECONNECT_FILLER_MS = int(os.getenv("LIVE_RECONNECT_FILLER_MS", "300"))  # then a filler, if the caller hears nothing
+LIVE_LOST_GOODBYE_MAX_S = float(os.getenv("LIVE_LOST_GOODBYE_MAX_S", "10"))   # after giving up: apology playout, then hang up
+# Long calls: past the trigger Gemini slides its context window down to the target instead of ending the session
+LIVE_COMPRESSION_TRIGGER_TOKENS = int(os.getenv("LIVE_COMPRESSION_TRIGGER_TOKENS", "25600"))  # 0 turns it off
+LIVE_COMPRESSION_TARGET_TOKENS = int(os.getenv("LIVE_COMPRESSION_TARGET_TOKENS", "12800"))
+
+# Outbound campaign dialing (Twilio's default account limit is 1 call per second)
+DIAL_CONCURRENCY = int(os.getenv("DIAL_CONCURRENCY", "5"))
+DIAL_CALLS_PER_SECOND = float(os.getenv("DIAL_CALLS_PER_SECOND", "1"))
+CUSTOMER_DATA_PATH = os.getenv("CUSTOMER_DATA_PATH", "customer_data.json")
+
+# Customer directory
+DEFAULT_COUNTRY_CODE = os.getenv("DEFAULT_COUNTRY_CODE", "91")
+CUSTOMER_RELOAD_INTERVAL_S = float(os.getenv("CUSTOMER_RELOAD_INTERVAL_S", "5"))
+
+# Bookings: append-only JSON-lines journal with group commit
+BOOKINGS_PATH = os.getenv("BOOKINGS_PATH", "bookings_data.json")
+SLOT_MINUTES = int(os.getenv("SLOT_MINUTES", "30"))
+BOOKING_COMMIT_MAX_BATCH = int(os.getenv("BOOKING_COMMIT_MAX_BATCH", "512"))
+
+# Workshops and service durations used by the availability engine
+WORKSHOPS = json.loads(os.getenv("WORKSHOPS_JSON", json.dumps({
+    "main": {"bays": 4, "open": "09:00", "close": "18:00", "closed_weekdays": [6]},  # 6 = Sunday
+})))
+SERVICE_DURATIONS = json.loads(os.getenv("SERVICE_DURATIONS_JSON", json.dumps({
+    "Full Service": 180,
+    "Oil Change": 30,
+    "General Checkup": 60,
+})))
+DEFAULT_SERVICE_MINUTES = int(os.getenv("DEFAULT_SERVICE_MINUTES", "60"))
+
+# Gemini tool calls
+TOOL_TIMEOUT_S = float(os.getenv("TOOL_TIMEOUT_S", "3"))
+BUSINESS_TIMEZONE = os.getenv("BUSINESS_TIMEZONE", "Asia/Kolkata")
+DEFAULT_WORKSHOP = os.getenv("DEFAULT_WORKSHOP", next(iter(WORKSHOPS)))
+
+# Metrics: finished call timelines kept for /calls/{CallSid}/timeline
+CALL_TIMELINE_RETENTION = int(os.getenv("CALL_TIMELINE_RETENTION", "500"))
+
+# Inbound voice-activity gating before Gemini. These are defaults; a call can
+# override them with vad_* parameters on its Twilio <Stream>.
+VAD_MODE = os.getenv("VAD_MODE", "gate")                  # "gate", "thin" or "pass"
+VAD_THRESHOLD_DBFS = float(os.getenv("VAD_THRESHOLD_DBFS", "-45"))
+VAD_MAX_ZCR = float(os.getenv("VAD_MAX_ZCR", "0.4"))      # zero crossings per sample; above is hiss/noise
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "40"))
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "300"))
+VAD_PREROLL_MS = int(os.getenv("VAD_PREROLL_MS", "200"))
+VAD_THIN_KEEP_EVERY = int(os.getenv("VAD_THIN_KEEP_EVERY", "5"))  # "thin": forward 1 in N silent frames
+# Send explicit activity start/end to Gemini and turn off its own speech detection
+VAD_ACTIVITY_SIGNALS = os.getenv("VAD_ACTIVITY_SIGNALS", "false").lower() == "true"
+
+# Twilio webhooks and media stream
+PUBLIC_URL = os.getenv("PUBLIC_URL", "https://testcarbooking-env.up.railway.app").rstrip("/")
+TWILIO_STREAM_MODE = os.getenv("TWILIO_STREAM_MODE", "connect")  # "connect" (two-way) or "start" (listen only)
+VOICE_GREETING = os.getenv("VOICE_GREETING", "Connecting you to the car service assistant.")
+
+# Startup: how long to spend pre-warming the Gemini connection and session pool
+STARTUP_PREWARM_TIMEOUT_S = float(os.getenv("STARTUP_PREWARM_TIMEOUT_S", "5"))
+
+# Call registry shared by workers/instances: memory://, sqlite:///path/calls.db or redis://host:6379/0
+CALL_REGISTRY_URL = os.getenv("CALL_REGISTRY_URL", "memory://")
+CALL_REGISTRY_TTL_S = float(os.getenv("CALL_REGISTRY_TTL_S", "7200"))
+
+# Call recordings (stereo: caller left, agent right) and JSONL transcripts, written off the event loop
+RECORDING_ENABLED = os.getenv("RECORDING_ENABLED", "true").lower() == "true"
+RECORDINGS_DIR = os.getenv("RECORDINGS_DIR", "recordings")
+RECORDING_FORMAT = os.getenv("RECORDING_FORMAT", "flac")             # "flac" or "wav"
+RECORDING_FLUSH_INTERVAL_S = float(os.getenv("RECORDING_FLUSH_INTERVAL_S", "1.0"))
+RECORDING_BUFFER_BYTES = int(os.getenv("RECORDING_BUFFER_BYTES", "1000000"))  # per call; ~30 s of backlog
+# Ask Gemini to transcribe both sides of the call into the transcript
+RECORDING_TRANSCRIPTS = os.getenv("RECORDING_TRANSCRIPTS", "true").lower() == "true"
+
+# Prompt audio: phrases spoken once by Gemini, cached as 20 ms µ-law frames (memory LRU + disk)
+PROMPT_AUDIO_ENABLED = os.getenv("PROMPT_AUDIO_ENABLED", "true").lower() == "true"
+PROMPT_CACHE_DIR = os.getenv("PROMPT_CACHE_DIR", "prompt_cache")
+PROMPT_CACHE_MAX_CLIPS = int(os.getenv("PROMPT_CACHE_MAX_CLIPS", "256"))
+PROMPT_CACHE_MAX_FILES = int(os.getenv("PROMPT_CACHE_MAX_FILES", "5000"))
+PROMPT_GREETING = os.getenv("PROMPT_GREETING", "Hi, thanks for calling the car service centre. How can I help?")
+PROMPT_GREETING_KNOWN = os.getenv("PROMPT_GREETING_KNOWN",
+                                  "Hi {name}, thanks for calling the car service centre. How can I help?")
+PROMPT_CHECKING = os.getenv("PROMPT_CHECKING", "One moment while I check availability.")
+PROMPT_ONE_MOMENT = os.getenv("PROMPT_ONE_MOMENT", "One moment please.")
+PROMPT_LIVE_LOST = os.getenv("PROMPT_LIVE_LOST", "Sorry, we're having technical trouble. "
+                             "Please call us back in a few minutes. Goodbye.")  # then the call is ended
+# Play a filler when a tool call has run this long with nothing else playing
+PROMPT_FILLER_DELAY_MS = int(os.getenv("PROMPT_FILLER_DELAY_MS", "700"))
+
+# Twilio status callbacks: acked at once, folded into per-call lifecycle state in batches
+CALL_EVENTS_PATH = os.getenv("CALL_EVENTS_PATH", "call_events.jsonl")  # journal; "" to keep none
+CALL_EVENTS_QUEUE_MAX = int(os.getenv("CALL_EVENTS_QUEUE_MAX", "100000"))
+CALL_EVENTS_BATCH_MAX = int(os.getenv("CALL_EVENTS_BATCH_MAX", "1000"))
+CALL_EVENTS_BATCH_WINDOW_MS = float(os.getenv("CALL_EVENTS_BATCH_WINDOW_MS", "50"))
+CALL_STATE_RETENTION = int(os.getenv("CALL_STATE_RETENTION", "20000"))  # most recent calls kept in memory
+
+# Admission control, per worker process: past any budget, new calls are turned away to protect live ones
+ADMISSION_MAX_CALLS = int(os.getenv("ADMISSION_MAX_CALLS", "40"))              # live streams + admitted, not yet streaming
+ADMISSION_MAX_LOOP_LAG_MS = float(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", "40"))  # smoothed event-loop lateness
+ADMISSION_MAX_SEND_STALL_MS = float(os.getenv("ADMISSION_MAX_SEND_STALL_MS", "200"))  # outbound audio waiting on a socket
+ADMISSION_RESERVATION_S = float(os.getenv("ADMISSION_RESERVATION_S", "60"))    # slot held from admission to stream start
+ADMISSION_SAMPLE_INTERVAL_MS = float(os.getenv("ADMISSION_SAMPLE_INTERVAL_MS", "100"))  # how often queued dials re-check
+# What /voice does with a call it can't take: "hold" (pause, then retry) or "callback" (hang up, dial back later)
+ADMISSION_OVERFLOW = os.getenv("ADMISSION_OVERFLOW", "hold")
+ADMISSION_HOLD_SECONDS = int(os.getenv("ADMISSION_HOLD_SECONDS", "15"))
+ADMISSION_HOLD_ROUNDS = int(os.getenv("ADMISSION_HOLD_ROUNDS", "3"))           # holds before offering a callback
+ADMISSION_CALLBACK_DELAY_S = float(os.getenv("ADMISSION_CALLBACK_DELAY_S", "60"))
+OVERFLOW_HOLD_MESSAGE = os.getenv("OVERFLOW_HOLD_MESSAGE",
+                                  "All our assistants are busy right now. Please hold and we'll be with you shortly.")
+OVERFLOW_CALLBACK_MESSAGE = os.getenv("OVERFLOW_CALLBACK_MESSAGE",
+                                      "Sorry, we're still busy. We'll call you back in a few minutes. Goodbye.")
+
+# Logging: JSON lines (or "text") written by a background thread; the event loop never waits on stdout
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))   # lines waiting for the writer; beyond this they're dropped
+LOG_ACCESS = os.getenv("LOG_ACCESS", "true").lower() == "true"  # uvicorn's per-request access lines
+
+# Diagnostics: event-loop lag sampler, slow-callback attribution and the /admin/profile sampler
+LOOP_LAG_SAMPLE_MS = float(os.getenv("LOOP_LAG_SAMPLE_MS", "100"))
+LOOP_SLOW_CALLBACK_MS = float(os.getenv("LOOP_SLOW_CALLBACK_MS", "50"))   # 0 turns the callback timing off
+LOOP_SLOW_CALLBACK_HISTORY = int(os.getenv("LOOP_SLOW_CALLBACK_HISTORY", "100"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")   # /admin/* needs "Authorization: Bearer <token>"; unset: localhost only
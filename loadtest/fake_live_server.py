@@ -0,0 +1,256 @@
+# loadtest/fake_live_server.py
+#
+# Local stand-in for the Gemini Live (Vertex AI) websocket. Point the app at it
+# with GEMINI_LIVE_URL=ws://127.0.0.1:9100 and it will answer each caller
+# utterance with scripted audio after a configurable delay.
+#
+#   python -m loadtest.fake_live_server --port 9100 --latency-ms 400
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import random
+import time
+import uuid
+import numpy as np
+import websockets
+
+OUTPUT_RATE = 24000
+CHUNK_MS = 40  # Gemini streams its audio in small chunks
+CHECKPOINT_EVERY = 10  # client messages between session resumption updates
+MAX_HANDLES = 100000
+
+
+def tone(duration_ms: int, freq: float = 220.0) -> bytes:
+    """Speech-band test tone as 24 kHz PCM16."""
+    t = np.arange(OUTPUT_RATE * duration_ms // 1000) / OUTPUT_RATE
+    envelope = np.minimum(1, np.minimum(t, t[-1] - t) * 20)  # 50 ms fade in/out
+    return (np.sin(2 * np.pi * freq * t) * envelope * 6000).astype("<i2").tobytes()
+
+
+def _get(d: dict, *names):
+    """Wire messages use snake_case or camelCase keys depending on the SDK path."""
+    for name in names:
+        if name in d:
+            return d[name]
+    return None
+
+
+class FakeLiveServer:
+    """
+    Scripted Gemini Live stand-in.
+
+    Each session detects end of caller speech with a simple energy gate on
+    the 16 kHz input (speech followed by `silence_ms` of quiet), or takes
+    the client's activity_end / audio_stream_end as the end of the turn, waits
+    `latency_ms` (± jitter), then streams the next scripted reply. With
+    `drop_rate` > 0 it closes connections at random to exercise recovery.
+
+    Sessions are resumable like Live's: while no reply is in progress it
+    sends a sessionResumptionUpdate every few client messages (with
+    lastConsumedClientMessageIndex when the setup asked for transparent
+    resumption), and a setup carrying one of those handles continues from
+    that state. Audio sent after the handle must be replayed to be heard.
+    With `refuse_resume` it turns every resumption away instead, as if the
+    session were gone for good.
+    """
+
+    def __init__(self, script=None, latency_ms: float = 400, jitter_ms: float = 50,
+                 silence_ms: int = 400, threshold: float = 500.0, drop_rate: float = 0.0,
+                 refuse_resume: bool = False):
+        self.script = script or [{"reply_ms": 1500}]
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.silence_ms = silence_ms
+        self.threshold = threshold
+        self.drop_rate = drop_rate
+        self.refuse_resume = refuse_resume
+        self._audio_cache = {}
+        self.sessions = 0
+        self.active = 0
+        self.turns = 0
+        self.drops = 0
+        self.resumed = 0
+        self.refused = 0
+        self.recoveries_ms = []  # from a drop to the resuming setup
+        self._handles = {}       # handle -> session state it resumes
+        self._dropped_at = {}    # session lineage -> when its connection was dropped
+
+    def _reply_audio(self, turn: dict) -> bytes:
+        key = (turn.get("reply_ms", 1500), turn.get("freq", 220.0))
+        if key not in self._audio_cache:
+            self._audio_cache[key] = tone(*key)
+        return self._audio_cache[key]
+
+    async def handler(self, ws):
+        self.sessions += 1
+        self.active += 1
+        try:
+            setup = json.loads(await ws.recv())
+            if "setup" not in setup:
+                await ws.close(1002, "expected setup")
+                return
+            config = setup["setup"]
+            resumption = _get(config, "session_resumption", "sessionResumption") or {}
+            state = {"lineage": uuid.uuid4().hex, "turn_index": 0, "heard_speech": False, "quiet_ms": 0.0}
+            if resumption.get("handle"):
+                if self.refuse_resume:
+                    self.refused += 1
+                    await ws.close(1011, "fake resumption refused")
+                    return
+                if resumption["handle"] not in self._handles:
+                    await ws.close(1007, "unknown session resumption handle")
+                    return
+                state = dict(self._handles[resumption["handle"]])
+                self.resumed += 1
+                dropped_at = self._dropped_at.pop(state["lineage"], None)
+                if dropped_at is not None:
+                    self.recoveries_ms.append((time.monotonic() - dropped_at) * 1000)
+            await ws.send(json.dumps({"setupComplete": {}}))
+            transcribe = (_get(config, "input_audio_transcription", "inputAudioTranscription") is not None,
+                          _get(config, "output_audio_transcription", "outputAudioTranscription") is not None)
+            await self._session(ws, transcribe, state, bool(resumption.get("transparent")))
+        except websockets.ConnectionClosed:
+            pass
+        except Exception:
+            logging.exception("Fake Live session failed")
+            await ws.close(1011, "fake server error")
+        finally:
+            self.active -= 1
+
+    async def _session(self, ws, transcribe, state, transparent):
+        turn_index = state["turn_index"]
+        heard_speech = state["heard_speech"]
+        quiet_ms = state["quiet_ms"]
+        replying = None
+        received = 0  # client messages on this connection; the setup was 0
+
+        async for raw in ws:
+            message = json.loads(raw)
+            received += 1
+            if received % CHECKPOINT_EVERY == 0 and not (replying and not replying.done()):
+                # Like Live, only resumable between answers; the handle holds everything before this message
+                handle = uuid.uuid4().hex
+                self._handles[handle] = dict(state, turn_index=turn_index, heard_speech=heard_speech,
+                                             quiet_ms=quiet_ms)
+                if len(self._handles) > MAX_HANDLES:
+                    del self._handles[next(iter(self._handles))]
+                update = {"newHandle": handle, "resumable": True}
+                if transparent:
+                    update["lastConsumedClientMessageIndex"] = str(received - 1)
+                await ws.send(json.dumps({"sessionResumptionUpdate": update}))
+            content = _get(message, "client_content", "clientContent")
+            if content and _get(content, "turn_complete", "turnComplete"):
+                # A text turn (e.g. a prompt to speak): answer it like a spoken one
+                replying = self._start_reply(ws, turn_index, transcribe, state["lineage"])
+                turn_index += 1
+                continue
+            realtime = _get(message, "realtime_input", "realtimeInput")
+            if not realtime:
+                continue  # tool_response / context-only turns: nothing to script
+
+            if _get(realtime, "activity_start", "activityStart") is not None:
+                heard_speech = True
+                if replying and not replying.done():
+                    replying.cancel()
+                    await ws.send(json.dumps({"serverContent": {"interrupted": True}}))
+            if (_get(realtime, "activity_end", "activityEnd") is not None
+                    or _get(realtime, "audio_stream_end", "audioStreamEnd")):
+                # Client-side endpointing: answer now instead of waiting for our own silence timer
+                if heard_speech:
+                    heard_speech = False
+                    replying = self._start_reply(ws, turn_index, transcribe, state["lineage"])
+                    turn_index += 1
+                continue
+
+            blobs = []
+            audio = _get(realtime, "audio")
+            if audio:
+                blobs.append(audio)
+            blobs.extend(_get(realtime, "media_chunks", "mediaChunks") or [])
+            for blob in blobs:
+                # The SDK sends urlsafe base64; the public API also accepts the standard alphabet
+                pcm = np.frombuffer(base64.urlsafe_b64decode(blob["data"].replace("+", "-").replace("/", "_")),
+                                    dtype="<i2")
+                if len(pcm) == 0:
+                    continue
+                chunk_ms = len(pcm) / 16
+                if np.abs(pcm).mean() > self.threshold:
+                    heard_speech = True
+                    quiet_ms = 0.0
+                    if replying and not replying.done():
+                        # Caller talked over the reply: behave like Live's barge-in
+                        replying.cancel()
+                        await ws.send(json.dumps({"serverContent": {"interrupted": True}}))
+                elif heard_speech:
+                    quiet_ms += chunk_ms
+                    if quiet_ms >= self.silence_ms:
+                        heard_speech = False
+                        replying = self._start_reply(ws, turn_index, transcribe, state["lineage"])
+                        turn_index += 1
+
+    def _start_reply(self, ws, turn_index: int, transcribe, lineage: str):
+        return asyncio.create_task(self._reply(ws, self.script[turn_index % len(self.script)], turn_index,
+                                               *transcribe, lineage))
+
+    async def _reply(self, ws, turn: dict, turn_index: int, transcribe_in: bool, transcribe_out: bool,
+                     lineage: str):
+        if transcribe_in:
+            await ws.send(json.dumps({"serverContent": {"inputTranscription": {
+                "text": turn.get("caller_text", f"caller turn {turn_index + 1}")}}}))
+        latency = turn.get("latency_ms", self.latency_ms) + random.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(0.0, latency) / 1000)
+        if self.drop_rate and random.random() < self.drop_rate:
+            self.drops += 1
+            self._dropped_at[lineage] = time.monotonic()
+            await ws.close(1011, "fake upstream drop")
+            return
+        if transcribe_out:
+            await ws.send(json.dumps({"serverContent": {"outputTranscription": {
+                "text": turn.get("text", f"scripted reply {turn_index + 1}")}}}))
+        audio = self._reply_audio(turn)
+        chunk = OUTPUT_RATE * 2 * CHUNK_MS // 1000
+        for offset in range(0, len(audio), chunk):
+            part = base64.b64encode(audio[offset:offset + chunk]).decode("ascii")
+            await ws.send(json.dumps({"serverContent": {"modelTurn": {"parts": [
+                {"inlineData": {"mimeType": f"audio/pcm;rate={OUTPUT_RATE}", "data": part}}
+            ]}}}))
+            # Live generates faster than real time; yield so other sessions interleave
+            await asyncio.sleep(0)
+        await ws.send(json.dumps({"serverContent": {"turnComplete": True}}))
+        self.turns += 1
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9100):
+        return await websockets.serve(self.handler, host, port, max_size=None)
+
+
+def load_script(path):
+    if not path:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local Gemini Live stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="chance each reply drops the connection")
+    parser.add_argument("--refuse-resume", action="store_true", help="turn away every session resumption")
+    parser.add_argument("--script", help='JSON list of turns, e.g. [{"reply_ms": 1200, "latency_ms": 300}]')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeLiveServer(load_script(args.script), args.latency_ms, args.jitter_ms, drop_rate=args.drop_rate,
+                            refuse_resume=args.refuse_resume)
+    await server.serve(args.host, args.port)
+    logging.info("Fake Gemini Live listening on ws://%s:%d", args.host, args.port)
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+# loadtest/fake_redis.py
+#
+# Local stand-in for the Redis server behind CALL_REGISTRY_URL=redis://...
+# It speaks RESP but only the commands the call registry uses (HSET,
+# HGETALL, EXPIRE, DEL, RPUSH, BLPOP, PING, SELECT, AUTH), keeps
+# everything in memory and ignores expiry.
+#
+#   python -m loadtest.fake_redis --port 6390
+#   CALL_REGISTRY_URL=redis://127.0.0.1:6390 WEB_CONCURRENCY=2 python serve.py
+
+import argparse
+import asyncio
+import logging
+from collections import defaultdict, deque
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = defaultdict(dict)
+        self.lists = defaultdict(deque)
+        self._pushed = asyncio.Condition()
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, list):
+            return b"*%d\r\n" % len(value) + b"".join(FakeRedis._encode(v) for v in value)
+        data = value.encode("utf-8") if isinstance(value, str) else value
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+    @staticmethod
+    async def _read_command(reader):
+        header = await reader.readline()
+        if not header:
+            return None
+        if not header.startswith(b"*"):
+            raise ValueError(f"Expected a RESP array, got {header!r}")
+        args = []
+        for _ in range(int(header[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2].decode("utf-8"))
+        return args
+
+    async def execute(self, name, *args):
+        if name in ("PING", "SELECT", "AUTH"):
+            return b"+OK\r\n" if name != "PING" else b"+PONG\r\n"
+        if name == "HSET":
+            h = self.hashes[args[0]]
+            added = sum(1 for k in args[1::2] if k not in h)
+            h.update(zip(args[1::2], args[2::2]))
+            return added
+        if name == "HGETALL":
+            return [item for pair in self.hashes.get(args[0], {}).items() for item in pair]
+        if name == "EXPIRE":
+            return int(args[0] in self.hashes)
+        if name == "DEL":
+            return sum(1 for k in args if self.hashes.pop(k, None) is not None or self.lists.pop(k, None))
+        if name == "RPUSH":
+            self.lists[args[0]].extend(args[1:])
+            async with self._pushed:
+                self._pushed.notify_all()
+            return len(self.lists[args[0]])
+        if name == "BLPOP":
+            keys, timeout = args[:-1], float(args[-1])
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + (timeout or float("inf"))
+            async with self._pushed:
+                while True:
+                    for key in keys:
+                        if self.lists.get(key):
+                            return [key, self.lists[key].popleft()]
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        return b"*-1\r\n"
+                    try:
+                        await asyncio.wait_for(self._pushed.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+        return b"-ERR unknown command '%s'\r\n" % name.encode()
+
+    async def handle(self, reader, writer):
+        try:
+            while (command := await self._read_command(reader)) is not None:
+                reply = await self.execute(command[0].upper(), *command[1:])
+                writer.write(reply if isinstance(reply, bytes) else self._encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except Exception:
+            logging.exception("Fake Redis connection failed")
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 6390):
+        return await asyncio.start_server(self.handle, host, port)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local Redis stand-in for the call registry")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    server = await FakeRedis().serve(args.host, args.port)
+    print(f"🧪 Fake Redis on redis://{args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,216 @@
+# loadtest/run.py
+#
+# Offline load test: fake Twilio callers → the app → fake Gemini Live.
+# Starts the fake Live server in-process, starts the app under uvicorn with
+# GEMINI_LIVE_URL pointing at it (unless --url is given), then ramps the number
+# of concurrent calls and reports latency, playback starvation and server CPU.
+#
+#   python -m loadtest.run --calls 10,25,50,100 --duration 30
+#   python -m loadtest.run --url ws://my-host/twilio-audio --no-fake-live --calls 5
+#   python -m loadtest.run --calls 5 --drop-rate 1 --refuse-resume --live-give-up-s 3   # every call must be ended
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from loadtest.fake_live_server import FakeLiveServer, load_script
+from loadtest.twilio_caller import SimulatedCall, load_wav_frames, synthetic_utterance
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def process_cpu_seconds(pid: int):
+    """utime + stime of another process and its live children (serve.py workers) from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        total = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(c) for c in f.read().split()]
+    except (OSError, IndexError, ValueError):
+        return None
+    return total + sum(process_cpu_seconds(child) or 0 for child in children)
+
+
+def start_app(port: int, live_url: str, workdir: str, workers: int = 1, extra_env: dict = None):
+    env = dict(os.environ)
+    env.update(extra_env or {})
+    env.update({
+        "GEMINI_LIVE_URL": live_url,
+        "BOOKINGS_PATH": os.path.join(workdir, "bookings.jsonl"),
+        "RECORDINGS_DIR": os.path.join(workdir, "recordings"),
+        "PROMPT_CACHE_DIR": os.path.join(workdir, "prompt_cache"),
+        "CALL_EVENTS_PATH": os.path.join(workdir, "call_events.jsonl"),
+        "PYTHONUNBUFFERED": "1",
+    })
+    if workers > 1:
+        # SO_REUSEPORT workers sharing a SQLite call registry (unless one is configured)
+        env.setdefault("CALL_REGISTRY_URL", "sqlite:///" + os.path.join(workdir, "calls.db"))
+        command = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port),
+                   "--workers", str(workers), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+                   "--log-level", "warning"]
+    log = open(os.path.join(workdir, "app.log"), "wb")
+    proc = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"App exited during startup; see {log.name}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("App did not start within 30 s")
+
+
+async def run_level(url, calls, duration, utterance, phones, stagger_s):
+    sims = [SimulatedCall(url, utterance, phones[i % len(phones)] if phones else None) for i in range(calls)]
+
+    async def staggered(i, sim):
+        await asyncio.sleep(i * stagger_s)
+        await sim.run(duration)
+
+    await asyncio.gather(*(staggered(i, s) for i, s in enumerate(sims)))
+    return sims
+
+
+def summarise(calls, sims, elapsed, cpu_seconds):
+    latencies = [ms for s in sims for ms in s.response_latencies_ms]
+    lag = [ms for s in sims for ms in s.send_lag_ms]
+    frames = sum(s.frames_sent + s.frames_received for s in sims)
+    call_minutes = sum(1 for s in sims if not s.error) * elapsed / 60
+    row = {
+        "calls": calls,
+        "errors": sum(1 for s in sims if s.error),
+        "turns": len(latencies),
+        "unanswered": sum(s.unanswered_turns for s in sims),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "starve_per_min": sum(s.starvations for s in sims) / call_minutes if call_minutes else float("nan"),
+        "harness_lag_p99_ms": percentile(lag, 99) if lag else 0.0,
+        "cpu_us_per_frame": None,
+        "cpu_pct": None,
+    }
+    if cpu_seconds is not None and frames:
+        row["cpu_us_per_frame"] = cpu_seconds / frames * 1e6
+        row["cpu_pct"] = cpu_seconds / elapsed * 100
+    return row
+
+
+def print_row(row):
+    cpu = (f"{row['cpu_us_per_frame']:7.1f} µs/frame {row['cpu_pct']:5.1f}% cpu"
+           if row["cpu_us_per_frame"] is not None else "   cpu n/a")
+    print(f"{row['calls']:5d} calls | errors {row['errors']:3d} | turns {row['turns']:5d} "
+          f"(unanswered {row['unanswered']:3d}) | p50 {row['p50_ms']:7.0f} ms  p99 {row['p99_ms']:7.0f} ms | "
+          f"starvation {row['starve_per_min']:5.2f}/min | harness lag p99 {row['harness_lag_p99_ms']:5.1f} ms | {cpu}",
+          flush=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline call-capacity load test")
+    parser.add_argument("--calls", default="5,10,20,40", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per call at each level")
+    parser.add_argument("--url", help="existing /twilio-audio websocket URL (skips starting the app)")
+    parser.add_argument("--port", type=int, default=8765, help="port for the app under test")
+    parser.add_argument("--live-port", type=int, default=9100)
+    parser.add_argument("--workers", type=int, default=1, help="app worker processes (serve.py, SO_REUSEPORT)")
+    parser.add_argument("--no-fake-live", action="store_true", help="don't start the fake Live server")
+    parser.add_argument("--latency-ms", type=float, default=400, help="fake Live response delay")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fake Live random connection drops")
+    parser.add_argument("--refuse-resume", action="store_true",
+                        help="fake Live turns away every resumption; checks that the app ends each call")
+    parser.add_argument("--live-give-up-s", type=float, help="the app's LIVE_RECONNECT_GIVE_UP_S")
+    parser.add_argument("--script", help="fake Live reply script (JSON)")
+    parser.add_argument("--wav", help="16-bit PCM WAV to replay as the caller (default: synthetic)")
+    parser.add_argument("--phones", default="+911234567890,+919876543210", help="caller numbers to cycle through")
+    parser.add_argument("--p99-budget-ms", type=float, default=1500, help="max acceptable p99 response latency")
+    parser.add_argument("--max-starvation", type=float, default=1.0, help="max playback starvations per call-minute")
+    args = parser.parse_args()
+
+    utterance = load_wav_frames(args.wav) if args.wav else synthetic_utterance()
+    phones = [p for p in args.phones.split(",") if p]
+
+    fake = None
+    if not args.no_fake_live:
+        fake = FakeLiveServer(load_script(args.script), args.latency_ms, drop_rate=args.drop_rate,
+                              refuse_resume=args.refuse_resume)
+        server = await fake.serve(port=args.live_port)
+
+    proc = None
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    url = args.url
+    if url is None:
+        # In a thread: the fake Live server on this loop must answer the app's startup pre-warm
+        extra_env = {"LIVE_RECONNECT_GIVE_UP_S": str(args.live_give_up_s)} if args.live_give_up_s else None
+        proc = await asyncio.to_thread(start_app, args.port, f"ws://127.0.0.1:{args.live_port}", workdir,
+                                       args.workers, extra_env)
+        url = f"ws://127.0.0.1:{args.port}/twilio-audio"
+
+    capacity = 0
+    failed = False
+    try:
+        for calls in [int(c) for c in args.calls.split(",")]:
+            cpu_before = process_cpu_seconds(proc.pid) if proc else None
+            drops, resumed, recoveries = (fake.drops, fake.resumed, len(fake.recoveries_ms)) if fake else (0, 0, 0)
+            started = time.monotonic()
+            sims = await run_level(url, calls, args.duration, utterance, phones, stagger_s=0.02)
+            elapsed = time.monotonic() - started
+            cpu_after = process_cpu_seconds(proc.pid) if proc else None
+            cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+
+            row = summarise(calls, sims, elapsed, cpu)
+            print_row(row)
+            if fake and fake.drops > drops:
+                recovered = fake.recoveries_ms[recoveries:]
+                print(f"      fake Live dropped {fake.drops - drops} connections, {fake.resumed - resumed} resumed; "
+                      f"reconnect p50 {percentile(recovered, 50):.0f} ms  max "
+                      f"{max(recovered, default=float('nan')):.0f} ms", flush=True)
+            if args.refuse_resume:
+                # Every call has its Live session dropped for good: the app must hang up, not leave dead air
+                ended = [s.hung_up_at - started for s in sims if s.hung_up_at]
+                print(f"      app ended {len(ended)}/{calls} calls after their session was lost"
+                      f" (last at {max(ended, default=float('nan')):.1f} s)", flush=True)
+                if len(ended) < calls:
+                    failed = True
+                    break
+                continue
+            healthy = (row["errors"] == 0 and row["p99_ms"] <= args.p99_budget_ms
+                       and row["starve_per_min"] <= args.max_starvation)
+            if row["harness_lag_p99_ms"] > 20:
+                print("      ⚠️ load generator itself is falling behind; results at this level are pessimistic")
+            if not healthy:
+                break
+            capacity = calls
+            await asyncio.sleep(1)
+    finally:
+        if proc:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if fake:
+            server.close()
+
+    if args.refuse_resume:
+        print("\nFAILED: calls were left open on a lost Gemini session" if failed
+              else "\nOK: every call was ended once its Gemini session was lost")
+        sys.exit(1 if failed else 0)
+    print(f"\nEstimated capacity: {capacity} concurrent calls "
+          f"(p99 ≤ {args.p99_budget_ms:.0f} ms, starvation ≤ {args.max_starvation}/min). App log: {workdir}/app.log")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,189 @@
+# loadtest/twilio_caller.py
+#
+# Simulated Twilio Media Streams client: connects to /twilio-audio, replays an
+# utterance as paced 20 ms µ-law frames, behaves like Twilio's playback buffer
+# (echoes marks once audio has "played", honours clear) and records response
+# latency and playback starvation.
+
+import asyncio
+import base64
+import json
+import math
+import time
+import uuid
+import wave
+import numpy as np
+import websockets
+from services.audio_codec import (
+    StreamingResampler, pcm16_to_ulaw, TWILIO_SAMPLE_RATE, TWILIO_FRAME_BYTES, FRAME_MS,
+)
+
+FRAME_SECONDS = FRAME_MS / 1000
+ULAW_SILENCE_FRAME = b"\xff" * TWILIO_FRAME_BYTES
+
+
+def load_wav_frames(path: str):
+    """Read a mono/stereo PCM16 WAV file and return 20 ms µ-law frames at 8 kHz."""
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+        rate, channels = w.getframerate(), w.getnchannels()
+        samples = np.frombuffer(w.readframes(w.getnframes()), dtype="<i2")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if rate != TWILIO_SAMPLE_RATE:
+        g = math.gcd(rate, TWILIO_SAMPLE_RATE)
+        samples = StreamingResampler(TWILIO_SAMPLE_RATE // g, rate // g).process(samples)
+    return _frames(pcm16_to_ulaw(samples))
+
+
+def synthetic_utterance(duration_ms: int = 1200):
+    """Speech-like test signal (modulated harmonics) as µ-law frames."""
+    t = np.arange(TWILIO_SAMPLE_RATE * duration_ms // 1000) / TWILIO_SAMPLE_RATE
+    pitch = 140 + 30 * np.sin(2 * np.pi * 3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / TWILIO_SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = 0.55 + 0.45 * np.sin(2 * np.pi * 4 * t)
+    return _frames(pcm16_to_ulaw((voice * syllables * 7000).astype(np.int16)))
+
+
+def _frames(ulaw: bytes):
+    padded = ulaw + b"\xff" * (-len(ulaw) % TWILIO_FRAME_BYTES)
+    return [padded[i:i + TWILIO_FRAME_BYTES] for i in range(0, len(padded), TWILIO_FRAME_BYTES)]
+
+
+class SimulatedCall:
+    """One fake Twilio call: speak, wait for the agent to answer, repeat."""
+
+    def __init__(self, url: str, utterance, phone: str = None, reply_timeout_s: float = 8.0,
+                 pause_ms: int = 600):
+        self.url = url
+        self.utterance = utterance
+        self.phone = phone
+        self.reply_timeout_s = reply_timeout_s
+        self.pause_frames = pause_ms // FRAME_MS
+        self.call_sid = "CA" + uuid.uuid4().hex
+        self.stream_sid = "MZ" + uuid.uuid4().hex
+
+        self.response_latencies_ms = []
+        self.starvations = 0          # playback buffer ran dry in the middle of a reply
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.send_lag_ms = []         # how late our own 20 ms ticks fired (harness health)
+        self.unanswered_turns = 0
+        self.error = None
+        self.hung_up_at = None        # when the app ended the stream, if it did
+
+        self._utterance_end = None
+        self._reply_started = asyncio.Event()
+        self._reply_done = asyncio.Event()
+        self._playout_until = 0.0
+        self._in_reply = False
+
+    async def run(self, duration_s: float):
+        try:
+            async with websockets.connect(self.url, max_size=None) as ws:
+                receiver = asyncio.create_task(self._receive(ws))
+                try:
+                    await self._send_connected(ws)
+                    await self._talk(ws, time.monotonic() + duration_s)
+                    await ws.send(json.dumps({"event": "stop", "streamSid": self.stream_sid,
+                                              "stop": {"callSid": self.call_sid}}))
+                finally:
+                    receiver.cancel()
+        except websockets.ConnectionClosedOK:
+            # The app hung up; a send may notice before the receiver does
+            self.hung_up_at = self.hung_up_at or time.monotonic()
+        except Exception as e:
+            self.error = repr(e)
+
+    async def _send_connected(self, ws):
+        await ws.send(json.dumps({"event": "connected", "protocol": "Call", "version": "1.0.0"}))
+        await ws.send(json.dumps({
+            "event": "start",
+            "sequenceNumber": "1",
+            "streamSid": self.stream_sid,
+            "start": {
+                "streamSid": self.stream_sid,
+                "callSid": self.call_sid,
+                "accountSid": "AC" + "0" * 32,
+                "tracks": ["inbound"],
+                "customParameters": {"phone": self.phone} if self.phone else {},
+                "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": 8000, "channels": 1},
+            },
+        }))
+
+    async def _talk(self, ws, deadline):
+        next_tick = time.monotonic()
+        while time.monotonic() < deadline:
+            # Speak
+            for frame in self.utterance:
+                next_tick = await self._send_frame(ws, frame, next_tick)
+            self._utterance_end = time.monotonic()
+            self._reply_started.clear()
+            self._reply_done.clear()
+
+            # Stay on the line (sending silence, as Twilio does) until the reply has played
+            wait_until = self._utterance_end + self.reply_timeout_s
+            while not self._reply_done.is_set() and time.monotonic() < min(wait_until, deadline):
+                next_tick = await self._send_frame(ws, ULAW_SILENCE_FRAME, next_tick)
+            if not self._reply_started.is_set() and time.monotonic() < deadline:
+                self.unanswered_turns += 1
+            for _ in range(self.pause_frames):
+                next_tick = await self._send_frame(ws, ULAW_SILENCE_FRAME, next_tick)
+
+    async def _send_frame(self, ws, frame, tick):
+        delay = tick - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            self.send_lag_ms.append(-delay * 1000)
+        self.frames_sent += 1
+        await ws.send(json.dumps({
+            "event": "media",
+            "streamSid": self.stream_sid,
+            "media": {"track": "inbound", "chunk": str(self.frames_sent),
+                      "timestamp": str(self.frames_sent * FRAME_MS),
+                      "payload": base64.b64encode(frame).decode("ascii")},
+        }))
+        return tick + FRAME_SECONDS
+
+    async def _receive(self, ws):
+        async for raw in ws:
+            message = json.loads(raw)
+            event = message.get("event")
+            now = time.monotonic()
+            if event == "media":
+                self.frames_received += 1
+                if not self._reply_started.is_set() and self._utterance_end is not None:
+                    self._reply_started.set()
+                    self.response_latencies_ms.append((now - self._utterance_end) * 1000)
+                    self._in_reply = True
+                elif self._in_reply and self._playout_until < now:
+                    self.starvations += 1
+                self._playout_until = max(self._playout_until, now) + FRAME_SECONDS
+            elif event == "mark":
+                # Twilio echoes a mark once everything queued before it has played
+                name = message["mark"]["name"]
+                asyncio.get_running_loop().call_later(
+                    max(0.0, self._playout_until - now), self._echo_mark, ws, name)
+            elif event == "clear":
+                self._playout_until = now
+                self._in_reply = False
+                self._reply_done.set()
+        # This task is cancelled before we close, so getting here means the app ended the stream
+        self.hung_up_at = time.monotonic()
+
+    def _echo_mark(self, ws, name):
+        self._in_reply = False
+        self._reply_done.set()
+        asyncio.ensure_future(self._send_quietly(ws, {
+            "event": "mark", "streamSid": self.stream_sid, "mark": {"name": name},
+        }))
+
+    @staticmethod
+    async def _send_quietly(ws, message):
+        try:
+            await ws.send(json.dumps(message))
+        except websockets.ConnectionClosed:
+            pass
@@ -0,0 +1,88 @@
+# serve.py
+#
+# Run several app worker processes on one port. Each worker binds its own
+# SO_REUSEPORT socket, so the kernel spreads Twilio websockets and webhooks
+# across independent event loops. The workers share state through the call
+# registry, so use a shared backend:
+#
+#   WEB_CONCURRENCY=4 CALL_REGISTRY_URL=sqlite:///tmp/calls.db python serve.py
+#
+# With one worker this is the same as `uvicorn app:app`.
+
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(host: str, port: int, log_level: str):
+    import uvicorn
+    from prometheus_client import multiprocess
+
+    sock = bind_socket(host, port)
+    server = uvicorn.Server(uvicorn.Config("app:app", log_level=log_level, lifespan="on"))
+    try:
+        server.run(sockets=[sock])
+    finally:
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            multiprocess.mark_process_dead(os.getpid())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run app workers on a shared SO_REUSEPORT port")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise SystemExit("SO_REUSEPORT is not available on this platform")
+    if args.workers > 1 and os.getenv("CALL_REGISTRY_URL", "memory://").startswith("memory"):
+        logging.warning("⚠️ %d workers with an in-process call registry: callbacks and timelines "
+                        "won't reach the worker that owns the call. Set CALL_REGISTRY_URL.", args.workers)
+
+    # Workers write metrics to a shared directory so /metrics adds them up
+    metrics_dir = None
+    if args.workers > 1 and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        metrics_dir = tempfile.mkdtemp(prefix="voice-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+    # Spawn, not fork: each worker builds its own event loop, clients and sessions
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=run_worker, args=(args.host, args.port, args.log_level), name=f"worker-{i}")
+               for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    print(f"🚀 {args.workers} worker(s) serving on {args.host}:{args.port} (SO_REUSEPORT)")
+
+    def stop(signum, frame):
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        for worker in workers:
+            worker.join()
+    finally:
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
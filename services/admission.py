@@ -0,0 +1,196 @@
+# services/admission.py
+
+import asyncio
+import itertools
+import logging
+import time
+from prometheus_client import Counter
+from services.diagnostics import loop_monitor
+from services.call_registry import call_registry
+from config import (
+    ADMISSION_MAX_CALLS, ADMISSION_MAX_LOOP_LAG_MS, ADMISSION_MAX_SEND_STALL_MS, ADMISSION_RESERVATION_S,
+    ADMISSION_SAMPLE_INTERVAL_MS, ADMISSION_OVERFLOW, ADMISSION_HOLD_ROUNDS,
+)
+
+ADMISSION_DECISIONS = Counter("voice_admission_decisions", "New-call admission decisions",
+                              ["kind", "decision", "reason"])
+OVERFLOW_RESPONSES = Counter("voice_overflow_responses", "Refused inbound calls by what the caller was offered",
+                             ["response"])
+
+# A caller offered a callback isn't queued again for this long
+CALLBACK_DEDUPE_S = 900
+
+
+class AdmissionController:
+    """
+    Decides whether this process can take one more call without hurting the
+    ones it already has.
+
+    A call counts against `max_calls` from the moment it is admitted: a
+    short reservation covers the ring and the /voice round trip until its
+    media stream starts, then the live stream counts until it ends. New
+    calls are also refused while the event loop is running late or outbound
+    audio is waiting on the websockets. Budgets are per worker process; the
+    worker holding a call's reservation is noted in the call registry
+    ("admitted_worker") so that whichever worker the stream or the final
+    status callback lands on can release it there.
+    """
+
+    def __init__(self, max_calls: int = ADMISSION_MAX_CALLS, max_loop_lag_ms: float = ADMISSION_MAX_LOOP_LAG_MS,
+                 max_send_stall_ms: float = ADMISSION_MAX_SEND_STALL_MS,
+                 reservation_s: float = ADMISSION_RESERVATION_S, interval_ms: float = ADMISSION_SAMPLE_INTERVAL_MS):
+        self.max_calls = max_calls
+        self.max_loop_lag = max_loop_lag_ms / 1000
+        self.max_send_stall = max_send_stall_ms / 1000
+        self.reservation_s = reservation_s
+        self.interval = interval_ms / 1000
+        self.loop_lag = 0.0        # smoothed lateness of the sampler's wake-ups (s)
+        self._lagging = False      # over the lag budget, until it falls back below 3/4 of it
+        self._streams = {}         # call_sid -> outbound scheduler of each live stream
+        self._reservations = {}    # call_sid or token -> monotonic expiry
+        self._tokens = itertools.count(1)
+        self._refusing = None      # last refusal reason logged
+        self._callbacks = {}       # phone -> monotonic time a callback was promised
+        self.waiting = 0           # dials queued in wait_for_capacity()
+
+    # --- load signals ---
+
+    @property
+    def reserved(self) -> int:
+        now = time.monotonic()
+        for key in [k for k, expires in self._reservations.items() if expires < now]:
+            del self._reservations[key]
+        return len(self._reservations)
+
+    @property
+    def calls(self) -> int:
+        return len(self._streams) + self.reserved
+
+    @property
+    def send_stall(self) -> float:
+        return max((s.recent_send_stall for s in self._streams.values()), default=0.0)
+
+    def refusal(self):
+        """Why a new call would be turned away right now, or None if it fits."""
+        if self.calls >= self.max_calls:
+            return "calls"
+        if self._lagging:
+            return "loop_lag"
+        if self.send_stall > self.max_send_stall:
+            return "send_stall"
+        return None
+
+    # --- decisions ---
+
+    def admit(self, kind: str, call_sid: str = None):
+        """
+        Reserve room for one new call; returns the reservation key, or None
+        if it doesn't fit. Without a CallSid (the call isn't placed yet) the
+        key is a token to `bind()` once Twilio returns one.
+        """
+        if call_sid and call_sid in self._reservations:
+            return call_sid  # already admitted when we dialed it
+        reason = self.refusal()
+        if reason:
+            ADMISSION_DECISIONS.labels(kind, "rejected", reason).inc()
+            return None
+        ADMISSION_DECISIONS.labels(kind, "admitted", "ok").inc()
+        return self._reserve(call_sid or f"pending-{next(self._tokens)}")
+
+    async def wait_for_capacity(self, kind: str = "campaign") -> str:
+        """Like `admit()`, but queue until there is room instead of refusing."""
+        reason = self.refusal()
+        if reason:
+            ADMISSION_DECISIONS.labels(kind, "queued", reason).inc()
+            self.waiting += 1
+            try:
+                while self.refusal():
+                    await asyncio.sleep(self.interval)
+            finally:
+                self.waiting -= 1
+        ADMISSION_DECISIONS.labels(kind, "admitted", "ok" if not reason else "after_queue").inc()
+        return self._reserve(f"pending-{next(self._tokens)}")
+
+    def overflow(self, hold_round: int) -> str:
+        """What a refused inbound caller gets: "hold" (and retry) a few times, then "callback"."""
+        response = "hold" if ADMISSION_OVERFLOW == "hold" and hold_round < ADMISSION_HOLD_ROUNDS else "callback"
+        OVERFLOW_RESPONSES.labels(response).inc()
+        return response
+
+    def request_callback(self, phone: str) -> bool:
+        """Note a promised callback; False if this number already has one pending."""
+        now = time.monotonic()
+        for number in [n for n, at in self._callbacks.items() if now - at > CALLBACK_DEDUPE_S]:
+            del self._callbacks[number]
+        if not phone or phone in self._callbacks:
+            return False
+        self._callbacks[phone] = now
+        return True
+
+    def _reserve(self, key: str) -> str:
+        self._reservations[key] = time.monotonic() + self.reservation_s
+        if not key.startswith("pending-"):
+            call_registry.update_soon(key, admitted_worker=call_registry.worker_id)
+        return key
+
+    def bind(self, token: str, call_sid: str):
+        """Move a reservation from its token to the CallSid Twilio assigned."""
+        if self._reservations.pop(token, None) is not None:
+            self._reserve(call_sid)
+
+    def release(self, key: str):
+        """The call won't need its slot (dial failed, busy, no answer, ...)."""
+        self._reservations.pop(key, None)
+
+    def release_anywhere(self, call_sid: str):
+        """`release()` on whichever worker holds the call's reservation; in the background if not this one."""
+        if self._reservations.pop(call_sid, None) is None:
+            call_registry.run_soon(self.release_elsewhere(call_sid))
+
+    @staticmethod
+    async def release_elsewhere(call_sid: str, holder: str = None):
+        """Release the call's reservation on the worker holding it (`holder`, else from the registry), if not us."""
+        holder = holder or (await call_registry.get(call_sid) or {}).get("admitted_worker")
+        if holder and holder != call_registry.worker_id:
+            await call_registry.route(call_sid, "release_reservation", worker_id=holder)
+
+    def stream_started(self, call_sid: str, scheduler):
+        self._reservations.pop(call_sid, None)
+        self._streams[call_sid] = scheduler
+
+    def stream_ended(self, call_sid: str):
+        self._streams.pop(call_sid, None)
+
+    # --- event loop lag ---
+
+    def start(self):
+        loop_monitor.subscribe(self.on_loop_lag)
+
+    def on_loop_lag(self, lag: float):
+        """Fed every sample from the diagnostics loop monitor."""
+        # Smoothed so one GC pause doesn't shut the door, but a busy loop does within ~0.5 s
+        self.loop_lag += 0.2 * (lag - self.loop_lag)
+        if self.loop_lag > self.max_loop_lag:
+            self._lagging = True
+        elif self.loop_lag < 0.75 * self.max_loop_lag:
+            self._lagging = False
+        reason = self.refusal()
+        if reason != self._refusing:
+            if reason:
+                logging.warning("🚦 Turning new calls away (%s): %s", reason, self.stats())
+            else:
+                logging.info("🚦 Taking new calls again: %s", self.stats())
+            self._refusing = reason
+
+    async def close(self):
+        loop_monitor.unsubscribe(self.on_loop_lag)
+
+    def stats(self) -> dict:
+        return {
+            "streams": len(self._streams), "reserved": self.reserved, "max_calls": self.max_calls,
+            "loop_lag_ms": round(self.loop_lag * 1000, 1), "send_stall_ms": round(self.send_stall * 1000, 1),
+            "waiting": self.waiting, "callbacks_promised": len(self._callbacks), "refusing": self.refusal(),
+        }
+
+
+admission = AdmissionController()
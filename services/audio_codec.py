@@ -0,0 +1,141 @@
+# services/audio_codec.py
+
+import numpy as np
+
+# Sample rates on each side of the bridge
+TWILIO_SAMPLE_RATE = 8000     # Twilio Media Streams: 8 kHz G.711 µ-law
+GEMINI_INPUT_RATE = 16000     # Gemini Live expects 16 kHz PCM16 in
+GEMINI_OUTPUT_RATE = 24000    # Gemini Live sends 24 kHz PCM16 out
+
+FRAME_MS = 20
+TWILIO_FRAME_BYTES = TWILIO_SAMPLE_RATE * FRAME_MS // 1000  # 160 µ-law bytes
+GEMINI_INPUT_FRAME_BYTES = GEMINI_INPUT_RATE * FRAME_MS // 1000 * 2  # 640 bytes of 16 kHz PCM16
+
+GEMINI_INPUT_MIME = f"audio/pcm;rate={GEMINI_INPUT_RATE}"
+
+_ULAW_BIAS = 0x84
+_ULAW_CLIP = 32635
+
+
+def _build_decode_table():
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    sign = codes & 0x80
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + _ULAW_BIAS) << exponent) - _ULAW_BIAS
+    return np.where(sign != 0, -magnitude, magnitude).astype(np.int16)
+
+
+def _build_encode_table():
+    # Indexed by the int16 sample reinterpreted as uint16. Works on the 14-bit
+    # magnitude like the reference G.711 code, so output matches audioop.lin2ulaw.
+    samples = np.arange(65536, dtype=np.int32)
+    samples = np.where(samples >= 32768, samples - 65536, samples) >> 2
+    sign = np.where(samples < 0, 0x80, 0x00)
+    magnitude = np.minimum(np.abs(samples), _ULAW_CLIP >> 2) + (_ULAW_BIAS >> 2)
+    exponent = np.clip(np.floor(np.log2(magnitude)).astype(np.int32) - 5, 0, 7)
+    mantissa = (magnitude >> (exponent + 1)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+
+ULAW_DECODE_TABLE = _build_decode_table()
+ULAW_ENCODE_TABLE = _build_encode_table()
+
+
+def ulaw_to_pcm16(data) -> np.ndarray:
+    """Decode G.711 µ-law bytes into int16 samples."""
+    return ULAW_DECODE_TABLE[np.frombuffer(data, dtype=np.uint8)]
+
+
+def pcm16_to_ulaw(samples) -> bytes:
+    """Encode int16 samples (array or raw little-endian bytes) into µ-law bytes."""
+    if not isinstance(samples, np.ndarray):
+        samples = np.frombuffer(samples, dtype="<i2")
+    return ULAW_ENCODE_TABLE[samples.astype(np.int16, copy=False).view(np.uint16)].tobytes()
+
+
+def _design_lowpass(up: int, down: int, taps_per_phase: int) -> np.ndarray:
+    """Kaiser-windowed sinc prototype filter, returned as (up, taps_per_phase) polyphase bank."""
+    num_taps = up * taps_per_phase
+    cutoff = 0.45 / max(up, down)  # cycles per sample at the upsampled rate
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(num_taps, 8.0)
+    h *= up / h.sum()
+    # Phase p holds h[p], h[p + up], h[p + 2*up], ...
+    return h.reshape(taps_per_phase, up).T.astype(np.float32)
+
+
+class StreamingResampler:
+    """
+    Rational polyphase resampler (up/down) that keeps filter history and
+    phase between calls, so consecutive 20 ms frames resample seamlessly.
+    """
+
+    def __init__(self, up: int, down: int, taps_per_phase: int = 16):
+        self.up = up
+        self.down = down
+        self.taps = taps_per_phase
+        self._bank = _design_lowpass(up, down, taps_per_phase)
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._next = 0  # next output position on the upsampled grid, relative to the current block
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Resample a block of int16 samples and return int16 output."""
+        n = len(samples)
+        if n == 0:
+            return np.zeros(0, dtype=np.int16)
+
+        buf = np.concatenate((self._history, samples.astype(np.float32)))
+        # windows[q] = x[q], x[q-1], ..., x[q-taps+1] for every input index q of this block
+        windows = np.lib.stride_tricks.sliding_window_view(buf, self.taps)[:, ::-1]
+
+        count = max(0, -(-(n * self.up - self._next) // self.down))
+        out = np.empty(count, dtype=np.float32)
+        # Outputs j, j+up, j+2*up, ... share a filter phase and step `down`
+        # input samples apart, so each phase is a single strided matmul.
+        for j in range(min(self.up, count)):
+            q, p = divmod(self._next + j * self.down, self.up)
+            rows = windows[q::self.down][:len(out[j::self.up])]
+            out[j::self.up] = rows @ self._bank[p]
+
+        self._next += count * self.down - n * self.up
+        self._history = buf[-(self.taps - 1):]
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+
+
+class InboundTranscoder:
+    """Twilio 8 kHz µ-law → Gemini 16 kHz PCM16 (little-endian bytes)."""
+
+    def __init__(self):
+        self.resampler = StreamingResampler(GEMINI_INPUT_RATE // TWILIO_SAMPLE_RATE, 1)
+
+    def convert(self, ulaw: bytes) -> bytes:
+        return self.resample(ulaw_to_pcm16(ulaw)).tobytes()
+
+    def resample(self, samples: np.ndarray) -> np.ndarray:
+        """Resample already-decoded 8 kHz samples; the little-endian int16 array, to copy where it's queued."""
+        return self.resampler.process(samples).astype("<i2", copy=False)
+
+
+class OutboundTranscoder:
+    """Gemini 24 kHz PCM16 → Twilio 8 kHz µ-law bytes."""
+
+    def __init__(self):
+        self.resampler = StreamingResampler(1, GEMINI_OUTPUT_RATE // TWILIO_SAMPLE_RATE, taps_per_phase=48)
+        self._carry = b""
+
+    def convert(self, pcm: bytes) -> bytes:
+        # Gemini chunks are not guaranteed to end on a sample boundary
+        if self._carry:
+            pcm = self._carry + pcm
+        usable = len(pcm) & ~1
+        self._carry = pcm[usable:]
+        samples = np.frombuffer(pcm[:usable], dtype="<i2")
+        return pcm16_to_ulaw(self.resampler.process(samples))
+
+    def reset(self):
+        self.resampler.reset()
+        self._carry = b""
@@ -0,0 +1,148 @@
+# services/availability.py
+
+import datetime
+from services.booking_service import booking_store, parse_minutes, slot_span, BookingConflict, BookingError
+from config import WORKSHOPS, SERVICE_DURATIONS, DEFAULT_SERVICE_MINUTES, SLOT_MINUTES
+
+
+def _run_mask(free: int, length: int) -> int:
+    """Bit s is set when slots s .. s+length-1 are all set in `free`."""
+    mask = free
+    covered = 1
+    # Doubling: a run of `covered` AND a run starting `step` later is a run of covered + step
+    while covered < length:
+        step = min(covered, length - covered)
+        mask &= mask >> step
+        covered += step
+    return mask
+
+
+class AvailabilityEngine:
+    """
+    Free-slot index over workshop bays, one bitmap per bay per day.
+
+    Bit s of a bay's bitmap is set when slot s (SLOT_MINUTES long, counted
+    from midnight) is booked. "Next N free slots" is a handful of integer
+    AND/shift operations per day, so it fits comfortably inside a voice
+    turn. Bitmaps are built lazily from the booking store and kept in step
+    through its change listener.
+    """
+
+    def __init__(self, store=booking_store, workshops=WORKSHOPS, slot_minutes: int = SLOT_MINUTES,
+                 durations=SERVICE_DURATIONS, default_minutes: int = DEFAULT_SERVICE_MINUTES):
+        self.store = store
+        self.slot_minutes = slot_minutes
+        self.durations = {k.lower(): v for k, v in durations.items()}
+        self.default_minutes = default_minutes
+        self.workshops = {}
+        for workshop_id, spec in workshops.items():
+            open_slot = parse_minutes(spec.get("open", "09:00")) // slot_minutes
+            close_slot = parse_minutes(spec.get("close", "18:00")) // slot_minutes
+            self.workshops[workshop_id] = {
+                "bays": int(spec.get("bays", 1)),
+                "open_mask": ((1 << close_slot) - 1) & ~((1 << open_slot) - 1),
+                "closed_weekdays": set(spec.get("closed_weekdays", ())),
+            }
+        self._days = {}  # (workshop, date) -> [busy bitmap per bay]
+        store.add_listener(self._on_booking_change)
+
+    def duration_for(self, service_type) -> int:
+        """Minutes a service takes, e.g. "Full Service" vs "Oil Change"."""
+        if not service_type:
+            return self.default_minutes
+        return self.durations.get(service_type.lower(), self.default_minutes)
+
+    def _day(self, workshop, date: str):
+        key = (workshop, date)
+        bays = self._days.get(key)
+        if bays is None:
+            bays = [0] * self.workshops[workshop]["bays"]
+            for booking in self.store.on_date(date, workshop):
+                self._mark(bays, booking, True)
+            self._days[key] = bays
+        return bays
+
+    def _mark(self, bays, booking, busy: bool):
+        bay = booking["bay"]
+        if not 0 <= bay < len(bays):
+            return
+        start, count = slot_span(booking["start"], booking["duration_min"], self.slot_minutes)
+        bits = ((1 << count) - 1) << start
+        bays[bay] = bays[bay] | bits if busy else bays[bay] & ~bits
+
+    def _on_booking_change(self, action, booking):
+        bays = self._days.get((booking["workshop"], booking["date"]))
+        if bays is not None:
+            self._mark(bays, booking, action == "reserve")
+
+    def _slot_time(self, slot: int) -> str:
+        minutes = slot * self.slot_minutes
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    def _free_starts(self, workshop, date: datetime.date, length: int, from_slot: int = 0):
+        """{start_slot: first free bay} for every start at or after from_slot on this day."""
+        spec = self.workshops[workshop]
+        if date.weekday() in spec["closed_weekdays"]:
+            return {}
+        allowed_starts = spec["open_mask"] & ~((1 << from_slot) - 1)
+        starts = {}
+        for bay, busy in enumerate(self._day(workshop, date.isoformat())):
+            runs = _run_mask(spec["open_mask"] & ~busy, length) & allowed_starts
+            while runs:
+                low = runs & -runs
+                slot = low.bit_length() - 1
+                starts.setdefault(slot, bay)
+                runs ^= low
+        return starts
+
+    def next_free_slots(self, workshop, after: datetime.datetime, service_type=None, n: int = 3,
+                        max_days: int = 14):
+        """The first `n` start times at or after `after` with a bay free for the whole service."""
+        if workshop not in self.workshops:
+            raise BookingError(f"Unknown workshop {workshop!r}")
+        minutes = self.duration_for(service_type)
+        length = -(-minutes // self.slot_minutes)
+        first_slot = -(-(after.hour * 60 + after.minute) // self.slot_minutes)
+
+        results = []
+        for offset in range(max_days):
+            date = after.date() + datetime.timedelta(days=offset)
+            starts = self._free_starts(workshop, date, length, first_slot if offset == 0 else 0)
+            for slot in sorted(starts):
+                results.append({
+                    "workshop": workshop,
+                    "date": date.isoformat(),
+                    "start": self._slot_time(slot),
+                    "duration_min": minutes,
+                    "bay": starts[slot],
+                })
+                if len(results) == n:
+                    return results
+        return results
+
+    def free_bays(self, workshop, date: str, start: str, service_type=None):
+        """Bays that can take this service at exactly this time."""
+        if workshop not in self.workshops:
+            raise BookingError(f"Unknown workshop {workshop!r}")
+        # Every slot the service overlaps, so an off-grid time like 09:15 checks both 09:00 and 09:30
+        slot, length = slot_span(start, self.duration_for(service_type), self.slot_minutes)
+        bits = ((1 << length) - 1) << slot
+        spec = self.workshops[workshop]
+        if datetime.date.fromisoformat(date).weekday() in spec["closed_weekdays"] or bits & ~spec["open_mask"]:
+            return []
+        return [bay for bay, busy in enumerate(self._day(workshop, date)) if not busy & bits]
+
+    async def book(self, phone, workshop, date: str, start: str, service_type=None, name=None):
+        """Reserve the first free bay at this time; raises BookingConflict if none is left."""
+        for bay in self.free_bays(workshop, date, start, service_type):
+            try:
+                return await self.store.reserve(
+                    phone, workshop, date, start, service_type=service_type,
+                    duration_min=self.duration_for(service_type), bay=bay, name=name,
+                )
+            except BookingConflict:
+                continue  # taken by a concurrent call since we looked; try the next bay
+        raise BookingConflict(f"No bay free at {workshop} on {date} at {start}")
+
+
+availability = AvailabilityEngine()
@@ -0,0 +1,82 @@
+# services/barge_in.py
+
+import time
+import numpy as np
+from services.audio_codec import FRAME_MS
+from config import BARGE_IN_LOCAL_VAD, BARGE_IN_THRESHOLD_DBFS, BARGE_IN_MIN_SPEECH_MS
+
+
+class SpeechOnsetDetector:
+    """
+    Cheap energy detector run on every inbound 20 ms frame.
+
+    Reports an onset once the caller has been above the threshold for
+    `min_speech_ms` in a row. The onset time is backdated to the first loud
+    frame so interruption latency is measured from when the caller started.
+    """
+
+    def __init__(self, threshold_dbfs: float = BARGE_IN_THRESHOLD_DBFS,
+                 min_speech_ms: int = BARGE_IN_MIN_SPEECH_MS):
+        # Compare mean squares against a precomputed power instead of taking log10 per frame
+        self.threshold_power = (32768 * 10 ** (threshold_dbfs / 20)) ** 2
+        self.min_frames = max(1, min_speech_ms // FRAME_MS)
+        self.loud_frames = 0
+        self.onset_time = None  # monotonic time of the first loud frame of the current run
+        self.last_loud_time = None  # monotonic time of the latest loud frame (≈ end of caller speech)
+
+    def process(self, samples: np.ndarray) -> bool:
+        """Feed one frame of int16 samples; return True on the frame that confirms an onset."""
+        power = np.dot(samples.astype(np.float32), samples.astype(np.float32)) / max(len(samples), 1)
+        if power < self.threshold_power:
+            self.loud_frames = 0
+            return False
+        now = time.monotonic()
+        if self.loud_frames == 0:
+            self.onset_time = now
+        self.last_loud_time = now
+        self.loud_frames += 1
+        return self.loud_frames == self.min_frames
+
+
+class BargeInController:
+    """
+    Cuts agent speech when the caller talks over it.
+
+    Triggered either by the local onset detector (fastest) or by Gemini
+    Live's `interrupted` signal. Pending frames are dropped, Twilio gets a
+    `clear`, and the rest of the interrupted Gemini turn is discarded.
+    """
+
+    def __init__(self, scheduler, outbound, detector: SpeechOnsetDetector = None,
+                 local_vad: bool = BARGE_IN_LOCAL_VAD):
+        self.scheduler = scheduler
+        self.outbound = outbound
+        # The detector always runs (its end-of-speech time feeds turn latency metrics);
+        # `local_vad` decides whether it may cut the agent off
+        self.detector = detector or SpeechOnsetDetector()
+        self.local_vad = local_vad
+        self.muted = False          # drop Gemini audio until the interrupted turn ends
+        self.interruptions = 0
+        self.last_latency_ms = None
+
+    def on_inbound_frame(self, samples: np.ndarray) -> bool:
+        """Run local detection; return True if the agent should be cut off."""
+        return self.detector.process(samples) and self.local_vad and self.scheduler.is_speaking
+
+    async def interrupt(self, source: str):
+        """Stop agent playback now; `source` is "local" or "gemini"."""
+        if not self.scheduler.is_speaking and source == "gemini":
+            # Gemini's signal after a local cut: just let the next turn through
+            self.muted = False
+            return None
+        await self.scheduler.clear()
+        self.outbound.reset()
+        self.muted = source == "local"
+        self.interruptions += 1
+
+        onset = self.detector.onset_time if self.detector.loud_frames else None
+        self.last_latency_ms = (time.monotonic() - onset) * 1000 if onset else None
+        return self.last_latency_ms
+
+    def on_turn_complete(self):
+        self.muted = False
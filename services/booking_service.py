@@ -0,0 +1,254 @@
+# services/booking_service.py
+
+import asyncio
+import datetime
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from services.customer_directory import normalize_e164
+from config import BOOKINGS_PATH, SLOT_MINUTES, BOOKING_COMMIT_MAX_BATCH
+
+
+class BookingError(Exception):
+    """Invalid booking request."""
+
+
+class BookingConflict(BookingError):
+    """The requested bay/time is already taken."""
+
+
+def parse_minutes(hhmm: str) -> int:
+    """'09:30' → 570."""
+    try:
+        hours, minutes = hhmm.split(":")
+        value = int(hours) * 60 + int(minutes)
+    except (AttributeError, ValueError):
+        raise BookingError(f"Invalid time {hhmm!r}, expected HH:MM")
+    if not 0 <= value < 24 * 60:
+        raise BookingError(f"Invalid time {hhmm!r}")
+    return value
+
+
+def slot_span(start: str, duration_min: int, slot_minutes: int):
+    """(first slot, slot count) covering start .. start + duration, including partly used slots."""
+    begin = parse_minutes(start)
+    first = begin // slot_minutes
+    return first, -(-(begin + int(duration_min)) // slot_minutes) - first
+
+
+class BookingStore:
+    """
+    Booking store backed by an append-only JSON-lines journal.
+
+    Reservations are checked and applied to the in-memory indexes in one
+    synchronous step on the event loop, so two calls can never take the same
+    bay and slot. Journal writes are group-committed: a single writer appends
+    and fsyncs every record queued since its last write, and each `reserve`
+    returns once its record is durable. A failed write rolls a reservation
+    back; a cancellation only frees its slots once its record is durable, so
+    a failed one leaves the booking exactly as it was.
+    """
+
+    def __init__(self, path: str = BOOKINGS_PATH, slot_minutes: int = SLOT_MINUTES,
+                 max_batch: int = BOOKING_COMMIT_MAX_BATCH):
+        self.path = path
+        self.slot_minutes = slot_minutes
+        self.max_batch = max_batch
+
+        self.bookings = {}                      # id -> booking
+        self.by_phone = defaultdict(set)        # phone -> {id}
+        self.by_date = defaultdict(set)         # date -> {id}
+        self.by_workshop = defaultdict(set)     # workshop -> {id}
+        self._occupied = {}                     # (workshop, date, bay, slot) -> id
+        self._listeners = []
+
+        self._pending = []                      # [(record, future)] awaiting commit
+        self._wakeup = None
+        self._writer = None
+        self._writing = False
+        self.loaded = False
+        self.commits = 0
+
+    def _slots(self, booking):
+        start, count = slot_span(booking["start"], booking["duration_min"], self.slot_minutes)
+        return [(booking["workshop"], booking["date"], booking["bay"], s) for s in range(start, start + count)]
+
+    def _apply_reserve(self, booking):
+        slots = self._slots(booking)
+        taken = [self._occupied[s] for s in slots if s in self._occupied]
+        if taken:
+            raise BookingConflict(
+                f"Bay {booking['bay']} at {booking['workshop']} is already booked on {booking['date']} at {booking['start']}")
+        for s in slots:
+            self._occupied[s] = booking["id"]
+        self.bookings[booking["id"]] = booking
+        self.by_phone[booking["phone"]].add(booking["id"])
+        self.by_date[booking["date"]].add(booking["id"])
+        self.by_workshop[booking["workshop"]].add(booking["id"])
+        self._notify("reserve", booking)
+
+    def _apply_cancel(self, booking_id):
+        booking = self.bookings.pop(booking_id, None)
+        if booking is None:
+            return None
+        for s in self._slots(booking):
+            if self._occupied.get(s) == booking_id:
+                del self._occupied[s]
+        self.by_phone[booking["phone"]].discard(booking_id)
+        self.by_date[booking["date"]].discard(booking_id)
+        self.by_workshop[booking["workshop"]].discard(booking_id)
+        self._notify("cancel", booking)
+        return booking
+
+    def _notify(self, action, booking):
+        for listener in self._listeners:
+            try:
+                listener(action, booking)
+            except Exception as e:
+                logging.error("Booking listener failed: %s", e)
+
+    def add_listener(self, callback):
+        """
+        callback(action, booking) with action "reserve" or "cancel". Called on
+        every in-memory change, including journal replay and rollbacks, so
+        derived indexes stay exactly in step with the store.
+        """
+        self._listeners.append(callback)
+
+    def get(self, booking_id):
+        return self.bookings.get(booking_id)
+
+    def for_phone(self, phone):
+        return [self.bookings[i] for i in self.by_phone.get(normalize_e164(phone), ())]
+
+    def on_date(self, date: str, workshop: str = None):
+        ids = self.by_date.get(date, set())
+        if workshop is not None:
+            ids = ids & self.by_workshop.get(workshop, set())
+        return sorted((self.bookings[i] for i in ids), key=lambda b: (b["start"], b["bay"]))
+
+    def is_free(self, workshop, date, bay, start, duration_min) -> bool:
+        probe = {"workshop": workshop, "date": date, "bay": bay, "start": start, "duration_min": duration_min}
+        return not any(s in self._occupied for s in self._slots(probe))
+
+    async def reserve(self, phone, workshop, date, start, service_type=None,
+                      duration_min=None, bay=0, name=None):
+        """Atomically book `bay` at `workshop`; raises BookingConflict if any slot is taken."""
+        self._ensure_started()
+        booking = {
+            "id": uuid.uuid4().hex[:12],
+            "phone": normalize_e164(phone),
+            "name": name,
+            "workshop": workshop,
+            "date": date,
+            "start": start,
+            "duration_min": int(duration_min or self.slot_minutes),
+            "bay": int(bay),
+            "service_type": service_type,
+            "created_at": time.time(),
+        }
+        parse_minutes(start)
+        try:
+            datetime.date.fromisoformat(date)
+        except (TypeError, ValueError):
+            raise BookingError(f"Invalid date {date!r}, expected YYYY-MM-DD")
+        # Check and apply with no await in between: this is what makes it atomic
+        self._apply_reserve(booking)
+        try:
+            await self._commit({"op": "reserve", "booking": booking})
+        except Exception:
+            self._apply_cancel(booking["id"])
+            raise
+        return booking
+
+    async def cancel(self, booking_id):
+        self._ensure_started()
+        booking = self.bookings.get(booking_id)
+        if booking is None:
+            raise BookingError(f"Unknown booking {booking_id}")
+        # Journal first: once freed, the slots may be taken by another call, so
+        # there would be no safe way to put this booking back after a failed write
+        await self._commit({"op": "cancel", "id": booking_id, "at": time.time()})
+        self._apply_cancel(booking_id)
+        return booking
+
+    def _commit(self, record):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((record, future))
+        self._wakeup.set()
+        return future
+
+    def load(self):
+        """Replay the journal into memory."""
+        if self.loaded:
+            return
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final write from a crash; everything before it is intact
+                        logging.warning("Skipping unreadable booking journal line %d", line_no)
+                        continue
+                    if record.get("op") == "reserve":
+                        self._apply_reserve(record["booking"])
+                    elif record.get("op") == "cancel":
+                        self._apply_cancel(record["id"])
+        self.loaded = True
+        logging.info("📒 Loaded %d bookings from %s", len(self.bookings), self.path)
+
+    def _ensure_started(self):
+        if not self.loaded:
+            self.load()
+        if self._writer is None or self._writer.done():
+            self._wakeup = asyncio.Event()
+            self._writer = asyncio.create_task(self._write_loop(), name="booking_writer")
+
+    async def start(self):
+        await asyncio.to_thread(self.load)
+        self._ensure_started()
+
+    async def _write_loop(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            lines = "".join(json.dumps(record) + "\n" for record, _ in batch)
+            self._writing = True
+            try:
+                await asyncio.to_thread(self._append, lines)
+            except Exception as e:
+                logging.error("Booking journal write failed: %s", e)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self._writing = False
+            self.commits += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    def _append(self, lines: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def close(self):
+        """Wait for queued records to be written, then stop the writer."""
+        while self._pending or self._writing:
+            await asyncio.sleep(0.001)
+        if self._writer:
+            self._writer.cancel()
+
+
+booking_store = BookingStore()
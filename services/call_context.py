@@ -0,0 +1,60 @@
+# services/call_context.py
+
+from services.audio_codec import (
+    InboundTranscoder, OutboundTranscoder, FRAME_MS, TWILIO_FRAME_BYTES, GEMINI_INPUT_FRAME_BYTES,
+)
+from services.twilio_frames import MediaFrameParser
+from config import (
+    OUTBOUND_BUFFER_MS, INBOUND_QUEUE_FRAMES, INBOUND_BATCH_MS, RECORDING_ENABLED, RECORDING_BUFFER_BYTES,
+    CALL_MEMORY_BUDGET_KB, LIVE_REPLAY_MS,
+)
+
+
+class CallContext:
+    """
+    One live call's audio state, created when its media stream starts.
+
+    Slotted, and everything in it is allocated up front: the parser's decode
+    buffer, both transcoders, and once attached the outbound scheduler's and
+    inbound pipeline's frame rings and the Gemini session's replay ring. No
+    buffer grows after that, so each call costs the same whatever Gemini or
+    the caller sends.
+    """
+
+    __slots__ = ("call_sid", "stream_sid", "parser", "inbound", "outbound", "scheduler", "pipeline", "live")
+
+    def __init__(self, call_sid: str, stream_sid: str):
+        self.call_sid = call_sid
+        self.stream_sid = stream_sid
+        self.parser = MediaFrameParser()
+        self.inbound = InboundTranscoder()    # 8 kHz µ-law → 16 kHz PCM
+        self.outbound = OutboundTranscoder()  # 24 kHz PCM → 8 kHz µ-law
+        self.scheduler = None                 # OutboundAudioScheduler
+        self.pipeline = None                  # InboundAudioPipeline, once there is a Gemini session
+        self.live = None                      # ResilientLiveSession
+
+    @property
+    def buffer_bytes(self) -> int:
+        """Audio buffers this call holds."""
+        return sum(part.buffer_bytes for part in (self.scheduler, self.pipeline, self.live) if part is not None)
+
+
+def planned_call_bytes() -> dict:
+    """Per-call audio memory the buffer settings commit to, by buffer."""
+    batch_frames = max(1, INBOUND_BATCH_MS // FRAME_MS)
+    return {
+        "outbound_ring": (OUTBOUND_BUFFER_MS // FRAME_MS + 1) * TWILIO_FRAME_BYTES,
+        "inbound_ring": (INBOUND_QUEUE_FRAMES + batch_frames) * GEMINI_INPUT_FRAME_BYTES,
+        "replay_ring": (LIVE_REPLAY_MS // FRAME_MS + 1) * GEMINI_INPUT_FRAME_BYTES,
+        "recorder_backlog": RECORDING_BUFFER_BYTES if RECORDING_ENABLED else 0,
+    }
+
+
+def check_call_budget() -> int:
+    """Total planned bytes per call; ValueError if the settings add up to more than the budget."""
+    planned = planned_call_bytes()
+    total = sum(planned.values())
+    if total > CALL_MEMORY_BUDGET_KB * 1024:
+        raise ValueError(f"Per-call audio buffers need {total // 1024} KB, over CALL_MEMORY_BUDGET_KB="
+                         f"{CALL_MEMORY_BUDGET_KB}: {planned}")
+    return total
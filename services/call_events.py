@@ -0,0 +1,239 @@
+# services/call_events.py
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+from urllib.parse import parse_qsl
+from prometheus_client import Counter, Histogram
+from services.call_registry import call_registry
+from services.admission import admission
+from config import (
+    CALL_EVENTS_PATH, CALL_EVENTS_QUEUE_MAX, CALL_EVENTS_BATCH_MAX, CALL_EVENTS_BATCH_WINDOW_MS,
+    CALL_STATE_RETENTION,
+)
+
+# Lifecycle states in order; a call only moves forward, whatever order callbacks arrive in
+STATES = ("initiated", "ringing", "answered", "stream_started", "stream_stopped", "completed", "failed")
+_RANK = {state: i for i, state in enumerate(STATES)}
+TERMINAL = {"completed", "failed"}
+
+# Twilio CallStatus / StreamEvent values -> (state, outcome for failures)
+_CALL_STATUS = {
+    "queued": ("initiated", None), "initiated": ("initiated", None), "ringing": ("ringing", None),
+    "in-progress": ("answered", None), "answered": ("answered", None), "completed": ("completed", None),
+    "busy": ("failed", "busy"), "no-answer": ("failed", "no-answer"), "failed": ("failed", "failed"),
+    "canceled": ("failed", "canceled"),
+}
+_STREAM_EVENT = {
+    "stream-started": "stream_started", "started": "stream_started",
+    "stream-stopped": "stream_stopped", "stopped": "stream_stopped",
+    "stream-error": "failed", "error": "failed",
+}
+
+# Durations between lifecycle states
+_STAGES = {
+    "answer_delay": ("initiated", "answered"),
+    "ring_time": ("ringing", "answered"),
+    "stream_start_delay": ("answered", "stream_started"),
+    "call_duration": ("answered", "completed"),
+}
+
+CALLBACK_EVENTS = Counter("voice_status_callbacks", "Twilio status callbacks received", ["kind"])
+CALLBACKS_DROPPED = Counter("voice_status_callbacks_dropped", "Status callbacks dropped because the queue was full")
+CALL_OUTCOMES = Counter("voice_call_outcomes", "Finished calls by outcome", ["outcome"])
+CALL_STAGE_SECONDS = Histogram(
+    "voice_call_stage_seconds", "Time between call lifecycle states, from Twilio status callbacks", ["stage"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60, 120, 300, 600, 1800),
+)
+
+
+class CallState:
+    """Where one call is in its lifecycle, folded from its status callbacks."""
+
+    def __init__(self, call_sid: str):
+        self.call_sid = call_sid
+        self.state = None
+        self.at = {}          # state -> when its first callback arrived (epoch seconds)
+        self.outcome = None
+        self.error = None
+        self.events = 0
+
+    def apply(self, state: str, at: float, outcome: str = None, error: dict = None) -> bool:
+        """Fold in one event; returns True if the call just reached a terminal state."""
+        self.events += 1
+        self.at.setdefault(state, at)
+        if error:
+            self.error = error
+        if self.state is None or _RANK[state] > _RANK[self.state]:
+            was_terminal = self.state in TERMINAL
+            self.state = state
+            if state in TERMINAL and not was_terminal:
+                self.outcome = outcome or ("stream_error" if error else "completed")
+                return True
+        return False
+
+    def durations(self) -> dict:
+        return {stage: round(self.at[end] - self.at[start], 3) for stage, (start, end) in _STAGES.items()
+                if start in self.at and end in self.at and self.at[end] >= self.at[start]}
+
+    def to_dict(self) -> dict:
+        return {"call_sid": self.call_sid, "state": self.state, "outcome": self.outcome, "error": self.error,
+                "at": self.at, "durations": self.durations(), "events": self.events}
+
+
+def _classify(form: dict, at: float):
+    """(state, timestamp, outcome, error) for one callback, or None if it isn't a lifecycle event."""
+    # Twilio's own Timestamp is whole seconds; the receive time is what stage durations need
+    stream_event = form.get("StreamEvent") or form.get("StreamStatus")
+    if stream_event:
+        state = _STREAM_EVENT.get(stream_event)
+        if state is None:
+            return None
+        error = None
+        if state == "failed":
+            error = {"code": form.get("StreamErrorCode") or form.get("ErrorCode"),
+                     "message": form.get("StreamError") or form.get("ErrorMessage")}
+        return state, at, "stream_error" if error else None, error
+    call_status = form.get("CallStatus")
+    if call_status in _CALL_STATUS:
+        state, outcome = _CALL_STATUS[call_status]
+        error = {"code": form.get("ErrorCode"), "message": form.get("ErrorMessage")} if form.get("ErrorCode") else None
+        return state, at, outcome, error
+    return None
+
+
+class CallEventIngest:
+    """
+    Takes Twilio status callbacks off the request path.
+
+    `/twilio-callback` only calls `submit()` with the raw form body and
+    answers at once. A consumer task picks callbacks up in batches (up to
+    `batch_max`, or whatever arrived within `window_ms`), parses them,
+    folds them into per-call `CallState`s, updates the metrics and appends
+    the whole batch to a JSON-lines journal in one write off the loop.
+    """
+
+    def __init__(self, path: str = CALL_EVENTS_PATH, queue_max: int = CALL_EVENTS_QUEUE_MAX,
+                 batch_max: int = CALL_EVENTS_BATCH_MAX, window_ms: float = CALL_EVENTS_BATCH_WINDOW_MS,
+                 retention: int = CALL_STATE_RETENTION):
+        self.path = path
+        self.queue_max = queue_max
+        self.batch_max = batch_max
+        self.window = window_ms / 1000
+        self.retention = retention
+        self.calls = OrderedDict()  # call_sid -> CallState, in order of first callback
+        self._queue = deque()
+        self._wakeup = None
+        self._consumer = None
+        self.batches = 0
+        self.failures = {}          # outcome -> count, since start
+
+    def submit(self, body: bytes) -> bool:
+        """Queue one callback (raw x-www-form-urlencoded body). Never blocks."""
+        if len(self._queue) >= self.queue_max:
+            CALLBACKS_DROPPED.inc()
+            return False
+        self._queue.append((time.time(), body))
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def start(self):
+        if self._consumer is None or self._consumer.done():
+            self._wakeup = asyncio.Event()
+            if self._queue:
+                self._wakeup.set()
+            self._consumer = asyncio.create_task(self._consume(), name="call_events")
+
+    async def _consume(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # A burst is still arriving: give it a moment to fill the batch
+            if len(self._queue) < self.batch_max and self.window:
+                await asyncio.sleep(self.window)
+            batch = [self._queue.popleft() for _ in range(min(self.batch_max, len(self._queue)))]
+            try:
+                await self._process(batch)
+            except Exception:
+                logging.exception("Processing %d status callbacks failed", len(batch))
+
+    async def _process(self, batch):
+        records = []
+        lifecycle = {}  # call_sid -> registry fields, so each call costs one registry write per batch
+        for received_at, body in batch:
+            form = dict(parse_qsl(body.decode("utf-8", "replace"), keep_blank_values=True))
+            records.append({"received_at": received_at, **form})
+            stream_event = form.get("StreamEvent") or form.get("StreamStatus")
+            CALLBACK_EVENTS.labels("stream" if stream_event else "call" if "CallStatus" in form else "other").inc()
+            call_sid = form.get("CallSid")
+            event = _classify(form, received_at)
+            if not call_sid or event is None:
+                continue
+            state, at, outcome, error = event
+            if error:
+                logging.error("❌ Twilio %s error for %s: %s", "stream" if stream_event else "call", call_sid, error)
+            call = self._fold(call_sid, state, at, outcome, error)
+            lifecycle.setdefault(call_sid, {})[f"at_{state}"] = call.at[state]
+            lifecycle[call_sid]["lifecycle"] = call.state
+            if stream_event:
+                # The stream's timeline lives on whichever worker owns the call
+                call_registry.run_soon(call_registry.route(call_sid, "stream_status", {
+                    "status": stream_event, "details": {"error_code": (error or {}).get("code")},
+                }))
+        # Field-level merges, so workers that each saw some of a call's callbacks build one record
+        for call_sid, fields in lifecycle.items():
+            call_registry.update_soon(call_sid, **fields)
+        self.batches += 1
+        if self.path:
+            await asyncio.to_thread(self._append, "".join(json.dumps(r) + "\n" for r in records))
+
+    def _fold(self, call_sid, state, at, outcome, error) -> CallState:
+        call = self.calls.get(call_sid)
+        if call is None:
+            call = self.calls[call_sid] = CallState(call_sid)
+            # Oldest first; also bounds calls whose final callback never came
+            while len(self.calls) > self.retention:
+                self.calls.popitem(last=False)
+        if call.apply(state, at, outcome, error):
+            admission.release_anywhere(call_sid)  # busy, no answer, ...: the slot held since dialing is free again
+            CALL_OUTCOMES.labels(call.outcome).inc()
+            if call.outcome != "completed":
+                self.failures[call.outcome] = self.failures.get(call.outcome, 0) + 1
+            for stage, seconds in call.durations().items():
+                CALL_STAGE_SECONDS.labels(stage).observe(seconds)
+        return call
+
+    def _append(self, lines: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def get(self, call_sid: str):
+        return self.calls.get(call_sid)
+
+    def summary(self) -> dict:
+        states = {}
+        for call in self.calls.values():
+            states[call.state] = states.get(call.state, 0) + 1
+        return {"tracked_calls": len(self.calls), "by_state": states, "failures": self.failures,
+                "queue_depth": self.queue_depth, "batches": self.batches}
+
+    async def close(self):
+        """Process what's queued, then stop the consumer."""
+        if self._queue:
+            batch = list(self._queue)
+            self._queue.clear()
+            await self._process(batch)
+        if self._consumer:
+            self._consumer.cancel()
+            await asyncio.gather(self._consumer, return_exceptions=True)
+
+
+call_events = CallEventIngest()
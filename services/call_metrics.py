@@ -0,0 +1,239 @@
+# services/call_metrics.py
+
+import os
+import time
+from collections import OrderedDict
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from services.audio_codec import TWILIO_FRAME_BYTES as _FRAME_BYTES
+from services.inbound_pipeline import queue_gauges
+from services.session_warmer import session_warmer
+from services.call_recorder import recording_writer
+from services.call_events import call_events
+from services.admission import admission
+from config import CALL_TIMELINE_RETENTION
+
+# Call setup milestones, each measured from websocket accept (first occurrence per call)
+SETUP_STAGES = ("twilio_start", "first_inbound_frame", "gemini_ready", "first_gemini_audio",
+                "first_outbound_frame")
+
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+CALL_SETUP_SECONDS = Histogram(
+    "voice_call_setup_seconds", "Time from Twilio websocket accept to each call setup milestone",
+    ["stage"], buckets=_LATENCY_BUCKETS,
+)
+# Per agent turn:
+#   gemini_response  end of caller speech → first Gemini audio byte (Gemini + network)
+#   bridge_outbound  first Gemini audio byte → first frame sent to Twilio (our bridge)
+#   turn_response    end of caller speech → first frame sent to Twilio (what the caller waits)
+TURN_SECONDS = Histogram(
+    "voice_turn_latency_seconds", "Per-turn response latency, split by where the time went",
+    ["segment"], buckets=_LATENCY_BUCKETS,
+)
+AUDIO_BYTES = Counter("voice_audio_bytes", "Audio payload bytes by direction", ["direction"])
+ACTIVE_CALLS = Gauge("voice_active_calls", "Twilio media streams currently connected", multiprocess_mode="livesum")
+CALLS = Counter("voice_calls", "Twilio media streams handled")
+BARGE_INS = Counter("voice_barge_ins", "Agent turns cut off by the caller", ["source"])
+
+# Label children resolved once; these are hit for every 20 ms frame
+_twilio_in_bytes = AUDIO_BYTES.labels("twilio_in")
+_gemini_in_bytes = AUDIO_BYTES.labels("gemini_in")
+_gemini_out_bytes = AUDIO_BYTES.labels("gemini_out")
+_twilio_out_bytes = AUDIO_BYTES.labels("twilio_out")
+
+# Live calls (by CallSid) plus the most recent finished ones
+_timelines = OrderedDict()
+
+
+class CallTimeline:
+    """
+    Timestamps for one call, from websocket accept to hang-up.
+
+    Setup milestones are recorded once; per-turn milestones (end of caller
+    speech, first Gemini audio, first outbound frame) repeat every turn.
+    Everything also feeds the process-wide Prometheus histograms.
+    """
+
+    def __init__(self):
+        self.call_sid = None
+        self.started_at = time.time()
+        self.accepted_at = time.monotonic()
+        self.ended_at = None
+        self.events = [(0.0, "websocket_accept", {})]  # (ms since accept, name, details)
+        self.bytes = {"twilio_in": 0, "gemini_in": 0, "gemini_out": 0, "twilio_out": 0}
+        self.turns = 0
+        self.scheduler = None  # set by the media handler, for the outbound buffer gauge
+        self._seen = set()
+        self._speech_ended_at = None
+        self._turn_audio_at = None
+        self._turn_sent = False
+
+    def _offset_ms(self, at):
+        return round((at - self.accepted_at) * 1000, 1)
+
+    def event(self, name: str, at: float = None, **details):
+        at = at if at is not None else time.monotonic()
+        self.events.append((self._offset_ms(at), name, details))
+        if name in SETUP_STAGES and name not in self._seen:
+            CALL_SETUP_SECONDS.labels(name).observe(at - self.accepted_at)
+        self._seen.add(name)
+
+    def start(self, call_sid: str):
+        self.call_sid = call_sid
+        self.event("twilio_start")
+        register(self)
+
+    def inbound_frame(self, nbytes: int):
+        self.bytes["twilio_in"] += nbytes
+        _twilio_in_bytes.inc(nbytes)
+        if "first_inbound_frame" not in self._seen:
+            self.event("first_inbound_frame")
+
+    def sent_to_gemini(self, nbytes: int):
+        self.bytes["gemini_in"] += nbytes
+        _gemini_in_bytes.inc(nbytes)
+
+    def gemini_audio(self, nbytes: int, speech_ended_at: float = None):
+        """A chunk of agent audio arrived; `speech_ended_at` is the caller's last loud frame."""
+        self.bytes["gemini_out"] += nbytes
+        _gemini_out_bytes.inc(nbytes)
+        if self._turn_audio_at is not None:
+            return
+        now = time.monotonic()
+        self._turn_audio_at = now
+        self.turns += 1
+        if speech_ended_at is not None and self.accepted_at < speech_ended_at < now:
+            self._speech_ended_at = speech_ended_at
+            self.event("end_of_user_speech", at=speech_ended_at, turn=self.turns)
+            TURN_SECONDS.labels("gemini_response").observe(now - speech_ended_at)
+        self.event("first_gemini_audio", at=now, turn=self.turns)
+
+    def outbound_frame(self, frame: bytes = None, playout_at: float = None):
+        """The scheduler sent one 20 ms frame to Twilio."""
+        self.bytes["twilio_out"] += _FRAME_BYTES
+        _twilio_out_bytes.inc(_FRAME_BYTES)
+        if self._turn_audio_at is None or self._turn_sent:
+            return
+        now = time.monotonic()
+        self._turn_sent = True
+        self.event("first_outbound_frame", at=now, turn=self.turns)
+        TURN_SECONDS.labels("bridge_outbound").observe(now - self._turn_audio_at)
+        if self._speech_ended_at is not None:
+            TURN_SECONDS.labels("turn_response").observe(now - self._speech_ended_at)
+
+    def barge_in(self, source: str, latency_ms: float = None):
+        BARGE_INS.labels(source).inc()
+        self.event("barge_in", source=source, latency_ms=round(latency_ms, 1) if latency_ms else None)
+        self.turn_complete()
+
+    def turn_complete(self):
+        self._turn_audio_at = None
+        self._turn_sent = False
+        self._speech_ended_at = None
+
+    def end(self):
+        self.ended_at = time.time()
+        self.event("closed")
+        self.scheduler = None
+
+    def to_dict(self) -> dict:
+        duration = (self.ended_at or time.time()) - self.started_at
+        return {
+            "call_sid": self.call_sid,
+            "started_at": self.started_at,
+            "active": self.ended_at is None,
+            "duration_s": round(duration, 2),
+            "turns": self.turns,
+            "bytes": self.bytes,
+            "bytes_per_second": {k: round(v / duration) if duration else 0 for k, v in self.bytes.items()},
+            "events": [{"t_ms": t, "event": name, **details} for t, name, details in self.events],
+        }
+
+
+def register(timeline: CallTimeline):
+    _timelines[timeline.call_sid] = timeline
+    _timelines.move_to_end(timeline.call_sid)
+    finished = [sid for sid, t in _timelines.items() if t.ended_at is not None]
+    for sid in finished[:max(0, len(finished) - CALL_TIMELINE_RETENTION)]:
+        del _timelines[sid]
+
+
+def get_timeline(call_sid: str):
+    return _timelines.get(call_sid)
+
+
+def record_status(call_sid: str, status: str, **details):
+    """Twilio stream status callbacks land on the call's timeline too."""
+    timeline = _timelines.get(call_sid)
+    if timeline is not None:
+        timeline.event(f"twilio_status_{status}", **details)
+
+
+class _RuntimeCollector:
+    """Gauges read at scrape time from the pipelines, warmer, recorder and admission control."""
+
+    def collect(self):
+        inbound = queue_gauges()
+        depth = GaugeMetricFamily("voice_inbound_queue_frames", "Inbound frames queued for Gemini",
+                                  labels=["stat"])
+        depth.add_metric(["total"], inbound["inbound_queue_depth_total"])
+        depth.add_metric(["max"], inbound["inbound_queue_depth_max"])
+        yield depth
+
+        schedulers = [t.scheduler for t in _timelines.values() if t.scheduler is not None]
+        outbound = GaugeMetricFamily("voice_outbound_queue_frames", "Agent frames waiting to be paced out",
+                                     labels=["stat"])
+        outbound.add_metric(["total"], sum(s.queued_frames for s in schedulers))
+        outbound.add_metric(["max"], max((s.queued_frames for s in schedulers), default=0))
+        yield outbound
+        yield GaugeMetricFamily("voice_call_audio_buffer_bytes", "Preallocated audio buffers held by live calls",
+                                value=sum(s.buffer_bytes for s in schedulers) + inbound["inbound_buffer_bytes_total"])
+
+        warm = GaugeMetricFamily("voice_gemini_sessions", "Pre-warmed Gemini Live sessions", labels=["state"])
+        for state, value in session_warmer.stats.items():
+            warm.add_metric([state], value)
+        yield warm
+
+        if recording_writer:
+            recording = recording_writer.stats
+            yield GaugeMetricFamily("voice_recording_backlog_bytes", "Recorded audio waiting for the writer thread",
+                                    value=recording["backlog_bytes"])
+
+        load = admission.stats()
+        budget = GaugeMetricFamily("voice_admission_calls", "Calls counted against the admission budget",
+                                   labels=["state"])
+        for state in ("streams", "reserved", "waiting", "max_calls"):
+            budget.add_metric([state], load[state])
+        yield budget
+        yield GaugeMetricFamily("voice_admission_open", "1 while new calls are admitted, 0 while shedding",
+                                value=0 if load["refusing"] else 1)
+        yield GaugeMetricFamily("voice_event_loop_lag_seconds", "Smoothed lateness of the event loop",
+                                value=load["loop_lag_ms"] / 1000)
+        yield GaugeMetricFamily("voice_outbound_send_stall_seconds",
+                                "Longest recent wait for a Twilio websocket to take outbound audio",
+                                value=load["send_stall_ms"] / 1000)
+
+        yield GaugeMetricFamily("voice_status_callback_queue", "Twilio status callbacks waiting to be processed",
+                                value=call_events.queue_depth)
+
+
+_runtime_collector = _RuntimeCollector()
+REGISTRY.register(_runtime_collector)
+
+# Set by serve.py when several worker processes share a port
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render_metrics() -> bytes:
+    """
+    Scrape output. With several workers the histograms and counters are
+    summed across all of them; the scrape-time gauges (queues, warm
+    sessions, admission) describe only the worker that answered.
+    """
+    if not MULTIPROCESS:
+        return generate_latest()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(_runtime_collector)
+    return generate_latest(registry)
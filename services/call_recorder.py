@@ -0,0 +1,267 @@
+# services/call_recorder.py
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+import soundfile as sf
+from prometheus_client import Counter
+from services.audio_codec import ULAW_DECODE_TABLE, TWILIO_SAMPLE_RATE
+from services.logs import log_sampled
+from config import (
+    RECORDING_ENABLED, RECORDINGS_DIR, RECORDING_FORMAT, RECORDING_FLUSH_INTERVAL_S, RECORDING_BUFFER_BYTES,
+)
+
+CALLER, AGENT = 0, 1  # channels of the stereo recording
+
+RECORDING_FAILURES = Counter("voice_recording_failures", "Recordings that failed to write")
+
+
+class CallRecorder:
+    """
+    Tees one call's audio and transcripts for the background writer.
+
+    The media loop only appends to a bounded buffer here; decoding, mixing
+    and file I/O happen on the writer thread. Caller audio is the left
+    channel, agent audio (as actually sent to Twilio) the right. If the
+    writer falls more than `budget_bytes` behind, new audio is dropped
+    and counted rather than letting memory grow or the call wait.
+    """
+
+    def __init__(self, call_sid: str, directory: str = RECORDINGS_DIR, fmt: str = RECORDING_FORMAT,
+                 budget_bytes: int = RECORDING_BUFFER_BYTES, **metadata):
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        base = os.path.join(directory, day, call_sid)
+        self.call_sid = call_sid
+        self.audio_path = f"{base}.{fmt}"
+        self.transcript_path = f"{base}.jsonl"
+        self.format = fmt.upper()
+        self.budget_bytes = budget_bytes
+        self.started_at = time.time()
+        self.metadata = metadata
+
+        self._chunks = deque()      # (kind, ...) appended by the loop, popped by the writer
+        self._queued_bytes = 0      # only the loop writes this ...
+        self._drained_bytes = 0     # ... and only the writer writes this
+        self._caller_samples = 0    # caller audio is contiguous; its position is a running count
+        self._origin = None         # monotonic time of the first caller frame
+        self.dropped_frames = 0
+        self.closed = False
+
+        # Writer-thread state
+        self._file = None
+        self._transcript = None
+        self._written = 0           # samples flushed to the audio file
+        self._staged = np.zeros((0, 2), dtype=np.int16)  # samples from `_written` on
+        self._caller_until = 0      # end of the caller audio drained so far
+        self._staged_until = 0      # end of any audio drained so far
+        self._utterance = None      # [role, t_ms, [fragments]] being merged
+
+    def _offer(self, item, nbytes: int) -> bool:
+        if self._queued_bytes - self._drained_bytes + nbytes > self.budget_bytes:
+            self.dropped_frames += 1
+            log_sampled(logging.WARNING, "recorder_overflow", 5.0, "Recorder for %s is %d bytes behind; dropping audio",
+                        self.call_sid, self._queued_bytes - self._drained_bytes, dropped_frames=self.dropped_frames)
+            return False
+        self._queued_bytes += nbytes
+        self._chunks.append(item)
+        return True
+
+    def caller(self, samples: np.ndarray):
+        """One inbound frame of 8 kHz int16 samples (copied; the buffer may be reused)."""
+        if self._origin is None:
+            self._origin = time.monotonic()
+        self._offer(("audio", CALLER, self._caller_samples, samples.tobytes()), samples.nbytes)
+        self._caller_samples += len(samples)
+
+    def agent(self, ulaw, playout_at: float):
+        """One outbound µ-law frame (copied; it's a slot the scheduler reuses), placed where it will play."""
+        if self._origin is None:
+            return  # nothing to line it up against yet
+        position = round((playout_at - self._origin) * TWILIO_SAMPLE_RATE)
+        self._offer(("audio", AGENT, position, bytes(ulaw)), len(ulaw))
+
+    def transcript(self, role: str, text: str):
+        """A transcription fragment ("caller" or "agent"); fragments are merged into utterances."""
+        if text:
+            self._offer(("text", role, text, self._now_ms()), len(text))
+
+    def event(self, name: str, **details):
+        """Something worth having next to the words, e.g. a barge-in."""
+        self._offer(("event", name, details, self._now_ms()), 64)
+
+    def _now_ms(self):
+        return round((time.time() - self.started_at) * 1000)
+
+    def close(self):
+        """The call ended; the writer flushes what's left and closes the files."""
+        self.closed = True
+
+    # --- writer thread ---
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.audio_path), exist_ok=True)
+        self._file = sf.SoundFile(self.audio_path, "w", samplerate=TWILIO_SAMPLE_RATE, channels=2,
+                                  format=self.format, subtype="PCM_16")
+        self._transcript = open(self.transcript_path, "a", encoding="utf-8")
+        self._transcript.write(json.dumps({"event": "call_start", "call_sid": self.call_sid,
+                                           "started_at": self.started_at, **self.metadata}) + "\n")
+
+    def _stage(self, channel, position, samples):
+        start = position - self._written
+        if start < 0:  # a frame scheduled a hair before audio already written; keep what's left
+            samples, start = samples[-start:], 0
+        end = start + len(samples)
+        if end > len(self._staged):
+            grown = np.zeros((max(end, 2 * len(self._staged)), 2), dtype=np.int16)
+            grown[:len(self._staged)] = self._staged
+            self._staged = grown
+        self._staged[start:end, channel] = samples
+        self._staged_until = max(self._staged_until, self._written + end)
+        if channel == CALLER:
+            self._caller_until = max(self._caller_until, self._written + end)
+
+    def drain(self, final: bool = False):
+        """Move buffered chunks into the files. Called only from the writer thread."""
+        if self._file is None:
+            self._open()
+        lines = []
+        while self._chunks:
+            item = self._chunks.popleft()
+            kind = item[0]
+            if kind == "audio":
+                _, channel, position, data = item
+                samples = (np.frombuffer(data, dtype=np.int16) if channel == CALLER
+                           else ULAW_DECODE_TABLE.take(np.frombuffer(data, dtype=np.uint8), mode="clip"))
+                self._stage(channel, position, samples)
+                self._drained_bytes += len(data)
+            elif kind == "text":
+                _, role, text, t_ms = item
+                if self._utterance and self._utterance[0] != role:
+                    lines.append(self._end_utterance())
+                if self._utterance is None:
+                    self._utterance = [role, t_ms, []]
+                self._utterance[2].append(text)
+                self._drained_bytes += len(text)
+            else:
+                _, name, details, t_ms = item
+                if self._utterance:
+                    lines.append(self._end_utterance())
+                lines.append({"t_ms": t_ms, "event": name, **details})
+                self._drained_bytes += 64
+
+        # Caller audio arrives in real time, so everything before its position is final;
+        # agent frames scheduled ahead of that wait in the staging buffer
+        horizon = (self._staged_until if final else self._caller_until) - self._written
+        if horizon > 0:
+            self._file.write(self._staged[:horizon])
+            self._written += horizon
+            self._staged = self._staged[horizon:].copy()
+
+        if final and self._utterance:
+            lines.append(self._end_utterance())
+        if final:
+            lines.append({"t_ms": self._now_ms(), "event": "call_end",
+                          "audio_seconds": round(self._written / TWILIO_SAMPLE_RATE, 2),
+                          "dropped_frames": self.dropped_frames})
+        if lines:
+            self._transcript.write("".join(json.dumps(line) + "\n" for line in lines))
+            self._transcript.flush()
+        if final:
+            self.abort()
+
+    def abort(self):
+        """Close the files, whatever state they're in (writer thread)."""
+        for handle in (self._file, self._transcript):
+            if handle is not None and not handle.closed:
+                try:
+                    handle.close()
+                except Exception as e:
+                    logging.warning("Closing recording file for %s failed: %r", self.call_sid, e)
+
+    def _end_utterance(self):
+        role, t_ms, fragments = self._utterance
+        self._utterance = None
+        return {"t_ms": t_ms, "role": role, "text": "".join(fragments).strip()}
+
+
+class RecordingWriter:
+    """
+    One background thread for all calls: every `interval` seconds it drains
+    each live recorder in a single batch, and finishes recorders whose call
+    has ended. The event loop never touches a file.
+    """
+
+    def __init__(self, interval: float = RECORDING_FLUSH_INTERVAL_S):
+        self.interval = interval
+        self._recorders = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopping = False
+        self.files_written = 0
+        self.failures = 0
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="call-recorder", daemon=True)
+            self._thread.start()
+
+    def open(self, call_sid: str, **metadata) -> CallRecorder:
+        recorder = CallRecorder(call_sid, **metadata)
+        with self._lock:
+            self._recorders.append(recorder)
+        self.start()
+        return recorder
+
+    def finish(self, recorder: CallRecorder):
+        recorder.close()
+        self._wakeup.set()  # write the tail now rather than at the next tick
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            stopping = self._stopping
+            with self._lock:
+                recorders = list(self._recorders)
+            for recorder in recorders:
+                final = recorder.closed or stopping
+                try:
+                    recorder.drain(final=final)
+                except Exception:
+                    self.failures += 1
+                    RECORDING_FAILURES.inc()
+                    final = True
+                    logging.exception("Writing the recording for %s failed", recorder.call_sid)
+                    recorder.abort()
+                if final:
+                    self.files_written += 1
+                    with self._lock:
+                        self._recorders.remove(recorder)
+                time.sleep(0)  # let the event loop thread take the GIL between calls
+            if stopping:
+                return
+
+    def stop(self, timeout: float = 10.0):
+        """Flush every recording and stop the thread (shutdown)."""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            active = len(self._recorders)
+            backlog = sum(r._queued_bytes - r._drained_bytes for r in self._recorders)
+        return {"active": active, "backlog_bytes": backlog, "files_written": self.files_written,
+                "failures": self.failures}
+
+
+recording_writer = RecordingWriter() if RECORDING_ENABLED else None
@@ -0,0 +1,396 @@
+# services/call_registry.py
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+from config import CALL_REGISTRY_URL, CALL_REGISTRY_TTL_S
+
+# Identifies this process; routed messages are addressed to it
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class InProcessBackend:
+    """Single-process store; the default, and enough for one uvicorn worker."""
+
+    def __init__(self):
+        self._hashes = {}
+        self._expiry = {}
+        self._queues = defaultdict(asyncio.Queue)
+
+    def _live(self, key):
+        if key in self._expiry and self._expiry[key] < time.monotonic():
+            self._hashes.pop(key, None)
+            self._expiry.pop(key, None)
+        return self._hashes.get(key)
+
+    async def hset(self, key, mapping: dict):
+        self._hashes.setdefault(key, {}).update(mapping)
+        self._live(key)
+
+    async def hgetall(self, key) -> dict:
+        return dict(self._live(key) or {})
+
+    async def expire(self, key, seconds: float):
+        self._expiry[key] = time.monotonic() + seconds
+
+    async def delete(self, key):
+        self._hashes.pop(key, None)
+        self._expiry.pop(key, None)
+
+    async def push(self, queue: str, message: str):
+        self._queues[queue].put_nowait(message)
+
+    async def pop(self, queue: str, timeout: float):
+        try:
+            return await asyncio.wait_for(self._queues[queue].get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """
+    Store shared by worker processes on one machine (WAL mode, one file).
+    Calls run in a worker thread so the event loop never waits on disk.
+    """
+
+    POLL_INTERVAL_S = 0.05
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS hashes (key TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "name TEXT NOT NULL, message TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS queue_name ON queue (name, id)")
+        self._lock = asyncio.Lock()  # one statement at a time on the shared connection
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _hset(self, key, mapping):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute("SELECT data FROM hashes WHERE key = ?", (key,)).fetchone()
+            data = json.loads(row[0]) if row else {}
+            data.update(mapping)
+            self._db.execute("INSERT INTO hashes (key, data) VALUES (?, ?) "
+                             "ON CONFLICT(key) DO UPDATE SET data = excluded.data", (key, json.dumps(data)))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def _hgetall(self, key):
+        row = self._db.execute("SELECT data, expires FROM hashes WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return {}
+        return json.loads(row[0])
+
+    def _pop(self, queue):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute("SELECT id, message FROM queue WHERE name = ? ORDER BY id LIMIT 1",
+                                   (queue,)).fetchone()
+            if row:
+                self._db.execute("DELETE FROM queue WHERE id = ?", (row[0],))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return row[1] if row else None
+
+    async def hset(self, key, mapping: dict):
+        await self._run(self._hset, key, mapping)
+
+    async def hgetall(self, key) -> dict:
+        return await self._run(self._hgetall, key)
+
+    async def expire(self, key, seconds: float):
+        await self._run(self._db.execute, "UPDATE hashes SET expires = ? WHERE key = ?", (time.time() + seconds, key))
+        # Expired rows are only hidden by reads; sweep them here, where it is cheap
+        await self._run(self._db.execute, "DELETE FROM hashes WHERE expires < ?", (time.time(),))
+
+    async def delete(self, key):
+        await self._run(self._db.execute, "DELETE FROM hashes WHERE key = ?", (key,))
+
+    async def push(self, queue: str, message: str):
+        await self._run(self._db.execute, "INSERT INTO queue (name, message) VALUES (?, ?)", (queue, message))
+
+    async def pop(self, queue: str, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            message = await self._run(self._pop, queue)
+            if message is not None or time.monotonic() >= deadline:
+                return message
+            await asyncio.sleep(self.POLL_INTERVAL_S)
+
+    async def close(self):
+        await self._run(self._db.close)
+
+
+class RedisBackend:
+    """
+    Store shared across machines, spoken over the Redis protocol (RESP).
+
+    Only a handful of commands are used (HSET, HGETALL, EXPIRE, DEL, RPUSH,
+    BLPOP), so anything that speaks them works, including the local
+    stand-in in loadtest/fake_redis.py.
+    """
+
+    COMMAND_TIMEOUT_S = 2.0
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.lstrip("/") or 0)
+        self._command_conn = None
+        self._blocking_conn = None  # BLPOP holds its connection, so it gets its own
+        self._lock = asyncio.Lock()
+        self._blocking_lock = asyncio.Lock()
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        conn = (reader, writer)
+        if self.password:
+            await self._call(conn, "AUTH", self.password)
+        if self.db:
+            await self._call(conn, "SELECT", self.db)
+        return conn
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(out)
+
+    @classmethod
+    async def _read_reply(cls, reader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode("utf-8")
+        if kind == b"-":
+            raise RuntimeError(f"Redis error: {body.decode('utf-8')}")
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            return (await reader.readexactly(length + 2))[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(body)
+            return None if length < 0 else [await cls._read_reply(reader) for _ in range(length)]
+        raise RuntimeError(f"Unexpected Redis reply {line!r}")
+
+    async def _call(self, conn, *args):
+        reader, writer = conn
+        writer.write(self._encode(args))
+        await writer.drain()
+        return await self._read_reply(reader)
+
+    async def execute(self, *args):
+        async with self._lock:
+            try:
+                if self._command_conn is None:
+                    self._command_conn = await asyncio.wait_for(self._connect(), self.COMMAND_TIMEOUT_S)
+                return await asyncio.wait_for(self._call(self._command_conn, *args), self.COMMAND_TIMEOUT_S)
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                # A timed-out reply may still arrive, so the connection can't be reused
+                if self._command_conn is not None:
+                    self._command_conn[1].close()
+                self._command_conn = None
+                raise
+
+    async def hset(self, key, mapping: dict):
+        args = [item for pair in mapping.items() for item in pair]
+        await self.execute("HSET", key, *args)
+
+    async def hgetall(self, key) -> dict:
+        flat = await self.execute("HGETALL", key) or []
+        return dict(zip(flat[::2], flat[1::2]))
+
+    async def expire(self, key, seconds: float):
+        await self.execute("EXPIRE", key, int(seconds))
+
+    async def delete(self, key):
+        await self.execute("DEL", key)
+
+    async def push(self, queue: str, message: str):
+        await self.execute("RPUSH", queue, message)
+
+    async def pop(self, queue: str, timeout: float):
+        async with self._blocking_lock:
+            if self._blocking_conn is None:
+                self._blocking_conn = await self._connect()
+            try:
+                reply = await self._call(self._blocking_conn, "BLPOP", queue, max(1, int(timeout)))
+            except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                self._blocking_conn = None
+                raise
+        return reply[1] if reply else None
+
+    async def close(self):
+        for conn in (self._command_conn, self._blocking_conn):
+            if conn is not None:
+                conn[1].close()
+        self._command_conn = self._blocking_conn = None
+
+
+def backend_from_url(url: str):
+    """memory://, sqlite:///path/to/calls.db or redis://[:password@]host:port/db"""
+    scheme = urlsplit(url).scheme
+    if scheme == "memory":
+        return InProcessBackend()
+    if scheme == "sqlite":
+        return SQLiteBackend(url[len("sqlite://"):] or "calls.db")
+    if scheme == "redis":
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported CALL_REGISTRY_URL {url!r}")
+
+
+class CallRegistry:
+    """
+    Where each call lives, shared by every worker and instance.
+
+    A record per CallSid holds the call's status, StreamSid, the worker
+    that owns its media stream ("owner") and the one holding a pre-warmed
+    Gemini session for it ("warm_worker"). Work that must happen on the
+    owner, such as Twilio status callbacks, is sent with `route()` and
+    lands in that worker's inbox, where `on()` handlers pick it up.
+
+    Registry trouble is logged, never raised: calls must keep working
+    even if the shared store is down.
+    """
+
+    CLOSE_TIMEOUT_S = 2.0
+
+    def __init__(self, backend=None, worker_id: str = WORKER_ID, ttl: float = CALL_REGISTRY_TTL_S):
+        self.backend = backend or InProcessBackend()
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self._handlers = {}
+        self._listener = None
+        self._pending = set()  # background writes, referenced until done
+
+    @staticmethod
+    def _key(call_sid):
+        return f"call:{call_sid}"
+
+    def _inbox(self, worker_id):
+        return f"inbox:{worker_id}"
+
+    def on(self, kind: str, handler):
+        """Handle routed messages of this kind on this worker: handler(call_sid, payload)."""
+        self._handlers[kind] = handler
+
+    async def update(self, call_sid: str, **fields):
+        """Merge fields into the call's record."""
+        if not call_sid:
+            return
+        fields["updated_at"] = time.time()
+        try:
+            await self.backend.hset(self._key(call_sid), {k: json.dumps(v) for k, v in fields.items()})
+            await self.backend.expire(self._key(call_sid), self.ttl)
+        except Exception as e:
+            logging.warning("Call registry update for %s failed: %r", call_sid, e)
+
+    def run_soon(self, coro):
+        """Run registry work in the background, for paths that must not wait on the store."""
+        task = asyncio.create_task(coro, name="registry_write")
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def update_soon(self, call_sid: str, **fields):
+        self.run_soon(self.update(call_sid, **fields))
+
+    async def get(self, call_sid: str):
+        try:
+            record = await self.backend.hgetall(self._key(call_sid))
+        except Exception as e:
+            logging.warning("Call registry lookup for %s failed: %r", call_sid, e)
+            return None
+        return {k: json.loads(v) for k, v in record.items()} or None
+
+    async def claim(self, call_sid: str, **fields):
+        """
+        Mark this worker as the owner of the call's media stream. Returns the
+        record as it was, so the caller can see who pre-warmed the session.
+        """
+        previous = await self.get(call_sid) or {}
+        await self.update(call_sid, owner=self.worker_id, **fields)
+        return previous
+
+    async def route(self, call_sid: str, kind: str, payload: dict = None, worker_id: str = None):
+        """Run `kind` on the worker that owns the call (or `worker_id`); locally if that's us or unknown."""
+        if worker_id is None:
+            worker_id = (await self.get(call_sid) or {}).get("owner")
+        if worker_id in (None, self.worker_id):
+            await self._dispatch(call_sid, kind, payload or {})
+            return
+        message = json.dumps({"call_sid": call_sid, "kind": kind, "payload": payload or {}})
+        try:
+            await self.backend.push(self._inbox(worker_id), message)
+        except Exception as e:
+            logging.warning("Routing %s for %s to %s failed: %r", kind, call_sid, worker_id, e)
+
+    async def _dispatch(self, call_sid, kind, payload):
+        handler = self._handlers.get(kind)
+        if handler is None:
+            logging.warning("No handler for routed %s message", kind)
+            return
+        try:
+            result = handler(call_sid, payload)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception:
+            logging.exception("Routed %s handler failed for %s", kind, call_sid)
+
+    def start(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen(), name="registry_listener")
+
+    async def _listen(self):
+        inbox = self._inbox(self.worker_id)
+        while True:
+            try:
+                raw = await self.backend.pop(inbox, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning("Call registry inbox read failed: %r", e)
+                await asyncio.sleep(1)
+                continue
+            if raw is not None:
+                message = json.loads(raw)
+                await self._dispatch(message["call_sid"], message["kind"], message["payload"])
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+        if self._pending:
+            # Give final writes (call snapshots) a moment, but never hang shutdown on the store
+            await asyncio.wait(self._pending, timeout=self.CLOSE_TIMEOUT_S)
+        await self.backend.close()
+
+
+call_registry = CallRegistry(backend_from_url(CALL_REGISTRY_URL))
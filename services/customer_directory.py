@@ -0,0 +1,176 @@
+# services/customer_directory.py
+
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from config import CUSTOMER_DATA_PATH, DEFAULT_COUNTRY_CODE, CUSTOMER_RELOAD_INTERVAL_S
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_e164(number, country_code: str = DEFAULT_COUNTRY_CODE):
+    """Best-effort E.164 normalisation, e.g. '098765 43210' → '+919876543210'."""
+    if not number:
+        return None
+    number = str(number).strip()
+    digits = _NON_DIGITS.sub("", number)
+    if not digits:
+        return None
+    if number.startswith("+"):
+        return "+" + digits
+    if digits.startswith("00"):
+        return "+" + digits[2:]
+    if digits.startswith("0"):
+        digits = digits[1:]
+    if len(digits) <= 10:
+        return f"+{country_code}{digits}"
+    return "+" + digits
+
+
+class CustomerDirectory:
+    """
+    In-memory customer index keyed by E.164 phone number (and by ID).
+
+    Loads customer_data.json, a JSONL export or a CSV export. A watcher
+    re-stats the file every `reload_interval` seconds; a JSONL file whose
+    already-indexed prefix is byte-for-byte unchanged only has its new lines
+    parsed, anything else (including an in-place edit of an existing row) is
+    reloaded in a worker thread and swapped in, so lookups are always a plain
+    dict get.
+    """
+
+    def __init__(self, path: str = CUSTOMER_DATA_PATH, reload_interval: float = CUSTOMER_RELOAD_INTERVAL_S):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.by_phone = {}
+        self.by_id = {}
+        self.loaded = False
+        self._stat = None     # (inode, mtime_ns, size) of the last load
+        self._offset = 0      # bytes of a JSONL file already indexed
+        self._digest = None   # blake2b of those bytes, to tell an append from an edit
+        self._watcher = None
+
+    @property
+    def format(self) -> str:
+        ext = os.path.splitext(self.path)[1].lower()
+        return {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}.get(ext, "json")
+
+    def __len__(self):
+        return len(self.by_phone)
+
+    def lookup(self, phone):
+        """O(1) lookup of the customer record for a caller number."""
+        if not self.loaded:
+            self.reload()
+        return self.by_phone.get(normalize_e164(phone))
+
+    def get(self, customer_id):
+        if not self.loaded:
+            self.reload()
+        return self.by_id.get(str(customer_id))
+
+    def reload(self):
+        """Bring the index up to date with the file; cheap when nothing changed."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            logging.warning("Customer data file %s not found", self.path)
+            self.loaded = True
+            return
+        stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stat == self._stat:
+            return
+
+        started = time.perf_counter()
+        appended = (
+            self.format == "jsonl" and self._stat is not None
+            and stat[0] == self._stat[0] and st.st_size >= self._offset
+            and self._read_jsonl_tail()
+        )
+        if not appended:
+            self._full_load()
+        self._stat = stat
+        self.loaded = True
+        logging.info("📇 Customer directory %s: %d customers (%s, %.0f ms)", self.path, len(self.by_phone),
+                     "incremental" if appended else "full", (time.perf_counter() - started) * 1000)
+
+    def _full_load(self):
+        by_phone, by_id = {}, {}
+        for position, record in enumerate(self._iter_records()):
+            self._index(record, position, by_phone, by_id)
+        # Swap whole dicts so concurrent lookups never see a half-built index
+        self.by_phone, self.by_id = by_phone, by_id
+
+    def _read_jsonl_tail(self) -> bool:
+        """Index lines added since the last load; False if the part already indexed has changed."""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        digest = hashlib.blake2b(memoryview(data)[:self._offset], digest_size=16)
+        if digest.digest() != self._digest:
+            return False
+        tail = data[self._offset:]
+        # Only index complete lines; a writer may be mid-append
+        complete = tail.rfind(b"\n") + 1
+        position = len(self.by_id)
+        for line in tail[:complete].splitlines():
+            if line.strip():
+                self._index(json.loads(line), position, self.by_phone, self.by_id)
+                position += 1
+        digest.update(tail[:complete])
+        self._digest = digest.digest()
+        self._offset += complete
+        return True
+
+    def _iter_records(self):
+        if self.format == "csv":
+            with open(self.path, newline="", encoding="utf-8") as f:
+                yield from csv.DictReader(f)
+        elif self.format == "jsonl":
+            with open(self.path, "rb") as f:
+                data = f.read()
+            complete = data.rfind(b"\n") + 1
+            for line in data[:complete].splitlines():
+                if line.strip():
+                    yield json.loads(line)
+            self._offset = complete
+            self._digest = hashlib.blake2b(data[:complete], digest_size=16).digest()
+        else:
+            with open(self.path, "r", encoding="utf-8") as f:
+                yield from json.load(f)
+
+    @staticmethod
+    def _index(record, position, by_phone, by_id):
+        phone = normalize_e164(record.get("phone"))
+        if phone:
+            record["phone"] = phone
+            by_phone[phone] = record
+        # Records without an "id" are addressed by their position in the file
+        by_id[str(record.get("id", position))] = record
+
+    async def refresh(self):
+        """Reload off the event loop."""
+        await asyncio.to_thread(self.reload)
+
+    def start_watching(self):
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch(), name="customer_watch")
+
+    def stop_watching(self):
+        if self._watcher:
+            self._watcher.cancel()
+
+    async def _watch(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error("Customer directory reload failed: %s", e)
+            await asyncio.sleep(self.reload_interval)
+
+
+customer_directory = CustomerDirectory()
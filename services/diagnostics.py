@@ -0,0 +1,236 @@
+# services/diagnostics.py
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as Tally, deque
+from prometheus_client import Counter, Histogram
+from services.logs import call_sid_var, log_sampled
+from config import LOOP_LAG_SAMPLE_MS, LOOP_SLOW_CALLBACK_MS, LOOP_SLOW_CALLBACK_HISTORY, PROFILE_MAX_SECONDS
+
+LOOP_LAG_SECONDS = Histogram("voice_loop_lag_seconds", "Event-loop lag per sample (how late a timer fired)",
+                             buckets=(0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+SLOW_CALLBACKS = Counter("voice_slow_callbacks", "Event-loop callbacks that held the loop too long, by task kind",
+                         ["task"])
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_HOOK_CODE = None  # code of LoopMonitor's Handle._run wrapper, where profiled stacks are cut
+
+
+def task_kind(name: str) -> str:
+    """"gemini_to_twilio:CA123" -> "gemini_to_twilio"; unnamed tasks ("Task-42") -> "other"."""
+    if not name:
+        return "other"
+    kind = name.split(":", 1)[0]
+    return "other" if kind.startswith("Task-") else kind
+
+
+def _where(code, lineno) -> str:
+    path = code.co_filename
+    path = os.path.relpath(path, _REPO_ROOT) if path.startswith(_REPO_ROOT) else "/".join(path.split(os.sep)[-2:])
+    return f"{code.co_name} ({path}:{lineno})"
+
+
+def _is_asyncio(code) -> bool:
+    return f"{os.sep}asyncio{os.sep}" in code.co_filename
+
+
+def _suspended_at(coro) -> str:
+    """Where a task is waiting now (i.e. where the stall ended): its innermost await outside asyncio itself."""
+    where = None
+    while coro is not None and getattr(coro, "cr_frame", None) is not None:
+        if where is None or not _is_asyncio(coro.cr_code):
+            where = _where(coro.cr_code, coro.cr_frame.f_lineno)
+        coro = coro.cr_await
+    return where
+
+
+class LoopMonitor:
+    """
+    Watches the event loop from inside it.
+
+    A sampler task measures how late a `interval_ms` timer fires (the lag
+    every live call feels) and hands each sample to subscribers such as
+    admission control. A hook around asyncio's callback runner times every
+    callback; any over `slow_callback_ms` is counted and kept with the task
+    that ran it, the call it belongs to and where that task stopped next.
+    """
+
+    def __init__(self, interval_ms: float = LOOP_LAG_SAMPLE_MS, slow_callback_ms: float = LOOP_SLOW_CALLBACK_MS,
+                 history: int = LOOP_SLOW_CALLBACK_HISTORY):
+        self.interval = interval_ms / 1000
+        self.slow_threshold = slow_callback_ms / 1000
+        self.lag = 0.0
+        self.recent_lag = deque(maxlen=max(1, int(60 / self.interval)))  # last minute of samples
+        self.slow_callbacks = deque(maxlen=history)
+        self.slow_total = 0
+        self._subscribers = []
+        self._sampler = None
+        self._original_run = None
+
+    def subscribe(self, callback):
+        """callback(lag_seconds) after every sample."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def start(self):
+        if self._sampler is None or self._sampler.done():
+            self._sampler = asyncio.create_task(self._sample(), name="loop_monitor")
+        if self.slow_threshold > 0:
+            self._install_hook()
+
+    async def _sample(self):
+        while True:
+            due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, time.monotonic() - due)
+            self.recent_lag.append(self.lag)
+            LOOP_LAG_SECONDS.observe(self.lag)
+            for callback in list(self._subscribers):
+                callback(self.lag)
+
+    # --- slow callbacks ---
+
+    def _install_hook(self):
+        # Only the default asyncio loop runs callbacks through Handle._run (uvloop doesn't)
+        if self._original_run is not None:
+            return
+        original = self._original_run = asyncio.events.Handle._run
+        monitor = self
+
+        def _run(handle):
+            started = time.perf_counter()
+            original(handle)
+            elapsed = time.perf_counter() - started
+            if elapsed >= monitor.slow_threshold:
+                monitor._record_slow(handle, elapsed)
+
+        global _HOOK_CODE
+        _HOOK_CODE = _run.__code__
+        asyncio.events.Handle._run = _run
+
+    def _uninstall_hook(self):
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run
+            self._original_run = None
+
+    def _record_slow(self, handle, elapsed):
+        callback = handle._callback
+        task = getattr(callback, "__self__", None)
+        if isinstance(task, asyncio.Task):
+            name = task.get_name()
+            coro = task.get_coro()
+            where = _suspended_at(coro) or "finished"
+        else:
+            name = None
+            where = _where(callback.__code__, callback.__code__.co_firstlineno) \
+                if hasattr(callback, "__code__") else repr(callback)
+        context = handle._context
+        entry = {
+            "at": time.time(),
+            "ms": round(elapsed * 1000, 1),
+            "task": name,
+            "call_sid": context.get(call_sid_var) if context is not None else None,
+            "next_await": where,
+        }
+        self.slow_total += 1
+        self.slow_callbacks.append(entry)
+        SLOW_CALLBACKS.labels(task_kind(name)).inc()
+        # Log in the callback's own context so the line carries its call
+        log = (logging.WARNING, "slow_callback", 1.0, "🐢 Event loop held for %.0f ms by %s",
+               entry["ms"], name or where)
+        if context is not None:
+            context.run(log_sampled, *log, next_await=where)
+        else:
+            log_sampled(*log, next_await=where)
+
+    async def close(self):
+        self._uninstall_hook()
+        if self._sampler:
+            self._sampler.cancel()
+            await asyncio.gather(self._sampler, return_exceptions=True)
+
+    def stats(self) -> dict:
+        samples = sorted(self.recent_lag)
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2) if samples else None
+
+        return {
+            "lag_ms": round(self.lag * 1000, 2),
+            "last_minute": {"p50_ms": pct(0.5), "p99_ms": pct(0.99),
+                            "max_ms": round(samples[-1] * 1000, 2) if samples else None},
+            "slow_callback_threshold_ms": round(self.slow_threshold * 1000, 1),
+            "slow_callbacks_total": self.slow_total,
+            "slow_callbacks": list(self.slow_callbacks)[::-1],  # newest first
+            "tasks": Tally(task_kind(t.get_name()) for t in asyncio.all_tasks()),
+        }
+
+
+class StackProfiler:
+    """
+    Time-boxed sampling profile of the event-loop thread.
+
+    A separate thread reads the loop thread's stack `hz` times a second and
+    tallies the stacks in collapsed ("folded") form, ready for flamegraph.pl
+    or speedscope. Each stack is rooted at the asyncio task that was running,
+    so per-call tasks show up as separate towers; `per_call=False` merges
+    them by task kind.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def run(self, loop, thread_id: int, seconds: float, hz: float = 100, per_call: bool = True):
+        """Blocking; run it off the loop (asyncio.to_thread). Returns (stack counts, samples taken)."""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            seconds = min(seconds, PROFILE_MAX_SECONDS)
+            interval = 1 / hz
+            stacks = Tally()
+            samples = 0
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    stacks[self._collapse(frame, asyncio.current_task(loop), per_call)] += 1
+                    samples += 1
+                time.sleep(interval)
+            return stacks, samples
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _collapse(frame, task, per_call: bool) -> str:
+        names = []
+        # Stop at the loop's own frames (run_forever, _run_once, Handle._run and our hook around it)
+        while frame is not None and not (_is_asyncio(frame.f_code) and frame.f_code.co_name in ("_run", "_run_once")
+                                         or frame.f_code is _HOOK_CODE):
+            names.append(_where(frame.f_code, frame.f_lineno))
+            frame = frame.f_back
+        names.reverse()
+        if task is None:
+            root = "[idle]" if names and names[-1].startswith("select ") else "[loop]"
+        else:
+            root = f"[{task.get_name() if per_call else task_kind(task.get_name())}]"
+        return ";".join([root] + names)
+
+
+def collapsed(stacks) -> str:
+    """Folded-stack text: one "frame;frame;frame count" line per distinct stack."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+loop_monitor = LoopMonitor()
+profiler = StackProfiler()
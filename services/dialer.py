@@ -0,0 +1,129 @@
+# services/dialer.py
+
+import asyncio
+import logging
+import time
+import uuid
+from services.twilio_service import initiate_call_async
+from services.customer_directory import customer_directory
+from services.admission import admission
+from config import DIAL_CONCURRENCY, DIAL_CALLS_PER_SECOND
+
+# Finished campaigns are kept this long so their results can still be fetched
+CAMPAIGN_RETENTION_S = 3600
+
+
+class RateLimiter:
+    """Spaces out call starts so at most `rate` begin per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class Campaign:
+    """A batch of outbound calls dialed in the background."""
+
+    def __init__(self, targets, concurrency: int, calls_per_second: float, on_initiated=None, delay_s: float = 0):
+        self.id = uuid.uuid4().hex
+        self.targets = targets  # list of {"to": ..., "customer_id": ...}
+        self.concurrency = max(1, concurrency)
+        self.calls_per_second = calls_per_second
+        self.on_initiated = on_initiated
+        self.delay_s = delay_s
+        self.results = [None] * len(targets)
+        self.status = "pending"
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    async def run(self):
+        if self.delay_s:
+            await asyncio.sleep(self.delay_s)
+        self.status = "running"
+        self.started_at = time.time()
+        limiter = RateLimiter(self.calls_per_second)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def dial(index, target):
+            async with semaphore:
+                # Queue while the process is at capacity rather than degrade the calls in progress
+                reservation = await admission.wait_for_capacity("campaign")
+                await limiter.wait()
+                result = dict(target)
+                try:
+                    call = await initiate_call_async(target["to"], {
+                        "campaign": self.id, "customer_id": target.get("customer_id"),
+                    })
+                    admission.bind(reservation, call.sid)
+                    result.update(status="initiated", sid=call.sid)
+                    if self.on_initiated:
+                        self.on_initiated(call.sid, target["to"])
+                except Exception as e:
+                    admission.release(reservation)
+                    logging.warning("Campaign %s: dialing %s failed: %s", self.id, target["to"], e)
+                    result.update(status="failed", error=str(e))
+                self.results[index] = result
+
+        await asyncio.gather(*(dial(i, t) for i, t in enumerate(self.targets)))
+        self.status = "completed"
+        self.finished_at = time.time()
+
+    def summary(self) -> dict:
+        done = [r for r in self.results if r is not None]
+        return {
+            "campaign_id": self.id,
+            "status": self.status,
+            "total": len(self.targets),
+            "initiated": sum(1 for r in done if r["status"] == "initiated"),
+            "failed": sum(1 for r in done if r["status"] == "failed"),
+            "pending": len(self.targets) - len(done),
+            "results": done,
+        }
+
+
+_campaigns = {}
+
+
+def load_customer_numbers(customer_ids, directory=customer_directory):
+    """
+    Resolve customer IDs to dial targets. A record's ID is its "id" field,
+    or its position in the customer file when it has none.
+    """
+    targets, missing = [], []
+    for customer_id in customer_ids:
+        record = directory.get(customer_id)
+        if record is None:
+            missing.append(customer_id)
+        else:
+            targets.append({"to": record["phone"], "customer_id": str(customer_id)})
+    return targets, missing
+
+
+def start_campaign(targets, concurrency: int = DIAL_CONCURRENCY,
+                   calls_per_second: float = DIAL_CALLS_PER_SECOND, on_initiated=None, delay_s: float = 0) -> Campaign:
+    """Begin dialing `targets` in the background (after `delay_s`) and return the campaign handle."""
+    _prune_campaigns()
+    campaign = Campaign(targets, concurrency, calls_per_second, on_initiated, delay_s)
+    campaign.task = asyncio.create_task(campaign.run(), name=f"campaign:{campaign.id}")
+    _campaigns[campaign.id] = campaign
+    return campaign
+
+
+def get_campaign(campaign_id: str):
+    return _campaigns.get(campaign_id)
+
+
+def _prune_campaigns():
+    cutoff = time.time() - CAMPAIGN_RETENTION_S
+    for campaign_id in [c.id for c in _campaigns.values() if c.finished_at and c.finished_at < cutoff]:
+        del _campaigns[campaign_id]
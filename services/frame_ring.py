@@ -0,0 +1,60 @@
+# services/frame_ring.py
+
+
+class FrameRing:
+    """
+    Fixed-capacity FIFO of equal-sized audio frames in one preallocated bytearray.
+
+    Frames are copied into and read out of their slots in place, so a call's
+    audio buffers are allocated once and never grow. `written` and `read`
+    count frames ever pushed and popped; a position in that sequence lines a
+    mark or signal up with the audio queued before it.
+    """
+
+    __slots__ = ("frame_bytes", "capacity", "written", "read", "_view")
+
+    def __init__(self, frame_bytes: int, capacity: int):
+        self.frame_bytes = frame_bytes
+        self.capacity = max(1, capacity)
+        self.written = 0
+        self.read = 0
+        self._view = memoryview(bytearray(frame_bytes * self.capacity))
+
+    def __len__(self):
+        return self.written - self.read
+
+    @property
+    def free(self) -> int:
+        return self.capacity - (self.written - self.read)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._view)
+
+    def _slot(self, index: int) -> memoryview:
+        start = index % self.capacity * self.frame_bytes
+        return self._view[start:start + self.frame_bytes]
+
+    def push(self, frame) -> bool:
+        """Copy one frame (any bytes-like of exactly `frame_bytes`) in; False if the ring is full."""
+        if self.written - self.read >= self.capacity:
+            return False
+        self._slot(self.written)[:] = frame
+        self.written += 1
+        return True
+
+    def peek(self) -> memoryview:
+        """The oldest frame, in place: valid until it is popped and its slot written again."""
+        return self._slot(self.read)
+
+    def pop(self):
+        """Drop the oldest frame."""
+        if self.written > self.read:
+            self.read += 1
+
+    def copy(self, start: int, end: int) -> bytes:
+        """Frames at positions [start, end), which must still be in the ring, as one bytes object."""
+        return b"".join(self._slot(i) for i in range(start, end))
+
+    def clear(self):
+        self.read = self.written
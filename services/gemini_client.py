@@ -29,42 +29,182 @@
 
 # services/gemini_client.py
 
+import asyncio
 import os
-import base64
+import ssl
+import time
+from functools import lru_cache
+from urllib.parse import urlsplit
 from google import genai
-from google.genai.types import LiveConnectConfig, HttpOptions, Modality
-
-# Load service account from base64 environment variable (for Railway)
-def load_service_account_from_env():
-    base64_key = os.getenv("GOOGLE_SERVICE_ACCOUNT_BASE64")
-    if base64_key:
-        key_path = "/tmp/service_account.json"
-        with open(key_path, "wb") as f:
-            f.write(base64.b64decode(base64_key))
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = key_path
-
-# Ensure credentials are loaded before initializing Gemini
-load_service_account_from_env()
+from google.genai.types import (
+    LiveConnectConfig, HttpOptions, Modality, Content, Part, RealtimeInputConfig, AutomaticActivityDetection,
+    AudioTranscriptionConfig, SessionResumptionConfig, ContextWindowCompressionConfig, SlidingWindow,
+)
+from services.tools import TOOLS
+from utils.google_credentials import load_google_credentials, refresh_google_credentials
+from config import (
+    VAD_ACTIVITY_SIGNALS, RECORDING_ENABLED, RECORDING_TRANSCRIPTS, LIVE_COMPRESSION_TRIGGER_TOKENS,
+    LIVE_COMPRESSION_TARGET_TOKENS,
+)
 
 # Project settings
 PROJECT_ID = "qwiklabs-gcp-01-26190ba831b1"
 LOCATION = "us-central1"
 MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
 
-# Initialize Gemini Client using Vertex AI backend
-client = genai.Client(
-    vertexai=True,
-    project=PROJECT_ID,
-    location=LOCATION,
-    http_options=HttpOptions(api_version="v1beta1"),
+# Set to e.g. ws://127.0.0.1:9100 to use the local stand-in (loadtest/fake_live_server.py)
+GEMINI_LIVE_URL = os.getenv("GEMINI_LIVE_URL")
+
+_client = None
+
+
+def get_client() -> genai.Client:
+    """The Gemini client, built on first use (credentials are only decoded then)."""
+    global _client
+    if _client is None:
+        if GEMINI_LIVE_URL:
+            # Without project/location the SDK connects straight to base_url with no Google auth
+            client = genai.Client(
+                vertexai=True,
+                http_options=HttpOptions(base_url=GEMINI_LIVE_URL, api_version="v1beta1"),
+            )
+            if GEMINI_LIVE_URL.startswith("ws://"):
+                # The SDK always hands an SSL context to the websocket connect, which plain ws:// rejects
+                client._api_client._websocket_ssl_ctx = {}
+        else:
+            client = genai.Client(
+                vertexai=True,
+                project=PROJECT_ID,
+                location=LOCATION,
+                credentials=load_google_credentials(),
+                http_options=HttpOptions(api_version="v1beta1"),
+            )
+        _client = client
+    return _client
+
+
+def live_endpoint():
+    """(host, port, tls) of the Live API websocket."""
+    if GEMINI_LIVE_URL:
+        url = urlsplit(GEMINI_LIVE_URL)
+        tls = url.scheme in ("wss", "https")
+        return url.hostname, url.port or (443 if tls else 80), tls
+    return f"{LOCATION}-aiplatform.googleapis.com", 443, True
+
+
+async def prewarm_connection():
+    """
+    Do the slow parts of the first Live connect ahead of time: fetch an
+    OAuth token, resolve the endpoint and complete a TLS handshake (which
+    also loads the CA bundle). Returns {step: ms}.
+    """
+    timings = {}
+    started = time.perf_counter()
+    if not GEMINI_LIVE_URL and await asyncio.to_thread(refresh_google_credentials):
+        timings["access_token"] = (time.perf_counter() - started) * 1000
+
+    host, port, tls = live_endpoint()
+    started = time.perf_counter()
+    await asyncio.get_running_loop().getaddrinfo(host, port)
+    timings["dns"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    _, writer = await asyncio.open_connection(host, port, ssl=ssl.create_default_context() if tls else None)
+    writer.close()
+    await writer.wait_closed()
+    timings["tls_connect" if tls else "tcp_connect"] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+SYSTEM_INSTRUCTION = (
+    "You are a friendly voice assistant for a car service centre. Help callers book, "
+    "reschedule or ask about car service appointments. Keep answers short and conversational. "
+    "Use the tools to look up customers, find free times and make bookings; never invent "
+    "appointment times or confirm a booking the tools did not make."
+)
+
+# Gemini configuration to receive audio responses, with the booking tools declared
+CONFIG = LiveConnectConfig(
+    response_modalities=[Modality.AUDIO],
+    system_instruction=SYSTEM_INSTRUCTION,
+    tools=TOOLS,
+    # With explicit activity signals our inbound VAD marks the turns, not Gemini
+    realtime_input_config=RealtimeInputConfig(
+        automatic_activity_detection=AutomaticActivityDetection(disabled=True)
+    ) if VAD_ACTIVITY_SIGNALS else None,
+    # Transcripts of both sides, for the call recorder
+    input_audio_transcription=AudioTranscriptionConfig() if RECORDING_ENABLED and RECORDING_TRANSCRIPTS else None,
+    output_audio_transcription=AudioTranscriptionConfig() if RECORDING_ENABLED and RECORDING_TRANSCRIPTS else None,
+    # Resumable after a drop (services/live_session.py); transparent, so each new handle says which
+    # of our messages it already includes
+    session_resumption=SessionResumptionConfig(transparent=True),
+    # Long calls keep going on a sliding context window instead of hitting the session limit
+    context_window_compression=ContextWindowCompressionConfig(
+        trigger_tokens=LIVE_COMPRESSION_TRIGGER_TOKENS,
+        sliding_window=SlidingWindow(target_tokens=LIVE_COMPRESSION_TARGET_TOKENS),
+    ) if LIVE_COMPRESSION_TRIGGER_TOKENS else None,
 )
 
-# Gemini configuration to receive audio responses
-CONFIG = LiveConnectConfig(response_modalities=[Modality.AUDIO])
+CUSTOMER_FIELDS = ("name", "phone", "car_name", "car_model", "service_type")
+
+
+def customer_context(customer: dict) -> str:
+    """Short description of the caller for the model."""
+    car = " ".join(filter(None, (customer.get("car_name"), customer.get("car_model"))))
+    parts = [f"The caller is {customer.get('name') or 'an existing customer'} ({customer.get('phone')})."]
+    if car:
+        parts.append(f"They drive a {car}.")
+    if customer.get("service_type"):
+        parts.append(f"Their usual service is {customer['service_type']}.")
+    parts.append("Greet them by name and use these details instead of asking for them again.")
+    return " ".join(parts)
+
+
+@lru_cache(maxsize=4096)
+def _compiled_config(customer_key: tuple) -> LiveConnectConfig:
+    customer = dict(customer_key)
+    return CONFIG.model_copy(update={"system_instruction": f"{SYSTEM_INSTRUCTION}\n\n{customer_context(customer)}"})
 
-def start_live_session():
+
+def build_live_config(customer: dict = None) -> LiveConnectConfig:
+    """Per-customer LiveConnectConfig, cached so repeat callers reuse the compiled config."""
+    if not customer:
+        return CONFIG
+    # The key holds the fields we render, so an edited record compiles a fresh config
+    return _compiled_config(tuple((f, customer.get(f)) for f in CUSTOMER_FIELDS))
+
+
+def resumed_config(config: LiveConnectConfig, handle: str) -> LiveConnectConfig:
+    """`config` set to resume the session a resumption handle refers to."""
+    return config.model_copy(update={"session_resumption": SessionResumptionConfig(handle=handle, transparent=True)})
+
+
+def customer_context_turn(customer: dict) -> Content:
+    """Caller context for sessions opened before the customer was known (e.g. from the pool)."""
+    return Content(role="user", parts=[Part(text=customer_context(customer))])
+
+
+def start_live_session(config: LiveConnectConfig = CONFIG):
     """Return Gemini Live session async context manager."""
-    return client.aio.live.connect(model=MODEL, config=CONFIG)
+    return get_client().aio.live.connect(model=MODEL, config=config)
+
+
+# Speaks fixed phrases (greetings, fillers) in the agent's voice, for the prompt audio cache
+SPEECH_CONFIG = LiveConnectConfig(
+    response_modalities=[Modality.AUDIO],
+    system_instruction="Read the user's text aloud exactly as written, in a warm, natural tone. Say nothing else.",
+)
+
+
+async def synthesize_speech(text: str):
+    """Yield Gemini's 24 kHz PCM16 audio chunks for `text`, spoken once."""
+    async with start_live_session(SPEECH_CONFIG) as session:
+        await session.send_client_content(turns=Content(role="user", parts=[Part(text=text)]), turn_complete=True)
+        async for message in session.receive():
+            if message.data:
+                yield message.data
+            if message.server_content and message.server_content.turn_complete:
+                return
 
 class GeminiAudioSession:
     """
@@ -0,0 +1,132 @@
+# services/inbound_pipeline.py
+
+import asyncio
+import logging
+import weakref
+from collections import deque
+from prometheus_client import Counter
+from services.audio_codec import FRAME_MS, GEMINI_INPUT_FRAME_BYTES
+from services.frame_ring import FrameRing
+from services.logs import log_sampled
+from config import INBOUND_QUEUE_FRAMES, INBOUND_BATCH_MS, INBOUND_OVERFLOW_POLICY
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest")
+
+# Live pipelines, for process-wide queue gauges
+_active_pipelines = weakref.WeakSet()
+
+DROPPED_FRAMES = Counter("voice_inbound_dropped_frames", "Inbound frames dropped on overflow")
+
+
+class InboundAudioPipeline:
+    """
+    Decouples the Twilio websocket reader from Gemini sends.
+
+    The reader calls `put()` (never blocks); a sender task drains the bounded
+    queue and sends `batch_ms` of audio per upstream message. When Gemini
+    falls behind and the queue is full, the overflow policy decides whether
+    the oldest or the newest audio is dropped. `signal()` queues activity
+    signals in order with the audio. Frames and the outgoing batch live in
+    buffers allocated once per call.
+    """
+
+    def __init__(self, send, max_frames: int = INBOUND_QUEUE_FRAMES,
+                 batch_ms: int = INBOUND_BATCH_MS, overflow: str = INBOUND_OVERFLOW_POLICY,
+                 send_signal=None, frame_bytes: int = GEMINI_INPUT_FRAME_BYTES):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        self.send = send                # async callable taking PCM bytes
+        self.send_signal = send_signal  # async callable taking a signal name, e.g. "activity_end"
+        self.max_frames = max_frames
+        self.batch_frames = max(1, batch_ms // FRAME_MS)
+        self.overflow = overflow
+        self._frames = FrameRing(frame_bytes, max_frames)   # PCM frames waiting to be batched
+        self._signals = deque()  # (frame position, signal name): goes out once the frames before it have
+        self._wakeup = asyncio.Event()
+        self._batch = memoryview(bytearray(self.batch_frames * frame_bytes))  # the next upstream message ...
+        self._batch_len = 0                                                   # ... and how much is filled
+
+        self.dropped_frames = 0
+        self.batches_sent = 0
+        self.max_depth = 0
+        _active_pipelines.add(self)
+
+    @property
+    def depth(self) -> int:
+        return len(self._frames)
+
+    @property
+    def buffer_bytes(self) -> int:
+        return self._frames.nbytes + len(self._batch)
+
+    def put(self, pcm):
+        """Copy 20 ms of PCM (bytes or an int16 array) from the reader without awaiting."""
+        data = memoryview(pcm).cast("B")
+        size = self._frames.frame_bytes
+        for start in range(0, len(data) - size + 1, size):
+            if not self._frames.free:
+                self.dropped_frames += 1
+                DROPPED_FRAMES.inc()
+                log_sampled(logging.WARNING, "inbound_overflow", 5.0, "Inbound queue full; dropping %s audio",
+                            "new" if self.overflow == "drop_newest" else "old", dropped_frames=self.dropped_frames)
+                if self.overflow == "drop_newest":
+                    continue
+                self._frames.pop()
+            self._frames.push(data[start:start + size])
+        self.max_depth = max(self.max_depth, len(self._frames))
+        self._wakeup.set()
+
+    def signal(self, name: str):
+        """Queue a signal to go out after the audio queued so far; signals are never dropped."""
+        self._signals.append((self._frames.written, name))
+        self._wakeup.set()
+
+    async def run(self):
+        """Sender loop; run as a task for the lifetime of the stream."""
+        while True:
+            if not self._frames and not self._signals:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self._take()
+
+    async def flush(self):
+        """Send whatever is queued, e.g. when the Twilio stream stops."""
+        while self._frames or self._signals:
+            await self._take()
+        if self._batch_len:
+            await self._send()
+
+    async def _take(self):
+        if self._signals and self._signals[0][0] <= self._frames.read:
+            # A signal closes the current batch so it lands after that audio
+            _, name = self._signals.popleft()
+            if self._batch_len:
+                await self._send()
+            if self.send_signal:
+                await self.send_signal(name)
+            return
+        frame = self._frames.peek()
+        self._batch[self._batch_len:self._batch_len + len(frame)] = frame
+        self._batch_len += len(frame)
+        self._frames.pop()
+        if self._batch_len >= len(self._batch):
+            await self._send()
+
+    async def _send(self):
+        # The upstream message gets its own bytes; the batch buffer is refilled while it's in flight
+        pcm = bytes(self._batch[:self._batch_len])
+        self._batch_len = 0
+        await self.send(pcm)
+        self.batches_sent += 1
+
+
+def queue_gauges() -> dict:
+    """Inbound queue depth across all live calls in this process."""
+    depths = [p.depth for p in _active_pipelines]
+    return {
+        "inbound_pipelines": len(depths),
+        "inbound_queue_depth_total": sum(depths),
+        "inbound_queue_depth_max": max(depths, default=0),
+        "inbound_buffer_bytes_total": sum(p.buffer_bytes for p in _active_pipelines),
+    }
@@ -0,0 +1,335 @@
+# services/live_session.py
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from google.genai import errors
+from google.genai.types import Blob
+from prometheus_client import Counter, Histogram
+from websockets.exceptions import ConnectionClosed
+from services.audio_codec import FRAME_MS, GEMINI_INPUT_FRAME_BYTES
+from services.frame_ring import FrameRing
+from services.gemini_client import start_live_session, build_live_config, resumed_config
+from services.logs import call_sid_var, log_sampled
+from config import (
+    LIVE_REPLAY_MS, LIVE_RECONNECT_BASE_MS, LIVE_RECONNECT_MAX_DELAY_MS, LIVE_RECONNECT_GIVE_UP_S,
+    LIVE_CONNECT_TIMEOUT_S,
+)
+
+RECONNECTS = Counter("voice_gemini_reconnects", "Gemini Live connections re-opened mid-call, by outcome",
+                     ["outcome"])
+RECOVERY_SECONDS = Histogram("voice_gemini_recovery_seconds",
+                             "From a lost Gemini Live connection to a new one with the caller's audio replayed",
+                             buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0))
+
+# A lost Live websocket: the SDK raises APIError (with the close code) from receive, ConnectionClosed from sends
+CONNECTION_ERRORS = (errors.APIError, ConnectionClosed, OSError)
+
+
+class LiveSessionLost(Exception):
+    """Gemini Live could not be reconnected within LIVE_RECONNECT_GIVE_UP_S."""
+
+
+class ReplayBuffer:
+    """
+    Realtime input sent to Gemini that its resumable state may not hold yet.
+
+    Audio frames are copied into a preallocated FrameRing; `_messages` has
+    one [index, start, end, signal] per upstream message, where start/end
+    are ring positions of its frames and `signal` is the send_realtime_input
+    keywords of an activity signal (None for audio). `index` numbers the
+    message on the current connection, None while unsent. Messages are
+    addressed by sequence number: `first` is the oldest kept, `end` one past
+    the newest. When the ring is full the oldest audio goes.
+    """
+
+    def __init__(self, replay_ms: int = LIVE_REPLAY_MS, frame_bytes: int = GEMINI_INPUT_FRAME_BYTES):
+        self._frames = FrameRing(frame_bytes, replay_ms // FRAME_MS)
+        self._pad = bytearray(frame_bytes)  # the last frame of an audio message that doesn't fill one
+        self._messages = deque()
+        self.first = 0
+        self.mime_type = None
+        self.dropped_frames = 0
+
+    @property
+    def end(self) -> int:
+        return self.first + len(self._messages)
+
+    @property
+    def nbytes(self) -> int:
+        return self._frames.nbytes + len(self._pad)
+
+    @property
+    def buffered_ms(self) -> int:
+        return len(self._frames) * FRAME_MS
+
+    def record(self, kwargs: dict, index=None):
+        """Keep one send_realtime_input call's keywords (audio or a signal)."""
+        frames = self._frames
+        start = frames.written
+        audio = kwargs.get("audio")
+        if audio is None:
+            self._messages.append([index, start, start, kwargs])
+            return
+        self.mime_type = audio.mime_type
+        data = memoryview(audio.data)
+        size = frames.frame_bytes
+        for offset in range(0, len(data), size):
+            frame = data[offset:offset + size]
+            if len(frame) < size:
+                self._pad[:len(frame)] = frame
+                self._pad[len(frame):] = bytes(size - len(frame))
+                frame = self._pad
+            if not frames.free:
+                self._drop_oldest()
+            frames.push(frame)
+        self._messages.append([index, start, frames.written, None])
+
+    def _drop_oldest(self):
+        frames = self._frames
+        frames.pop()
+        self.dropped_frames += 1
+        # Audio whose frames are all gone, and signals that came before the lost frame
+        while self._messages and self._messages[0][2] <= frames.read \
+                and (self._messages[0][3] is None or self._messages[0][2] < frames.read):
+            self._messages.popleft()
+            self.first += 1
+
+    def consumed(self, index: int):
+        """Forget messages up to `index`: the resumable state includes them."""
+        while self._messages and self._messages[0][0] is not None and self._messages[0][0] <= index:
+            end = self._messages.popleft()[2]
+            self.first += 1
+            while self._frames.read < end:
+                self._frames.pop()
+
+    def message(self, seq: int) -> dict:
+        """send_realtime_input keywords to resend message `seq`."""
+        index, start, end, signal = self._messages[seq - self.first]
+        if signal is not None:
+            return signal
+        return {"audio": Blob(data=self._frames.copy(max(start, self._frames.read), end), mime_type=self.mime_type)}
+
+    def mark_sent(self, seq: int, index: int):
+        if seq >= self.first:
+            self._messages[seq - self.first][0] = index
+
+
+class ResilientLiveSession:
+    """
+    A call's Gemini Live session that outlives its websocket.
+
+    Stands in for the SDK session (send_realtime_input, send_client_content,
+    send_tool_response, receive). It keeps the latest resumption handle and,
+    in a ReplayBuffer, the caller audio and signals Gemini hasn't confirmed.
+    When the connection drops (or Gemini sends GoAway) sends are buffered
+    while it reconnects with backoff, resuming by handle, then everything
+    unconfirmed is replayed ahead of new audio. Before the first handle it
+    can only start a fresh session with the call's config. Tool responses
+    and text turns are not replayed: a resumed session holds no state past
+    its handle, so Gemini asks for the tool again.
+
+    `on_drop()` runs when a connection is lost, `on_recovered(outcome,
+    seconds)` once audio flows again. Giving up is final: `receive()` then
+    raises LiveSessionLost and sends are discarded.
+    """
+
+    def __init__(self, warm, customer: dict = None, connect=start_live_session, replay_ms: int = LIVE_REPLAY_MS,
+                 on_drop=None, on_recovered=None):
+        self.warm = warm          # holds the first connection
+        self.customer = customer  # fresh sessions get this caller's config
+        self.session = warm.session
+        self.replay = ReplayBuffer(replay_ms)
+        self.handle = None
+        self.sent = 0             # client messages on this connection, the setup counting as 0
+        self.reconnects = 0
+        self.on_drop = on_drop
+        self.on_recovered = on_recovered
+        self._connect = connect
+        self._ctx = None          # a reconnected session's context manager
+        self._connected = asyncio.Event()
+        self._connected.set()
+        self._failed = None
+        self._reconnect_task = None
+        self._closing = set()
+        self._answering = False
+        self._go_away = False
+
+    @property
+    def reconnecting(self) -> bool:
+        return not self._connected.is_set()
+
+    @property
+    def buffer_bytes(self) -> int:
+        return self.replay.nbytes
+
+    # --- sending ---
+
+    async def send_realtime_input(self, **kwargs):
+        """Send now, or just buffer while reconnecting; either way it is kept until Gemini confirms it."""
+        if self._failed is not None:
+            return
+        if not self._connected.is_set():
+            self.replay.record(kwargs)
+            return
+        session = self.session
+        self.sent += 1
+        self.replay.record(kwargs, self.sent)
+        try:
+            await session.send_realtime_input(**kwargs)
+        except CONNECTION_ERRORS as e:
+            self._lost(session, e)
+
+    async def send_client_content(self, **kwargs):
+        await self._send_once("send_client_content", kwargs)
+
+    async def send_tool_response(self, **kwargs):
+        await self._send_once("send_tool_response", kwargs)
+
+    async def _send_once(self, method: str, kwargs: dict):
+        if self._failed is not None:
+            return
+        if not self._connected.is_set():
+            logging.info("Gemini Live reconnecting; not sending %s", method)
+            return
+        session = self.session
+        self.sent += 1
+        try:
+            await getattr(session, method)(**kwargs)
+        except CONNECTION_ERRORS as e:
+            self._lost(session, e)
+
+    # --- receiving ---
+
+    async def receive(self):
+        """Like the SDK's: the messages of one model turn, carried on over reconnects."""
+        while True:
+            await self._connected.wait()
+            if self._failed is not None:
+                raise LiveSessionLost(str(self._failed)) from self._failed
+            session = self.session
+            try:
+                async for message in session.receive():
+                    if message.session_resumption_update:
+                        self._on_resumption_update(message.session_resumption_update)
+                    if message.go_away:
+                        logging.info("Gemini Live going away in %s; moving the session", message.go_away.time_left)
+                        self._go_away = True
+                    content = message.server_content
+                    if content:
+                        if content.model_turn:
+                            self._answering = True
+                        if content.turn_complete or content.interrupted:
+                            self._answering = False
+                    yield message
+                    # Told to go: move at a turn boundary, so no answer is cut off. The old connection
+                    # is read until its turn ends or it closes; then this carries on with the new one.
+                    if self._go_away and not self._answering:
+                        self._lost(session, "GoAway")
+                return
+            except CONNECTION_ERRORS as e:
+                self._lost(session, e)
+
+    def _on_resumption_update(self, update):
+        # Only resumable updates carry a handle, and only their index says what the handle's state holds
+        if not update.resumable or not update.new_handle:
+            return
+        self.handle = update.new_handle
+        index = update.last_consumed_client_message_index
+        self.replay.consumed(self.sent if index is None else int(index))
+
+    # --- reconnecting ---
+
+    def _lost(self, session, reason):
+        if session is not self.session or not self._connected.is_set() or self._failed is not None:
+            return  # already reconnecting, or given up
+        self._connected.clear()
+        self._go_away = self._answering = False
+        logging.warning("🔌 Gemini Live connection lost (%s); reconnecting", reason,
+                        extra={"resumable": self.handle is not None})
+        self._reconnect_task = asyncio.create_task(self._reconnect(time.monotonic()),
+                                                   name=f"gemini_reconnect:{call_sid_var.get()}")
+        if self.on_drop:
+            self.on_drop()
+
+    async def _reconnect(self, lost_at: float):
+        self._close_soon()
+        delay = LIVE_RECONNECT_BASE_MS / 1000
+        attempt = 0
+        while True:
+            attempt += 1
+            handle = self.handle
+            config = build_live_config(self.customer)
+            ctx = self._connect(resumed_config(config, handle) if handle else config)
+            try:
+                session = await asyncio.wait_for(ctx.__aenter__(), LIVE_CONNECT_TIMEOUT_S)
+                self._ctx, self.session, self.sent = ctx, session, 0
+                replayed = await self._replay(session)
+                break
+            except Exception as e:
+                if self._ctx is ctx:
+                    self._close_soon()
+                elapsed = time.monotonic() - lost_at
+                if elapsed + delay > LIVE_RECONNECT_GIVE_UP_S:
+                    RECONNECTS.labels("failed").inc()
+                    logging.error("❌ Gemini Live did not come back after %d attempts in %.1f s: %s",
+                                  attempt, elapsed, e)
+                    self._failed = e
+                    self._connected.set()
+                    return
+                log_sampled(logging.WARNING, "gemini_reconnect", 1.0,
+                            "Gemini Live reconnect attempt %d failed: %s", attempt, e)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, LIVE_RECONNECT_MAX_DELAY_MS / 1000)
+
+        recovery = time.monotonic() - lost_at
+        outcome = "resumed" if handle else "fresh"
+        self.reconnects += 1
+        RECONNECTS.labels(outcome).inc()
+        RECOVERY_SECONDS.observe(recovery)
+        if not handle:
+            logging.warning("Gemini Live had issued no resumption handle yet; the conversation starts over")
+        logging.info("🔁 Gemini Live %s after %.0f ms (attempt %d, %d messages replayed)", outcome,
+                     recovery * 1000, attempt, replayed,
+                     extra={"outcome": outcome, "recovery_ms": round(recovery * 1000), "replayed": replayed})
+        if self.on_recovered:
+            self.on_recovered(outcome, recovery)
+
+    async def _replay(self, session) -> int:
+        """Resend the buffered input, then mark the session connected (new sends queue behind the replay)."""
+        replay = self.replay
+        seq = replay.first
+        count = 0
+        while True:
+            seq = max(seq, replay.first)  # audio dropped from a full buffer meanwhile
+            if seq >= replay.end:
+                break
+            kwargs = replay.message(seq)
+            self.sent += 1
+            replay.mark_sent(seq, self.sent)
+            await session.send_realtime_input(**kwargs)
+            seq += 1
+            count += 1
+        self._connected.set()
+        return count
+
+    def _close_soon(self):
+        """Close the current connection in the background; a dead socket can take its close timeout."""
+        if self._ctx is not None:
+            ctx, self._ctx = self._ctx, None
+            closing = ctx.__aexit__(None, None, None)
+        else:
+            closing = self.warm.close()
+        task = asyncio.create_task(closing)
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def close(self):
+        if self._reconnect_task and not self._reconnect_task.done():
+            self._reconnect_task.cancel()
+            await asyncio.gather(self._reconnect_task, return_exceptions=True)
+        if self._ctx is not None:
+            self._close_soon()
+        await asyncio.gather(*self._closing, return_exceptions=True)
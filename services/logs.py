@@ -0,0 +1,192 @@
+# services/logs.py
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from prometheus_client import Counter
+from config import LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_MAX, LOG_ACCESS
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+# The call a log line belongs to; set once per media stream, inherited by the tasks it starts
+call_sid_var = contextvars.ContextVar("call_sid", default=None)
+stream_sid_var = contextvars.ContextVar("stream_sid", default=None)
+
+LINES_DROPPED = Counter("voice_log_lines_dropped", "Log lines dropped because the writer fell behind")
+
+# LogRecord attributes that aren't `extra=` fields (uvicorn adds an ANSI-coloured copy of its message)
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "color_message"}
+
+
+def bind_call(call_sid: str = None, stream_sid: str = None):
+    """Tag every log line from this task (and tasks it creates from now on) with the call."""
+    call_sid_var.set(call_sid)
+    stream_sid_var.set(stream_sid)
+
+
+class CallContextFilter(logging.Filter):
+    """Copies the call context onto the record in the task that logged it; the writer thread can't see it."""
+
+    def filter(self, record):
+        record.call_sid = call_sid_var.get()
+        record.stream_sid = stream_sid_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, call IDs and any `extra=` fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if orjson:
+            return orjson.dumps(entry, default=str).decode("utf-8")
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local runs, with the CallSid when there is one."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        call_sid = getattr(record, "call_sid", None)
+        return f"{line} [{call_sid}]" if call_sid else line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread and never waits: when the queue is
+    full (stdout is backed up) the record is dropped and counted instead of
+    stalling the event loop.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LINES_DROPPED.inc()
+
+    def prepare(self, record):
+        # Format the message here (arguments may change after this returns), but leave JSON to the listener
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _Sampler:
+    """Per-key rate limit for log lines that can fire on every audio frame."""
+
+    def __init__(self):
+        self._last = {}  # (key, call_sid) -> [last emit time, suppressed since]
+
+    def allow(self, key: str, interval_s: float):
+        """None to stay quiet, else how many lines were suppressed since the last one."""
+        slot = (key, call_sid_var.get())
+        now = time.monotonic()
+        state = self._last.get(slot)
+        if state is not None and now - state[0] < interval_s:
+            state[1] += 1
+            return None
+        suppressed = state[1] if state else 0
+        self._last[slot] = [now, 0]
+        if len(self._last) > 10000:  # ended calls' keys
+            self._last = {k: v for k, v in self._last.items() if now - v[0] < 60}
+        return suppressed
+
+
+_sampler = _Sampler()
+
+
+def log_sampled(level: int, key: str, interval_s: float, msg: str, *args, **fields):
+    """
+    Log at most once per `interval_s` per key and call; the next line that
+    gets through reports how many were suppressed. For per-frame events.
+    """
+    if not logging.getLogger().isEnabledFor(level):
+        return
+    suppressed = _sampler.allow(key, interval_s)
+    if suppressed is not None:
+        logging.log(level, msg, *args, extra={**fields, "suppressed": suppressed or None})
+
+
+_listener = None
+_handler = None
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None):
+    """
+    Route the root and uvicorn loggers through a bounded queue to one
+    background thread that does the writing. Safe to call more than once.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return _handler
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_MAX)
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    _handler = DroppingQueueHandler(log_queue)
+    _handler.addFilter(CallContextFilter())
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(level.upper())
+
+    # uvicorn configures its own stream handlers; send its lines through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logger = logging.getLogger(name)
+        logger.handlers = []
+        logger.propagate = True
+    if not LOG_ACCESS:
+        logging.getLogger("uvicorn.access").disabled = True
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _handler
+
+
+def stop_logging():
+    """Write out whatever is queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
+            pass  # stdout never caught up; the daemon thread goes with the process
+        _listener = None
+
+
+def dropped_lines() -> int:
+    return _handler.dropped if _handler else 0
@@ -1,47 +1,315 @@
 # services/media_stream_handler.py
 
 import asyncio
-import base64
-import json
-from services.gemini_client import start_live_session
+import logging
+import time
+from google.genai.types import Blob, ActivityStart, ActivityEnd
+from services.audio_codec import GEMINI_INPUT_MIME
+from services.twilio_frames import loads
+from services.call_context import CallContext
+from services.outbound_scheduler import OutboundAudioScheduler
+from services.admission import admission
+from services.barge_in import BargeInController, SpeechOnsetDetector
+from services.inbound_pipeline import InboundAudioPipeline
+from services.session_warmer import session_warmer
+from services.live_session import ResilientLiveSession, LiveSessionLost
+from services.customer_directory import customer_directory
+from services.gemini_client import customer_context_turn
+from services.tools import ToolRunner
+from services.call_metrics import CallTimeline, ACTIVE_CALLS, CALLS
+from services.call_registry import call_registry
+from services.call_recorder import recording_writer
+from services.prompt_audio import prompt_audio, greeting_text, PROMPTS, TOOL_FILLERS
+from services.vad import VoiceActivityGate, VadConfig
+from services.logs import bind_call, log_sampled
+from config import VAD_ACTIVITY_SIGNALS, PROMPT_FILLER_DELAY_MS, LIVE_RECONNECT_FILLER_MS, LIVE_LOST_GOODBYE_MAX_S
+
+# Upstream turn signals, as send_realtime_input keyword arguments
+GEMINI_SIGNALS = {
+    "activity_start": {"activity_start": ActivityStart()},
+    "activity_end": {"activity_end": ActivityEnd()},
+    "audio_stream_end": {"audio_stream_end": True},
+}
+
+async def _wait_for_start(messages):
+    """Skip Twilio's `connected` event and return the `start` payload."""
+    async for message in messages:
+        data = loads(message)
+        if data.get("event") == "start":
+            return data["start"]
+    return None
 
 async def handle_twilio_media(websocket):
-    print("🎧 Incoming WebSocket connection from Twilio")
-
-    async with start_live_session() as session:
-        print("🧠 Gemini session started")
-
-        # Task to stream audio from Gemini → Twilio
-        async def gemini_to_twilio():
-            async for chunk in session.stream_responses():
-                if chunk.audio:
-                    await websocket.send(
-                        json.dumps({
-                            "event": "media",
-                            "media": {
-                                "payload": base64.b64encode(chunk.audio).decode("utf-8")
-                            }
-                        })
-                    )
-
-        gemini_task = asyncio.create_task(gemini_to_twilio())
+    logging.info("🎧 Incoming WebSocket connection from Twilio")
+    timeline = CallTimeline()
+    connected_at = timeline.accepted_at
+    ACTIVE_CALLS.inc()
+    CALLS.inc()
+    try:
+        await _handle_stream(websocket, timeline, connected_at)
+    finally:
+        ACTIVE_CALLS.dec()
+        timeline.end()
+        if timeline.call_sid:
+            # Final snapshot so any worker can serve this call's timeline
+            call_registry.update_soon(timeline.call_sid, status="completed", timeline=timeline.to_dict())
+
+async def _take_ownership(call_sid, stream_sid):
+    """
+    Record this worker as the call's owner. If /voice or /call pre-warmed a
+    session on another worker, that one is released there; this call uses
+    the local pool (or a cold session) instead. Likewise the admission
+    reservation: the stream counts here now, so another worker's is freed.
+    """
+    previous = await call_registry.claim(call_sid, stream_sid=stream_sid, status="streaming")
+    warm_worker = previous.get("warm_worker")
+    if warm_worker and warm_worker != call_registry.worker_id:
+        await call_registry.route(call_sid, "release_session", worker_id=warm_worker)
+    await admission.release_elsewhere(call_sid, previous.get("admitted_worker"))
+
+async def _handle_stream(websocket, timeline, connected_at):
+    messages = websocket.iter_text()
+    start = await _wait_for_start(messages)
+    if start is None:
+        return
+    call_sid = start.get("callSid")
+    # Everything logged from here, including the tasks below, carries the CallSid/StreamSid
+    bind_call(call_sid, start.get("streamSid"))
+    # Per-call task names, so slow-callback reports and /admin/profile show which call and which loop
+    asyncio.current_task().set_name(f"twilio_reader:{call_sid}")
+    timeline.start(call_sid)
+    call_registry.run_soon(_take_ownership(call_sid, start.get("streamSid")))
+    # /voice passes the customer's number, ID and campaign as <Parameter>s on the stream
+    params = start.get("customParameters", {})
+    caller_phone = params.get("phone")
+    customer = (customer_directory.get(params["customer_id"]) if params.get("customer_id") else None) \
+        or customer_directory.lookup(caller_phone)
+    if params.get("campaign"):
+        timeline.event("campaign", campaign=params["campaign"])
+    try:
+        vad = VoiceActivityGate(VadConfig.from_params(params))
+    except ValueError as e:
+        logging.warning("Ignoring bad VAD parameters (%s); using defaults", e)
+        vad = VoiceActivityGate()
+    logging.info("🔗 Twilio stream started", extra={"campaign": params.get("campaign")})
+
+    # Decode buffer, transcoders and frame rings, allocated once for the call
+    call = CallContext(call_sid, start["streamSid"])
+    parser, inbound, outbound = call.parser, call.inbound, call.outbound  # locals for the per-frame loop
+    # Compliance recording: the media loop only appends; a background thread writes the files
+    recorder = recording_writer.open(call_sid, stream_sid=start.get("streamSid"), phone=caller_phone,
+                                     customer_id=(customer or {}).get("id"), campaign=params.get("campaign")) \
+        if recording_writer else None
+
+    def on_frame_sent(frame, playout_at):
+        timeline.outbound_frame()
+        if recorder:
+            recorder.agent(frame, playout_at)
+
+    scheduler = call.scheduler = OutboundAudioScheduler(websocket, start["streamSid"], on_frame_sent=on_frame_sent)
+    timeline.scheduler = scheduler
+    barge_in = BargeInController(scheduler, outbound, SpeechOnsetDetector())
+
+    async def interrupt(source):
+        interruptions = barge_in.interruptions
+        latency_ms = await barge_in.interrupt(source)
+        if barge_in.interruptions != interruptions:
+            timeline.barge_in(source, latency_ms)
+            if recorder:
+                recorder.event("barge_in", source=source)
+        if latency_ms is not None:
+            logging.info("✋ Barge-in (%s): agent silenced %.0f ms after caller speech onset", source, latency_ms)
+
+    def play_prompt(name, text):
+        """Queue a cached clip; returns False if it isn't cached (we never wait for one)."""
+        frames = prompt_audio.get(text) if prompt_audio else None
+        if not frames:
+            return False
+        scheduler.enqueue_frames(frames)
+        scheduler.end_turn(f"prompt-{name}")
+        timeline.event("prompt", prompt=name)
+        return True
+
+    fillers = set()
+
+    async def filler_if_slow(tool_names):
+        # Only if the tools are still running and the caller is hearing nothing
+        await asyncio.sleep(PROMPT_FILLER_DELAY_MS / 1000)
+        if tools.pending and not scheduler.is_speaking and not barge_in.muted:
+            name = next((TOOL_FILLERS[n] for n in tool_names if n in TOOL_FILLERS), None)
+            if name:
+                play_prompt(name, PROMPTS[name])
+
+    async def filler_while_reconnecting():
+        # Only if Gemini is still coming back and the caller is hearing nothing
+        await asyncio.sleep(LIVE_RECONNECT_FILLER_MS / 1000)
+        if call.live.reconnecting and not scheduler.is_speaking and not barge_in.muted:
+            play_prompt("one_moment", PROMPTS["one_moment"])
 
+    def on_gemini_drop():
+        timeline.event("gemini_dropped")
+        if prompt_audio:
+            filler = asyncio.create_task(filler_while_reconnecting(), name=f"filler:{call_sid}")
+            fillers.add(filler)
+            filler.add_done_callback(fillers.discard)
+
+    def on_gemini_recovered(outcome, seconds):
+        timeline.event("gemini_recovered", outcome=outcome, ms=round(seconds * 1000))
+
+    async def hang_up():
+        # Gemini is gone for good: apologise (if the clip is cached), let it play, then end the stream,
+        # which ends the call since nothing follows <Connect> in the TwiML
+        logging.error("📴 Gemini Live could not be reconnected; ending the call")
+        timeline.event("gemini_lost")
+        if play_prompt("live_lost", PROMPTS["live_lost"]):
+            deadline = time.monotonic() + LIVE_LOST_GOODBYE_MAX_S
+            while scheduler.is_speaking and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
         try:
-            async for message in websocket:
-                data = json.loads(message)
+            await websocket.close()
+        except Exception as e:  # Twilio hung up first
+            logging.debug("Closing the Twilio stream failed: %s", e)
+
+    ending = set()
+
+    def on_gemini_done(task):
+        if not task.cancelled() and isinstance(task.exception(), LiveSessionLost):
+            ending.add(asyncio.create_task(hang_up(), name=f"hang_up:{call_sid}"))
+
+    # From here the call counts as live for admission control, and its sends as outbound backlog
+    admission.stream_started(call_sid, scheduler)
+    # The sender starts now so the greeting plays while the Gemini session is claimed
+    sender_task = asyncio.create_task(scheduler.run(), name=f"outbound_sender:{call_sid}")
+    # /voice left the <Say> out of the TwiML because the greeting clip was cached
+    if params.get("greeting") == "stream":
+        play_prompt("greeting", greeting_text(customer)) or play_prompt("greeting", PROMPTS["greeting"])
+
+    try:
+        # Claim the session /voice or /call started warming for this CallSid
+        async with session_warmer.session_for(call_sid, customer) as warm:
+            # Outlives the Live websocket: reconnects, resumes and replays what the caller said meanwhile
+            session = call.live = ResilientLiveSession(warm, customer, on_drop=on_gemini_drop,
+                                                       on_recovered=on_gemini_recovered)
+            timeline.event("gemini_ready", source=warm.source)
+            ready_ms = (time.monotonic() - connected_at) * 1000
+            logging.info("🧠 Gemini session ready (%s) after %.0f ms", warm.source, ready_ms,
+                         extra={"source": warm.source, "ready_ms": round(ready_ms)})
+            if customer and warm.customer is None:
+                # Pooled session: its config predates the call, so pass the caller details as context
+                await session.send_client_content(turns=customer_context_turn(customer), turn_complete=False)
+            first_audio_logged = False
+            tools = ToolRunner(session, caller_phone, customer, timeline=timeline)
+
+            # Task to stream audio from Gemini → Twilio (paced by the scheduler)
+            async def gemini_to_twilio():
+                nonlocal first_audio_logged
+                while True:
+                    async for message in session.receive():
+                        if message.tool_call:
+                            # Runs as separate tasks; audio keeps flowing while tools work
+                            tools.dispatch(message.tool_call)
+                            if prompt_audio:
+                                filler = asyncio.create_task(filler_if_slow(
+                                    [c.name for c in message.tool_call.function_calls or []]), name=f"filler:{call_sid}")
+                                fillers.add(filler)
+                                filler.add_done_callback(fillers.discard)
+                        if message.tool_call_cancellation:
+                            tools.cancel(message.tool_call_cancellation.ids)
+                        content = message.server_content
+                        if recorder and content:
+                            if content.input_transcription:
+                                recorder.transcript("caller", content.input_transcription.text)
+                            if content.output_transcription:
+                                recorder.transcript("agent", content.output_transcription.text)
+                        if content and content.interrupted:
+                            await interrupt("gemini")
+                        if message.data and not barge_in.muted:
+                            timeline.gemini_audio(len(message.data), barge_in.detector.last_loud_time)
+                            ulaw = outbound.convert(message.data)
+                            # Gemini answers faster than real time; past the outbound buffer, stop reading it
+                            await scheduler.wait_for_room(len(ulaw))
+                            if not barge_in.muted:
+                                scheduler.enqueue(ulaw)
+                            if not first_audio_logged:
+                                first_audio_logged = True
+                                logging.info("⏱️ Time to first agent audio: %.0f ms (%s session)",
+                                             (time.monotonic() - connected_at) * 1000, warm.source)
+                        if content and content.turn_complete:
+                            barge_in.on_turn_complete()
+                            timeline.turn_complete()
+                            scheduler.end_turn()
+
+            # Task to stream audio from Twilio → Gemini, decoupled from the websocket reader
+            async def send_to_gemini(pcm):
+                await session.send_realtime_input(audio=Blob(data=pcm, mime_type=GEMINI_INPUT_MIME))
+                timeline.sent_to_gemini(len(pcm))
+
+            async def send_signal(name):
+                await session.send_realtime_input(**GEMINI_SIGNALS[name])
+
+            pipeline = call.pipeline = InboundAudioPipeline(send_to_gemini, send_signal=send_signal)
+
+            gemini_task = asyncio.create_task(gemini_to_twilio(), name=f"gemini_to_twilio:{call_sid}")
+            gemini_task.add_done_callback(on_gemini_done)
+            upstream_task = asyncio.create_task(pipeline.run(), name=f"twilio_to_gemini:{call_sid}")
+
+            try:
+                async for message in messages:
+                    event, data = parser.parse(message)
 
-                if data.get("event") == "start":
-                    print("🔗 Twilio stream started")
+                    if event == "media":
+                        # `data` is the decoded frame, in a buffer the parser reuses
+                        timeline.inbound_frame(len(data))
+                        if recorder:
+                            recorder.caller(data)
+                        if barge_in.on_inbound_frame(data):
+                            await interrupt("local")
+                        speech_event, frames = vad.process(data)
+                        if speech_event == "start":
+                            timeline.event("vad_speech_start")
+                            if VAD_ACTIVITY_SIGNALS:
+                                pipeline.signal("activity_start")
+                        for frame in frames:
+                            pipeline.put(inbound.resample(frame))
+                        log_sampled(logging.DEBUG, "media", 5.0, "📶 Media flowing", inbound_depth=pipeline.depth,
+                                    frames_sent=scheduler.frames_sent)
+                        if speech_event == "end":
+                            timeline.event("vad_speech_end")
+                            if VAD_ACTIVITY_SIGNALS:
+                                pipeline.signal("activity_end")
+                            elif vad.config.mode != "pass":
+                                # Gemini's own VAD won't hear the silence we held back; end the turn for it
+                                pipeline.signal("audio_stream_end")
 
-                elif data.get("event") == "media":
-                    audio_data = base64.b64decode(data["media"]["payload"])
-                    await session.send_audio(audio_data)
+                    elif event == "mark":
+                        scheduler.on_mark(data["mark"]["name"])
 
-                elif data.get("event") == "stop":
-                    print("⛔ Twilio stream stopped")
-                    break
+                    elif event == "stop":
+                        logging.info("⛔ Twilio stream stopped")
+                        upstream_task.cancel()
+                        await asyncio.gather(upstream_task, return_exceptions=True)
+                        await pipeline.flush()
+                        break
 
-        finally:
-            await session.end()
-            gemini_task.cancel()
-            print("✅ Session closed")
+            finally:
+                gemini_task.cancel()
+                upstream_task.cancel()
+                await session.close()
+                tools.cancel_all()
+                if tools.latencies:
+                    logging.info("🛠️ Tool latency this call: %s", tools.summary())
+                logging.info("🎙️ Inbound VAD: %s", vad.summary())
+                if pipeline.dropped_frames:
+                    logging.warning("Inbound queue overflowed: %d frames dropped", pipeline.dropped_frames)
+                if scheduler.dropped_frames:
+                    logging.warning("Outbound buffer overflowed: %d frames dropped", scheduler.dropped_frames)
+                logging.info("✅ Session closed", extra={"buffer_bytes": call.buffer_bytes,
+                                                        "gemini_reconnects": session.reconnects})
+    finally:
+        admission.stream_ended(call_sid)
+        sender_task.cancel()
+        for task in ending:
+            task.cancel()
+        await asyncio.gather(sender_task, *ending, return_exceptions=True)
+        if recorder:
+            recording_writer.finish(recorder)
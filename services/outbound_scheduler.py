@@ -0,0 +1,203 @@
+# services/outbound_scheduler.py
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from prometheus_client import Counter
+from services.audio_codec import TWILIO_FRAME_BYTES, FRAME_MS
+from services.frame_ring import FrameRing
+from services.twilio_frames import OutboundFrameEncoder
+from services.logs import log_sampled
+from config import OUTBOUND_LEAD_MS, OUTBOUND_BUFFER_MS
+
+FRAME_SECONDS = FRAME_MS / 1000
+ULAW_SILENCE = b"\xff"
+_SILENCE_FRAME = memoryview(ULAW_SILENCE * TWILIO_FRAME_BYTES)
+
+DROPPED_FRAMES = Counter("voice_outbound_dropped_frames", "Agent frames dropped on a full buffer")
+
+
+class OutboundAudioScheduler:
+    """
+    Paces µ-law audio to Twilio as exact 20 ms frames on a monotonic clock.
+
+    At most `lead_ms` of audio is sent ahead of real time, so Twilio's
+    playback buffer stays small and our clock tracks the real playout
+    position. `mark` events are queued at turn boundaries; Twilio echoes
+    them back once the audio before them has played.
+
+    Unsent audio lives in a fixed ring of `buffer_ms`: producers faster than
+    real time (Gemini answers in bursts) wait in `wait_for_room()`, and
+    anything still pushed past the end is dropped and counted.
+    """
+
+    def __init__(self, websocket, stream_sid=None, lead_ms: int = OUTBOUND_LEAD_MS, on_frame_sent=None,
+                 buffer_ms: int = OUTBOUND_BUFFER_MS):
+        self.websocket = websocket
+        self.stream_sid = stream_sid
+        self.encoder = OutboundFrameEncoder(stream_sid) if stream_sid is not None else None
+        self.lead = lead_ms / 1000
+        self.on_frame_sent = on_frame_sent  # optional on_frame_sent(frame, playout_at), for metrics and recording
+
+        self._frames = FrameRing(TWILIO_FRAME_BYTES, buffer_ms // FRAME_MS)  # whole frames not yet sent
+        self._marks = deque()                             # (frame position, name), in order
+        self._partial = bytearray(TWILIO_FRAME_BYTES)     # audio not yet filling a whole frame ...
+        self._partial_len = 0                             # ... and how much of it there is
+        self._wakeup = asyncio.Event()
+        self._room = asyncio.Event()                      # set whenever frames leave the ring
+        self._mark_ids = itertools.count(1)
+        self._playout_deadline = 0.0  # monotonic time at which everything sent so far has played
+
+        self.frames_sent = 0
+        self.frames_played = 0       # confirmed by mark acknowledgements
+        self.pending_marks = {}      # name -> (frames_sent at mark, monotonic send time)
+        self.last_mark_latency = None
+        self.send_stall = 0.0        # longest recent wait for the websocket to take a message (s) ...
+        self._send_stall_at = 0.0    # ... and when it was seen
+        self.dropped_frames = 0      # pushed while the ring was full
+
+    @property
+    def buffer_bytes(self) -> int:
+        return self._frames.nbytes + len(self._partial)
+
+    def enqueue(self, ulaw):
+        """Queue µ-law audio (any bytes-like); complete 20 ms frames become ready to send."""
+        data = memoryview(ulaw).cast("B")
+        offset = 0
+        if self._partial_len:
+            offset = min(TWILIO_FRAME_BYTES - self._partial_len, len(data))
+            self._partial[self._partial_len:self._partial_len + offset] = data[:offset]
+            self._partial_len += offset
+            if self._partial_len < TWILIO_FRAME_BYTES:
+                return
+            self._push(self._partial)
+            self._partial_len = 0
+        usable = offset + (len(data) - offset) // TWILIO_FRAME_BYTES * TWILIO_FRAME_BYTES
+        for start in range(offset, usable, TWILIO_FRAME_BYTES):
+            self._push(data[start:start + TWILIO_FRAME_BYTES])
+        self._partial_len = len(data) - usable
+        self._partial[:self._partial_len] = data[usable:]
+        self._wakeup.set()
+
+    def enqueue_frames(self, frames):
+        """Queue audio already cut into 20 ms µ-law frames (e.g. cached prompts)."""
+        for frame in frames:
+            self._push(frame)
+        self._wakeup.set()
+
+    def _push(self, frame):
+        if not self._frames.push(frame):
+            self.dropped_frames += 1
+            DROPPED_FRAMES.inc()
+            log_sampled(logging.WARNING, "outbound_overflow", 5.0, "Outbound audio buffer full; dropping agent audio",
+                        dropped_frames=self.dropped_frames)
+
+    async def wait_for_room(self, nbytes: int):
+        """Wait until `nbytes` more µ-law audio fits (or as much as ever can); backpressure for bursts."""
+        frames = min(self._frames.capacity, (self._partial_len + nbytes) // TWILIO_FRAME_BYTES + 1)
+        while self._frames.free < frames:
+            self._room.clear()
+            await self._room.wait()
+
+    def end_turn(self, name: str = None) -> str:
+        """Flush the trailing partial frame (padded with silence) and queue a mark."""
+        if self._partial_len:
+            self._partial[self._partial_len:] = _SILENCE_FRAME[self._partial_len:]
+            self._push(self._partial)
+            self._partial_len = 0
+        name = name or f"turn-{next(self._mark_ids)}"
+        self._marks.append((self._frames.written, name))
+        self._wakeup.set()
+        return name
+
+    def on_mark(self, name: str):
+        """Handle a Twilio `mark` echo: audio up to that mark has been played."""
+        entry = self.pending_marks.pop(name, None)
+        if entry is None:
+            return
+        frames, sent_at = entry
+        self.frames_played = max(self.frames_played, frames)
+        self.last_mark_latency = time.monotonic() - sent_at
+
+    async def clear(self):
+        """Drop everything not yet played and tell Twilio to flush its buffer."""
+        self._frames.clear()
+        self._marks.clear()
+        self._partial_len = 0
+        self._room.set()
+        self._playout_deadline = 0.0
+        # Twilio echoes outstanding marks after a clear; they no longer mean "played"
+        self.pending_marks.clear()
+        self.frames_played = self.frames_sent
+        if self.stream_sid is not None:
+            await self._send(self.encoder.clear())
+
+    @property
+    def is_speaking(self) -> bool:
+        """True while agent audio is queued here or still playing on Twilio's side."""
+        return bool(self._frames or self._marks or self._partial_len) or self.buffered_ms > 0
+
+    @property
+    def queued_frames(self) -> int:
+        """Frames produced but not yet sent to Twilio."""
+        return len(self._frames)
+
+    @property
+    def buffered_ms(self) -> float:
+        """Audio sent to Twilio that has not played yet, per our pacing clock."""
+        return max(0.0, self._playout_deadline - time.monotonic()) * 1000
+
+    @property
+    def unplayed_ms(self) -> float:
+        """Audio sent to Twilio and not yet confirmed played by a mark."""
+        return (self.frames_sent - self.frames_played) * FRAME_MS
+
+    @property
+    def recent_send_stall(self) -> float:
+        """Longest send wait in the last second or so; grows when the socket or the loop backs up."""
+        return self.send_stall if time.monotonic() - self._send_stall_at < 1.0 else 0.0
+
+    async def run(self):
+        """Sender loop; run as a task for the lifetime of the stream."""
+        while True:
+            if self.stream_sid is not None and self._marks and self._marks[0][0] <= self._frames.read:
+                # Every frame before this mark has gone out
+                _, name = self._marks.popleft()
+                self.pending_marks[name] = (self.frames_sent, time.monotonic())
+                await self._send(self.encoder.mark(name))
+                continue
+
+            if not self._frames or self.stream_sid is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            if self._playout_deadline < now:
+                # Underrun or first frame of a turn: restart the clock from now
+                self._playout_deadline = now
+            delay = self._playout_deadline - self.lead - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue  # re-check the queue; it may have changed while sleeping
+
+            # The frame is read in place, so everything that needs it runs before its slot is freed
+            frame = self._frames.peek()
+            text = self.encoder.media(frame)
+            playout_at = self._playout_deadline
+            if self.on_frame_sent:
+                self.on_frame_sent(frame, playout_at)
+            self._frames.pop()
+            self._room.set()
+            await self._send(text)
+            self.frames_sent += 1
+            self._playout_deadline += FRAME_SECONDS
+
+    async def _send(self, text: str):
+        started = time.monotonic()
+        await self.websocket.send_text(text)
+        now = time.monotonic()
+        if now - started >= self.send_stall or now - self._send_stall_at >= 1.0:
+            self.send_stall, self._send_stall_at = now - started, now
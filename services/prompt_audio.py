@@ -0,0 +1,167 @@
+# services/prompt_audio.py
+
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from prometheus_client import Counter
+from services.audio_codec import OutboundTranscoder, TWILIO_FRAME_BYTES
+from services.gemini_client import synthesize_speech, MODEL
+from config import (
+    PROMPT_AUDIO_ENABLED, PROMPT_CACHE_DIR, PROMPT_CACHE_MAX_CLIPS, PROMPT_CACHE_MAX_FILES,
+    PROMPT_GREETING, PROMPT_GREETING_KNOWN, PROMPT_CHECKING, PROMPT_ONE_MOMENT, PROMPT_LIVE_LOST,
+)
+
+ULAW_SILENCE = b"\xff"
+
+CACHE_LOOKUPS = Counter("voice_prompt_cache", "Prompt audio cache lookups and loads", ["outcome"])
+
+# Fixed phrases rendered at startup; PROMPT_GREETING_KNOWN is a template rendered per customer
+PROMPTS = {
+    "greeting": PROMPT_GREETING,
+    "checking": PROMPT_CHECKING,
+    "one_moment": PROMPT_ONE_MOMENT,
+    "live_lost": PROMPT_LIVE_LOST,
+}
+
+# What to say while a slow tool runs
+TOOL_FILLERS = {
+    "find_available_slots": "checking",
+    "book_appointment": "one_moment",
+    "cancel_booking": "one_moment",
+    "list_bookings": "one_moment",
+}
+
+
+def greeting_text(customer: dict = None) -> str:
+    """The greeting for this caller: by name when we know them."""
+    if customer and customer.get("name") and PROMPT_GREETING_KNOWN:
+        return PROMPT_GREETING_KNOWN.format(name=customer["name"].split()[0])
+    return PROMPT_GREETING
+
+
+def to_frames(ulaw: bytes) -> tuple:
+    """Split µ-law audio into 20 ms frames, padding the last one with silence."""
+    ulaw += ULAW_SILENCE * (-len(ulaw) % TWILIO_FRAME_BYTES)
+    return tuple(ulaw[i:i + TWILIO_FRAME_BYTES] for i in range(0, len(ulaw), TWILIO_FRAME_BYTES))
+
+
+async def render_with_gemini(text: str) -> bytes:
+    """Speak `text` with Gemini Live and return it as 8 kHz µ-law."""
+    transcoder = OutboundTranscoder()
+    out = bytearray()
+    async for pcm in synthesize_speech(text):
+        out += transcoder.convert(pcm)
+    return bytes(out)
+
+
+class PromptAudioCache:
+    """
+    Spoken phrases kept as ready-to-send 20 ms µ-law frames.
+
+    `get()` never waits: it returns the frames if the phrase is in memory
+    and None otherwise. `render_soon()` loads a phrase from the disk cache
+    or has it spoken once by Gemini, in the background. Memory holds the
+    `max_clips` most recently used phrases; the disk cache keeps the
+    newest `max_files` so restarts (or a Gemini outage) start warm.
+    """
+
+    def __init__(self, directory: str = PROMPT_CACHE_DIR, max_clips: int = PROMPT_CACHE_MAX_CLIPS,
+                 max_files: int = PROMPT_CACHE_MAX_FILES, render=render_with_gemini):
+        self.directory = directory
+        self.max_clips = max_clips
+        self.max_files = max_files
+        self.render = render
+        self._clips = OrderedDict()  # key -> frames
+        self._pending = {}           # key -> loading/rendering task
+        self.stats = {"hits": 0, "misses": 0, "disk_loads": 0, "renders": 0, "render_failures": 0}
+
+    @staticmethod
+    def key(text: str) -> str:
+        # The model is part of the key so a voice change doesn't replay old audio
+        return hashlib.sha1(f"{MODEL}|{text}".encode("utf-8")).hexdigest()[:24]
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.ulaw")
+
+    def _count(self, outcome):
+        self.stats[outcome] += 1
+        CACHE_LOOKUPS.labels(outcome).inc()
+
+    def get(self, text: str):
+        frames = self._clips.get(self.key(text))
+        if frames is None:
+            self._count("misses")
+            return None
+        self._clips.move_to_end(self.key(text))
+        self._count("hits")
+        return frames
+
+    def has(self, text: str) -> bool:
+        return self.key(text) in self._clips
+
+    def _put(self, key, frames):
+        self._clips[key] = frames
+        self._clips.move_to_end(key)
+        while len(self._clips) > self.max_clips:
+            self._clips.popitem(last=False)
+
+    def render_soon(self, text: str):
+        """Make `text` available to `get()` shortly; returns the task (or None if already cached)."""
+        key = self.key(text)
+        if not text or key in self._clips:
+            return None
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, text), name=f"prompt_audio:{key}")
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return task
+
+    async def _load(self, key, text):
+        ulaw = await asyncio.to_thread(self._read, key)
+        if ulaw is not None:
+            self._count("disk_loads")
+        else:
+            try:
+                ulaw = await self.render(text)
+            except Exception as e:
+                self._count("render_failures")
+                logging.warning("Rendering prompt audio %r failed: %r", text, e)
+                return
+            if not ulaw:
+                self._count("render_failures")
+                return
+            self._count("renders")
+            await asyncio.to_thread(self._write, key, ulaw)
+        self._put(key, to_frames(ulaw))
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key, ulaw: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(ulaw)
+        os.replace(tmp, self._path(key))
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".ulaw")]
+        if len(files) > self.max_files:
+            files.sort(key=os.path.getmtime)
+            for path in files[:len(files) - self.max_files]:
+                os.remove(path)
+
+    async def preload(self, texts, timeout: float) -> int:
+        """Load or render `texts`, waiting at most `timeout`; stragglers finish in the background."""
+        tasks = [t for t in (self.render_soon(text) for text in texts) if t is not None]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        return sum(1 for text in texts if self.has(text))
+
+
+prompt_audio = PromptAudioCache() if PROMPT_AUDIO_ENABLED else None
@@ -0,0 +1,178 @@
+# services/session_warmer.py
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from services.gemini_client import start_live_session, build_live_config
+from config import SESSION_WARM_TTL_S, SESSION_POOL_SIZE, SESSION_POOL_MAX_AGE_S
+
+REAP_INTERVAL_S = 5
+
+
+class WarmSession:
+    """A Gemini Live session opened ahead of time and held open until claimed."""
+
+    def __init__(self, connect, call_sid=None, source="cold", customer=None):
+        self.call_sid = call_sid
+        self.source = source  # "prewarmed", "pool" or "cold"
+        self.customer = customer  # the caller this session's config was built for
+        self.created_at = time.monotonic()
+        self.opened_at = None
+        self.session = None
+        self._connect = connect
+        self._ctx = None
+        self.task = None
+
+    async def open(self):
+        self._ctx = self._connect(build_live_config(self.customer))
+        self.session = await self._ctx.__aenter__()
+        self.opened_at = time.monotonic()
+        return self
+
+    def start(self):
+        """Open in the background."""
+        self.task = asyncio.create_task(self.open(), name="gemini_warm")
+        return self
+
+    @property
+    def ready(self) -> bool:
+        return self.task is not None and self.task.done() and not self.task.cancelled() \
+            and self.task.exception() is None
+
+    async def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            return
+        if self.session is not None:
+            try:
+                await self._ctx.__aexit__(None, None, None)
+            except Exception as e:
+                logging.warning("Error closing Gemini session: %s", e)
+            self.session = None
+
+
+class SessionWarmer:
+    """
+    Opens Gemini Live sessions before Twilio's media stream connects.
+
+    `/voice` (inbound) and `/call` (outbound) call `prewarm(call_sid)`; the
+    websocket handler then claims that session by CallSid. Sessions nobody
+    claims within `ttl` are closed. A small pool of unkeyed sessions covers
+    calls that were not pre-warmed.
+    """
+
+    def __init__(self, connect=start_live_session, ttl: float = SESSION_WARM_TTL_S,
+                 pool_size: int = SESSION_POOL_SIZE, pool_max_age: float = SESSION_POOL_MAX_AGE_S):
+        self.connect = connect
+        self.ttl = ttl
+        self.pool_size = pool_size
+        self.pool_max_age = pool_max_age
+        self._by_call = {}
+        self._pool = []
+        self._reaper = None
+
+    def _ensure_started(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_loop(), name="session_reaper")
+        self._refill()
+
+    def start(self):
+        """Begin filling the pool now instead of on the first call."""
+        self._ensure_started()
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """Wait up to `timeout` for the pool to have an open session."""
+        pending = [w.task for w in self._pool if w.task is not None]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        return any(w.ready for w in self._pool)
+
+    def prewarm(self, call_sid: str, customer: dict = None):
+        """Start opening a session for a call that is about to connect."""
+        if not call_sid or call_sid in self._by_call:
+            return
+        self._ensure_started()
+        self._by_call[call_sid] = WarmSession(self.connect, call_sid, "prewarmed", customer).start()
+
+    async def discard(self, call_sid: str):
+        """Close a pre-warmed session that won't be claimed here (its stream landed on another worker)."""
+        warm = self._by_call.pop(call_sid, None)
+        if warm is not None:
+            logging.info("Releasing pre-warmed Gemini session for %s", call_sid)
+            await warm.close()
+
+    async def claim(self, call_sid: str = None, customer: dict = None) -> WarmSession:
+        """
+        Return an open session for this call: pre-warmed, pooled, or freshly
+        opened. Pooled sessions carry the generic config, so check `customer`.
+        """
+        self._ensure_started()
+        warm = self._by_call.pop(call_sid, None) if call_sid else None
+        if warm is not None:
+            try:
+                return await warm.task
+            except Exception as e:
+                logging.warning("Pre-warmed Gemini session for %s failed: %s", call_sid, e)
+
+        for i, pooled in enumerate(self._pool):
+            if pooled.ready:
+                del self._pool[i]
+                pooled.call_sid = call_sid
+                self._refill()
+                return pooled
+
+        return await WarmSession(self.connect, call_sid, "cold", customer).open()
+
+    @asynccontextmanager
+    async def session_for(self, call_sid: str = None, customer: dict = None):
+        """`async with` wrapper: claim a session for the call and close it afterwards."""
+        warm = await self.claim(call_sid, customer)
+        try:
+            yield warm
+        finally:
+            await warm.close()
+
+    def _refill(self):
+        self._pool = [p for p in self._pool if p.task is None or not p.task.done() or p.ready]
+        while len(self._pool) < self.pool_size:
+            self._pool.append(WarmSession(self.connect, source="pool").start())
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(REAP_INTERVAL_S)
+            await self.reap()
+
+    async def reap(self):
+        """Close keyed sessions nobody claimed and pooled sessions that are too old."""
+        now = time.monotonic()
+        expired = [sid for sid, w in self._by_call.items() if now - w.created_at > self.ttl]
+        stale = [w for w in self._pool if now - w.created_at > self.pool_max_age]
+        for sid in expired:
+            logging.info("Disposing unclaimed Gemini session for %s", sid)
+            await self._by_call.pop(sid).close()
+        for warm in stale:
+            self._pool.remove(warm)
+            await warm.close()
+        self._refill()
+
+    async def close(self):
+        """Close everything; used on shutdown."""
+        if self._reaper:
+            self._reaper.cancel()
+        for warm in list(self._by_call.values()) + self._pool:
+            await warm.close()
+        self._by_call.clear()
+        self._pool.clear()
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "prewarmed_pending": len(self._by_call),
+            "pool_ready": sum(1 for w in self._pool if w.ready),
+            "pool_size": len(self._pool),
+        }
+
+
+session_warmer = SessionWarmer()
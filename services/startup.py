@@ -0,0 +1,117 @@
+# services/startup.py
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from prometheus_client import Gauge
+from services.gemini_client import get_client, prewarm_connection
+from services.session_warmer import session_warmer
+from services.customer_directory import customer_directory
+from services.booking_service import booking_store
+from services.twilio_service import close_async_twilio_client
+from services.twiml import voice_twiml
+from services.call_registry import call_registry
+from services.call_recorder import recording_writer
+from services.call_events import call_events
+from services.admission import admission
+from services.diagnostics import loop_monitor
+from services.call_context import check_call_budget, planned_call_bytes
+from services.prompt_audio import prompt_audio, PROMPTS
+from services.call_metrics import record_status
+from config import STARTUP_PREWARM_TIMEOUT_S
+
+STARTUP_PHASE_SECONDS = Gauge("voice_startup_phase_seconds", "Duration of each startup phase", ["phase"],
+                              multiprocess_mode="liveall")
+
+# Last startup's phase timings in ms, for logs and the admin endpoints
+startup_timings = {}
+
+
+@contextmanager
+def _phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        startup_timings[name] = round(elapsed * 1000, 1)
+        STARTUP_PHASE_SECONDS.labels(name).set(elapsed)
+
+
+async def initialise():
+    """
+    Everything the app needs before it takes its first call, run once from
+    the FastAPI lifespan. Uvicorn only starts accepting connections after
+    this returns, so a new instance never answers a call half-ready.
+    """
+    started = time.perf_counter()
+    # Fail the deploy, not a call at peak, if the buffer settings overrun the per-call budget
+    per_call = check_call_budget()
+    logging.info("💾 Audio buffers per call: %d KB", per_call // 1024,
+                 extra={"buffers": planned_call_bytes()})
+    with _phase("twiml"):
+        voice_twiml()
+        voice_twiml(greeting=None)
+    with _phase("gemini_client"):
+        await asyncio.to_thread(get_client)  # decodes credentials off the event loop
+
+    async def load_data():
+        with _phase("customer_directory"):
+            await customer_directory.refresh()
+        customer_directory.start_watching()
+        with _phase("booking_store"):
+            await booking_store.start()
+
+    async def warm_network():
+        # Best effort: a slow or failed pre-warm must not keep the instance from starting
+        with _phase("gemini_prewarm"):
+            try:
+                steps = await asyncio.wait_for(prewarm_connection(), STARTUP_PREWARM_TIMEOUT_S)
+                startup_timings.update({f"gemini_prewarm.{k}": round(v, 1) for k, v in steps.items()})
+            except Exception as e:
+                logging.warning("Gemini connection pre-warm failed: %r", e)
+
+    async def load_prompts():
+        # From the disk cache, or spoken by Gemini; anything slower finishes in the background
+        with _phase("prompt_audio"):
+            ready = await prompt_audio.preload(PROMPTS.values(), STARTUP_PREWARM_TIMEOUT_S)
+            if ready < len(PROMPTS):
+                logging.warning("Only %d/%d prompt clips ready at startup", ready, len(PROMPTS))
+
+    await asyncio.gather(load_data(), warm_network(), *([load_prompts()] if prompt_audio else []))
+
+    # Work other workers route here for calls this worker owns
+    call_registry.on("stream_status", lambda call_sid, p: record_status(call_sid, p["status"], **p["details"]))
+    call_registry.on("release_session", lambda call_sid, p: session_warmer.discard(call_sid))
+    call_registry.on("release_reservation", lambda call_sid, p: admission.release(call_sid))
+    call_registry.start()
+    call_events.start()
+    loop_monitor.start()
+    admission.start()
+    if recording_writer:
+        recording_writer.start()
+
+    with _phase("session_pool"):
+        session_warmer.start()
+        if not await session_warmer.wait_ready(STARTUP_PREWARM_TIMEOUT_S):
+            logging.warning("No pooled Gemini session ready after startup; first calls open cold")
+
+    startup_timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    STARTUP_PHASE_SECONDS.labels("total").set(startup_timings["total"] / 1000)
+    logging.info("🚀 Startup complete in %.0f ms: %s", startup_timings["total"], startup_timings,
+                 extra={"timings": startup_timings})
+
+
+async def shutdown():
+    customer_directory.stop_watching()
+    await booking_store.close()
+    await close_async_twilio_client()
+    await session_warmer.close()
+    await admission.close()
+    await loop_monitor.close()
+    await call_events.close()  # before the registry: the last batch still writes lifecycle fields
+    await call_registry.close()
+    if recording_writer:
+        # Finish every open recording before the process exits
+        await asyncio.to_thread(recording_writer.stop)
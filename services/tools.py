@@ -0,0 +1,231 @@
+# services/tools.py
+
+import asyncio
+import datetime
+import json
+import logging
+import time
+from collections import defaultdict
+from zoneinfo import ZoneInfo
+from prometheus_client import Counter, Histogram
+from google.genai.types import FunctionDeclaration, FunctionResponse, Schema, Tool
+from services.availability import availability
+from services.booking_service import booking_store, BookingError
+from services.customer_directory import customer_directory
+from services.logs import call_sid_var
+from config import TOOL_TIMEOUT_S, BUSINESS_TIMEZONE, DEFAULT_WORKSHOP, WORKSHOPS
+
+
+def _string(description):
+    return Schema(type="STRING", description=description)
+
+
+TOOL_DECLARATIONS = [
+    FunctionDeclaration(
+        name="lookup_customer",
+        description="Get the caller's saved details (name, car, usual service).",
+    ),
+    FunctionDeclaration(
+        name="find_available_slots",
+        description="Find the next free appointment times for a service. Always use this before offering times.",
+        parameters=Schema(type="OBJECT", properties={
+            "service_type": _string("Service requested, e.g. 'Full Service' or 'Oil Change'."),
+            "after_date": _string("Earliest date, YYYY-MM-DD. Omit for today."),
+            "after_time": _string("Earliest time that day, HH:MM (24h). Omit for now / opening time."),
+            "workshop": _string(f"Workshop ID, one of: {', '.join(WORKSHOPS)}."),
+            "count": Schema(type="INTEGER", description="How many options to return (default 3)."),
+        }),
+    ),
+    FunctionDeclaration(
+        name="book_appointment",
+        description="Book an appointment for the caller at a time returned by find_available_slots.",
+        parameters=Schema(type="OBJECT", properties={
+            "date": _string("Date, YYYY-MM-DD."),
+            "start": _string("Start time, HH:MM (24h)."),
+            "service_type": _string("Service to book."),
+            "workshop": _string(f"Workshop ID, one of: {', '.join(WORKSHOPS)}."),
+            "name": _string("Customer name, if not already known."),
+        }, required=["date", "start"]),
+    ),
+    FunctionDeclaration(
+        name="list_bookings",
+        description="List the caller's existing appointments.",
+        parameters=Schema(type="OBJECT", properties={}),
+    ),
+    FunctionDeclaration(
+        name="cancel_booking",
+        description="Cancel one of the caller's appointments by its booking ID.",
+        parameters=Schema(type="OBJECT", properties={
+            "booking_id": _string("ID from list_bookings or book_appointment."),
+        }, required=["booking_id"]),
+    ),
+]
+
+TOOLS = [Tool(function_declarations=TOOL_DECLARATIONS)]
+
+# Per-tool timeouts (seconds); anything else gets TOOL_TIMEOUT_S
+TOOL_TIMEOUTS = {
+    "lookup_customer": 1.0,
+    "find_available_slots": 1.0,
+    "list_bookings": 1.0,
+}
+
+# Lookups whose answer may be reused for the rest of the call. Booking
+# changes clear the cache so availability never goes stale within a call.
+CACHEABLE_TOOLS = {"lookup_customer", "find_available_slots", "list_bookings"}
+WRITE_TOOLS = {"book_appointment", "cancel_booking"}
+
+TOOL_SECONDS = Histogram("voice_tool_latency_seconds", "Gemini tool call latency, by tool and outcome",
+                         ["tool", "outcome"],
+                         buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0))
+
+TOOL_CALLS = Counter("voice_tool_calls", "Gemini tool calls", ["tool", "outcome"])
+TOOL_TIME = Counter("voice_tool_seconds", "Time spent in Gemini tool calls", ["tool"])
+
+# Process-wide latency aggregates per tool, for this worker's summaries
+tool_stats = defaultdict(lambda: {"calls": 0, "errors": 0, "timeouts": 0, "cache_hits": 0,
+                                  "total_ms": 0.0, "max_ms": 0.0})
+
+
+def _count(name, outcome):
+    tool_stats[name][outcome] += 1
+    TOOL_CALLS.labels(name, outcome).inc()
+
+
+def _public_booking(booking):
+    return {k: booking[k] for k in ("id", "workshop", "date", "start", "duration_min", "service_type")}
+
+
+class ToolRunner:
+    """
+    Executes Gemini tool calls for one phone call.
+
+    Every function call runs as its own task so the media loop never waits
+    on it; results go back with `send_tool_response` as they finish.
+    """
+
+    def __init__(self, session, caller_phone=None, customer=None, timeline=None):
+        self.session = session
+        self.caller_phone = caller_phone
+        self.customer = customer
+        self.timeline = timeline            # CallTimeline; every tool call goes on it
+        self.latencies = defaultdict(list)  # tool name -> [ms]
+        self._tasks = {}   # function call id -> task
+        self._cache = {}
+
+    def dispatch(self, tool_call):
+        """Start a task per function call in a LiveServerToolCall; returns immediately."""
+        for call in tool_call.function_calls or []:
+            task = asyncio.create_task(self._run(call.id, call.name, call.args or {}),
+                                       name=f"tool:{call.name}:{call_sid_var.get()}")
+            self._tasks[call.id] = task
+            task.add_done_callback(lambda _, call_id=call.id: self._tasks.pop(call_id, None))
+
+    def cancel(self, ids):
+        """Gemini no longer needs these results (e.g. the caller interrupted)."""
+        for call_id in ids or []:
+            task = self._tasks.pop(call_id, None)
+            if task:
+                task.cancel()
+
+    def cancel_all(self):
+        self.cancel(list(self._tasks))
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def _run(self, call_id, name, args):
+        stats = tool_stats[name]
+        _count(name, "calls")
+        started = time.perf_counter()
+        cache_key = (name, json.dumps(args, sort_keys=True, default=str))
+        outcome = "ok"
+        try:
+            if name in CACHEABLE_TOOLS and cache_key in self._cache:
+                _count(name, "cache_hits")
+                outcome = "cache_hit"
+                result = self._cache[cache_key]
+            else:
+                handler = getattr(self, f"_tool_{name}", None)
+                if handler is None:
+                    raise BookingError(f"Unknown tool {name}")
+                result = await asyncio.wait_for(handler(**args), TOOL_TIMEOUTS.get(name, TOOL_TIMEOUT_S))
+                if name in CACHEABLE_TOOLS:
+                    self._cache[cache_key] = result
+                elif name in WRITE_TOOLS:
+                    self._cache.clear()
+        except asyncio.TimeoutError:
+            _count(name, "timeouts")
+            outcome = "timeout"
+            result = {"error": "The system took too long to answer. Apologise and offer to try again."}
+        except (BookingError, TypeError, ValueError) as e:
+            _count(name, "errors")
+            outcome = "error"
+            result = {"error": str(e)}
+        except Exception as e:
+            _count(name, "errors")
+            outcome = "error"
+            logging.exception("Tool %s failed", name)
+            result = {"error": f"Internal error: {e}"}
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.latencies[name].append(elapsed_ms)
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        TOOL_TIME.labels(name).inc(elapsed_ms / 1000)
+        TOOL_SECONDS.labels(name, outcome).observe(elapsed_ms / 1000)
+        if self.timeline is not None:
+            self.timeline.event("tool_call", tool=name, outcome=outcome, latency_ms=round(elapsed_ms, 1))
+        logging.info("🛠️ Tool %s took %.1f ms (%s)", name, elapsed_ms, outcome)
+
+        await self.session.send_tool_response(
+            function_responses=[FunctionResponse(id=call_id, name=name, response=result)]
+        )
+
+    def summary(self) -> dict:
+        return {name: {"calls": len(ms), "max_ms": round(max(ms), 1), "avg_ms": round(sum(ms) / len(ms), 1)}
+                for name, ms in self.latencies.items()}
+
+    # Tool implementations. Each returns a JSON-serialisable dict.
+
+    async def _tool_lookup_customer(self):
+        # Only ever the caller's own record: saying someone else's number must not read out their details
+        record = customer_directory.lookup(self.caller_phone)
+        return {"customer": record} if record else {"customer": None, "note": "No saved details for this number."}
+
+    async def _tool_find_available_slots(self, service_type=None, after_date=None, after_time=None,
+                                         workshop=None, count=3):
+        now = datetime.datetime.now(ZoneInfo(BUSINESS_TIMEZONE)).replace(tzinfo=None)
+        after = now
+        if after_date or after_time:
+            day = datetime.date.fromisoformat(after_date) if after_date else now.date()
+            at = datetime.time.fromisoformat(after_time) if after_time else datetime.time(0, 0)
+            after = max(datetime.datetime.combine(day, at), now)
+        service_type = service_type or (self.customer or {}).get("service_type")
+        slots = availability.next_free_slots(workshop or DEFAULT_WORKSHOP, after, service_type, n=int(count))
+        return {"service_type": service_type, "slots": [
+            {k: s[k] for k in ("workshop", "date", "start", "duration_min")} for s in slots
+        ]}
+
+    async def _tool_book_appointment(self, date, start, service_type=None, workshop=None, name=None):
+        if not self.caller_phone:
+            raise BookingError("Caller phone number is unknown; cannot book.")
+        when = datetime.datetime.combine(datetime.date.fromisoformat(date), datetime.time.fromisoformat(start))
+        if when < datetime.datetime.now(ZoneInfo(BUSINESS_TIMEZONE)).replace(tzinfo=None):
+            raise BookingError(f"{date} at {start} is in the past; offer the caller a later time.")
+        customer = self.customer or {}
+        booking = await availability.book(
+            self.caller_phone, workshop or DEFAULT_WORKSHOP, date, start,
+            service_type or customer.get("service_type"), name or customer.get("name"),
+        )
+        return {"booked": _public_booking(booking)}
+
+    async def _tool_list_bookings(self):
+        return {"bookings": [_public_booking(b) for b in booking_store.for_phone(self.caller_phone)]}
+
+    async def _tool_cancel_booking(self, booking_id):
+        if booking_id not in {b["id"] for b in booking_store.for_phone(self.caller_phone)}:
+            raise BookingError(f"The caller has no booking {booking_id}.")
+        booking = await booking_store.cancel(booking_id)
+        return {"cancelled": _public_booking(booking)}
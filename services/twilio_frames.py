@@ -0,0 +1,89 @@
+# services/twilio_frames.py
+
+import binascii
+import json
+import numpy as np
+from services.audio_codec import ULAW_DECODE_TABLE, TWILIO_FRAME_BYTES
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+def loads(text):
+    """General JSON parser for Twilio control events (orjson when installed)."""
+    return orjson.loads(text) if orjson else json.loads(text)
+
+
+def dumps(message: dict) -> str:
+    return orjson.dumps(message).decode("utf-8") if orjson else json.dumps(message)
+
+
+# Twilio sends media events as {"event":"media","sequenceNumber":...,"media":{...,"payload":"..."},...}
+_MEDIA_PREFIX = '{"event":"media"'
+_PAYLOAD_KEY = '"payload":"'
+
+
+class MediaFrameParser:
+    """
+    Per-call parser for inbound Twilio websocket messages.
+
+    `media` events skip JSON parsing entirely: the base64 payload is sliced
+    straight out of the text and µ-law decoded into a reusable sample
+    buffer. Anything else (or a media message in an unexpected layout)
+    goes through the general parser.
+    """
+
+    def __init__(self):
+        self._samples = np.empty(TWILIO_FRAME_BYTES, dtype=np.int16)
+
+    def parse(self, text: str):
+        """
+        Return ("media", samples) or (event, message dict).
+
+        The media samples are a view into a buffer reused by the next call,
+        so consume them before parsing the next message.
+        """
+        if text.startswith(_MEDIA_PREFIX):
+            start = text.find(_PAYLOAD_KEY)
+            if start != -1:
+                start += len(_PAYLOAD_KEY)
+                end = text.find('"', start)
+                payload = text[start:end]
+                # Escaped characters (e.g. "\/") would need a real JSON parser
+                if end != -1 and "\\" not in payload:
+                    return "media", self._decode(payload)
+
+        message = loads(text)
+        event = message.get("event")
+        if event == "media":
+            return event, self._decode(message["media"]["payload"])
+        return event, message
+
+    def _decode(self, payload) -> np.ndarray:
+        ulaw = np.frombuffer(binascii.a2b_base64(payload), dtype=np.uint8)
+        if len(ulaw) > len(self._samples):
+            self._samples = np.empty(len(ulaw), dtype=np.int16)
+        out = self._samples[:len(ulaw)]
+        # uint8 indices are always in range; "clip" just skips numpy's bounds check
+        ULAW_DECODE_TABLE.take(ulaw, out=out, mode="clip")
+        return out
+
+
+class OutboundFrameEncoder:
+    """Serialises outbound Twilio messages; media frames use a pre-built template per stream."""
+
+    def __init__(self, stream_sid: str):
+        self.stream_sid = stream_sid
+        self._media_head = '{"event":"media","streamSid":%s,"media":{"payload":"' % json.dumps(stream_sid)
+        self._clear = dumps({"event": "clear", "streamSid": stream_sid})
+
+    def media(self, ulaw: bytes) -> str:
+        return self._media_head + binascii.b2a_base64(ulaw, newline=False).decode("ascii") + '"}}'
+
+    def mark(self, name: str) -> str:
+        return dumps({"event": "mark", "streamSid": self.stream_sid, "mark": {"name": name}})
+
+    def clear(self) -> str:
+        return self._clear
@@ -1,26 +1,68 @@
-# services/twilio_service.py
-
-import os
-from twilio.rest import Client
-from dotenv import load_dotenv
-
-load_dotenv()
-
-TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
-TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
-PUBLIC_URL = os.getenv("PUBLIC_URL", "https://your-ngrok-id.ngrok-free.app")  # 👈 Replace with Railway domain if deployed
-
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-
-def initiate_call(to_number: str):
-    if not to_number:
-        raise ValueError("Missing 'to' phone number.")
-
-    call = twilio_client.calls.create(
-        to=to_number,
-        from_=TWILIO_PHONE_NUMBER,
-        url=f"{PUBLIC_URL}/voice"  # Twilio hits this route to get TwiML
-    )
-
-    return call
+# services/twilio_service.py
+
+import os
+from urllib.parse import urlencode
+from twilio.rest import Client
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from dotenv import load_dotenv
+from config import PUBLIC_URL
+
+load_dotenv()
+
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
+
+twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
+# Shared async client: one pooled aiohttp session for every dial, so REST calls
+# never block the event loop that carries live audio websockets.
+_async_client = None
+
+def get_async_twilio_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = Client(
+            TWILIO_ACCOUNT_SID,
+            TWILIO_AUTH_TOKEN,
+            http_client=AsyncTwilioHttpClient(pool_connections=True, timeout=10),
+        )
+    return _async_client
+
+async def close_async_twilio_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.http_client.close()
+        _async_client = None
+
+def initiate_call(to_number: str):
+    if not to_number:
+        raise ValueError("Missing 'to' phone number.")
+
+    call = twilio_client.calls.create(
+        to=to_number,
+        from_=TWILIO_PHONE_NUMBER,
+        url=f"{PUBLIC_URL}/voice"  # Twilio hits this route to get TwiML
+    )
+
+    return call
+
+async def initiate_call_async(to_number: str, voice_params: dict = None):
+    """
+    Non-blocking version of initiate_call for use inside the event loop.
+    `voice_params` (e.g. customer_id, campaign) ride along on the /voice
+    webhook URL and end up as parameters on the media stream.
+    """
+    if not to_number:
+        raise ValueError("Missing 'to' phone number.")
+
+    query = urlencode({k: v for k, v in (voice_params or {}).items() if v})
+    return await get_async_twilio_client().calls.create_async(
+        to=to_number,
+        from_=TWILIO_PHONE_NUMBER,
+        url=f"{PUBLIC_URL}/voice" + (f"?{query}" if query else ""),
+        # Lifecycle callbacks feed services/call_events (ring time, answer rate, failures)
+        status_callback=f"{PUBLIC_URL}/twilio-callback",
+        status_callback_event=["initiated", "ringing", "answered", "completed"],
+        status_callback_method="POST",
+    )
@@ -0,0 +1,91 @@
+# services/twiml.py
+
+from functools import lru_cache
+from xml.sax.saxutils import quoteattr, escape
+from twilio.twiml.voice_response import VoiceResponse, Connect, Start
+from config import (
+    PUBLIC_URL, TWILIO_STREAM_MODE, VOICE_GREETING, ADMISSION_HOLD_SECONDS, OVERFLOW_HOLD_MESSAGE,
+    OVERFLOW_CALLBACK_MESSAGE,
+)
+
+STREAM_MODES = ("connect", "start")
+
+_PARAMETERS_SLOT = '<Parameter name="__stream_parameters__" />'
+_REDIRECT_SLOT = "https://redirect.invalid/"
+
+
+class VoiceTwiml:
+    """
+    Pre-rendered /voice response for one configuration.
+
+    The TwiML is built once with the twilio helper library; each request
+    only splices its <Parameter> elements into the stored bytes.
+    """
+
+    def __init__(self, mode: str = TWILIO_STREAM_MODE, public_url: str = PUBLIC_URL,
+                 greeting: str = VOICE_GREETING):
+        if mode not in STREAM_MODES:
+            raise ValueError(f"Unknown stream mode {mode!r}, expected one of {STREAM_MODES}")
+        stream_url = public_url.replace("https://", "wss://", 1).replace("http://", "ws://", 1) + "/twilio-audio"
+        callback_url = f"{public_url}/twilio-callback"
+
+        response = VoiceResponse()
+        if greeting:
+            response.say(greeting, voice="Polly.Joanna")
+        if mode == "connect":
+            # Bidirectional: the call stays on the stream and plays the audio we send back
+            verb = Connect()
+            stream = verb.stream(url=stream_url, status_callback=callback_url)
+        else:
+            # Listen-only fork of the caller's audio; anything we send back is never played
+            verb = Start()
+            stream = verb.stream(url=stream_url, track="inbound_track", status_callback=callback_url,
+                                 status_callback_event="start error end")
+        stream.parameter(name="__stream_parameters__")
+        response.append(verb)
+
+        head, tail = str(response).split(_PARAMETERS_SLOT)
+        self.mode = mode
+        self._head = head.encode("utf-8")
+        self._tail = tail.encode("utf-8")
+
+    def render(self, parameters: dict = None) -> bytes:
+        """TwiML bytes with `parameters` passed to the stream as customParameters."""
+        if not parameters:
+            return self._head + self._tail
+        elements = "".join(
+            f"<Parameter name={quoteattr(str(name))} value={quoteattr(str(value))} />"
+            for name, value in parameters.items() if value not in (None, "")
+        )
+        return self._head + elements.encode("utf-8") + self._tail
+
+
+@lru_cache(maxsize=None)
+def voice_twiml(mode: str = TWILIO_STREAM_MODE, greeting: str = VOICE_GREETING) -> VoiceTwiml:
+    """Pass greeting=None when the greeting is played on the stream instead of by <Say>."""
+    return VoiceTwiml(mode, greeting=greeting)
+
+
+@lru_cache(maxsize=None)
+def _overflow(response_kind: str) -> bytes:
+    response = VoiceResponse()
+    if response_kind == "hold":
+        response.say(OVERFLOW_HOLD_MESSAGE, voice="Polly.Joanna")
+        response.pause(length=ADMISSION_HOLD_SECONDS)
+        response.redirect(_REDIRECT_SLOT, method="POST")
+    else:
+        response.say(OVERFLOW_CALLBACK_MESSAGE, voice="Polly.Joanna")
+        response.hangup()
+    return str(response).encode("utf-8")
+
+
+def overflow_twiml(response_kind: str, redirect_url: str = None) -> bytes:
+    """
+    TwiML for a call we can't take: "hold" plays the hold message, pauses
+    and sends Twilio back to `redirect_url` to try again; "callback" says
+    we'll call back and hangs up. Rendered once; only the URL is per call.
+    """
+    twiml = _overflow(response_kind)
+    if redirect_url:
+        twiml = twiml.replace(_REDIRECT_SLOT.encode("utf-8"), escape(redirect_url).encode("utf-8"))
+    return twiml
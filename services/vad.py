@@ -0,0 +1,165 @@
+# services/vad.py
+
+import numpy as np
+from services.audio_codec import FRAME_MS, TWILIO_FRAME_BYTES
+from config import (
+    VAD_MODE, VAD_THRESHOLD_DBFS, VAD_MAX_ZCR, VAD_MIN_SPEECH_MS, VAD_HANGOVER_MS,
+    VAD_PREROLL_MS, VAD_THIN_KEEP_EVERY,
+)
+
+VAD_MODES = ("gate", "thin", "pass")
+
+# Frames this far above the energy threshold count as speech whatever their
+# zero-crossing rate (loud fricatives such as "s" cross zero a lot)
+_LOUD_MARGIN = 10.0  # 10 dB in power
+
+
+class VadConfig:
+    """Per-call VAD thresholds; defaults come from config.py."""
+
+    def __init__(self, mode: str = VAD_MODE, threshold_dbfs: float = VAD_THRESHOLD_DBFS,
+                 max_zcr: float = VAD_MAX_ZCR, min_speech_ms: int = VAD_MIN_SPEECH_MS,
+                 hangover_ms: int = VAD_HANGOVER_MS, preroll_ms: int = VAD_PREROLL_MS,
+                 thin_keep_every: int = VAD_THIN_KEEP_EVERY):
+        if mode not in VAD_MODES:
+            raise ValueError(f"Unknown VAD mode {mode!r}, expected one of {VAD_MODES}")
+        self.mode = mode
+        self.threshold_dbfs = threshold_dbfs
+        self.max_zcr = max_zcr
+        self.min_speech_ms = min_speech_ms
+        self.hangover_ms = hangover_ms
+        self.preroll_ms = preroll_ms
+        self.thin_keep_every = thin_keep_every
+
+    @classmethod
+    def from_params(cls, params: dict):
+        """Build from Twilio stream custom parameters, e.g. {"vad_mode": "pass", "vad_threshold_dbfs": "-50"}."""
+        overrides = {}
+        for name, cast in (("mode", str), ("threshold_dbfs", float), ("max_zcr", float),
+                           ("min_speech_ms", int), ("hangover_ms", int), ("preroll_ms", int),
+                           ("thin_keep_every", int)):
+            value = (params or {}).get(f"vad_{name}")
+            if value not in (None, ""):
+                overrides[name] = cast(value)
+        return cls(**overrides)
+
+
+class VoiceActivityGate:
+    """
+    Decides which inbound frames are worth sending to Gemini.
+
+    Speech starts after `min_speech_ms` of speech-like frames and is sent
+    with `preroll_ms` of the audio before it, so word onsets are not
+    clipped. It ends after `hangover_ms` without speech. In "gate" mode
+    silence is not sent at all, "thin" sends one silent frame in N, "pass"
+    sends everything but still reports speech start/end.
+    """
+
+    def __init__(self, config: VadConfig = None):
+        self.config = config or VadConfig()
+        self.threshold_power = (32768 * 10 ** (self.config.threshold_dbfs / 20)) ** 2
+        self.min_frames = max(1, self.config.min_speech_ms // FRAME_MS)
+        self.hangover_frames = max(0, self.config.hangover_ms // FRAME_MS)
+        preroll_frames = max(0, self.config.preroll_ms // FRAME_MS)
+        # Held-back frames: pre-roll plus the onset frames still waiting for confirmation, in a
+        # preallocated ring (one row per frame) where the oldest is overwritten
+        self._held = np.empty((preroll_frames + self.min_frames, TWILIO_FRAME_BYTES), dtype=np.int16)
+        self._held_start = 0
+        self._held_count = 0
+
+        self.in_speech = False
+        self._speech_run = 0
+        self._quiet_run = 0
+        self._silent_seen = 0
+
+        self.frames_in = 0
+        self.frames_forwarded = 0
+        self.segments = 0
+
+    def process(self, samples: np.ndarray):
+        """
+        Feed one 20 ms frame of 8 kHz int16 samples.
+
+        Returns (event, frames): event is "start", "end" or None, and frames
+        is the list of sample arrays to forward, in order (after a "start",
+        before an "end"). Forwarded frames are `samples` itself or views of
+        the held-back ring: use them before the next call.
+        """
+        self.frames_in += 1
+        speech = self.is_speech(samples)
+        mode = self.config.mode
+
+        if self.in_speech:
+            self._quiet_run = 0 if speech else self._quiet_run + 1
+            if self._quiet_run <= self.hangover_frames:
+                return None, self._forward([samples])
+            self.in_speech = False
+            self._speech_run = 0
+            self._held_count = 0
+            return "end", self._forward([samples] if mode == "pass" else [])
+
+        if speech:
+            self._speech_run += 1
+            self._hold(samples)
+            if self._speech_run < self.min_frames:
+                return None, self._forward(self._release() if mode == "pass" else [])
+            self.in_speech = True
+            self._quiet_run = 0
+            self.segments += 1
+            return "start", self._forward(self._release())
+
+        self._speech_run = 0
+        if mode == "pass":
+            return None, self._forward([samples])
+        self._silent_seen += 1
+        if mode == "thin" and self.config.thin_keep_every and self._silent_seen % self.config.thin_keep_every == 0:
+            # Keep a trickle of line audio; anything held back before it is stale now
+            self._held_count = 0
+            return None, self._forward([samples])
+        self._hold(samples)
+        return None, []
+
+    def is_speech(self, samples: np.ndarray) -> bool:
+        """Energy gate, then zero-crossing rate to reject hiss and line noise."""
+        pcm = samples.astype(np.float32)
+        power = np.dot(pcm, pcm) / max(len(pcm), 1)
+        if power < self.threshold_power:
+            return False  # most frames on a call stop here
+        if power >= self.threshold_power * _LOUD_MARGIN:
+            return True
+        negative = np.signbit(samples)
+        zcr = np.count_nonzero(negative[1:] != negative[:-1]) / max(len(samples) - 1, 1)
+        return zcr <= self.config.max_zcr
+
+    def _hold(self, samples: np.ndarray):
+        capacity = len(self._held)
+        if not capacity:
+            return
+        if len(samples) != self._held.shape[1]:
+            # Twilio frames are always 20 ms; re-shape the ring rather than fail if one isn't
+            self._held = np.empty((capacity, len(samples)), dtype=np.int16)
+            self._held_count = 0
+        if self._held_count == capacity:
+            self._held_start = (self._held_start + 1) % capacity
+            self._held_count -= 1
+        self._held[(self._held_start + self._held_count) % capacity] = samples
+        self._held_count += 1
+
+    def _release(self):
+        capacity = len(self._held)
+        frames = [self._held[(self._held_start + i) % capacity] for i in range(self._held_count)]
+        self._held_start = self._held_count = 0
+        return frames
+
+    def _forward(self, frames):
+        self.frames_forwarded += len(frames)
+        return frames
+
+    def summary(self) -> dict:
+        return {
+            "mode": self.config.mode,
+            "frames_in": self.frames_in,
+            "frames_forwarded": self.frames_forwarded,
+            "suppressed_pct": round(100 * (1 - self.frames_forwarded / self.frames_in), 1) if self.frames_in else 0.0,
+            "speech_segments": self.segments,
+        }
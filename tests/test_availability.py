@@ -0,0 +1,27 @@
+# tests/test_availability.py
+
+import asyncio
+import datetime
+import pytest
+from services.booking_service import BookingStore, BookingConflict
+from services.availability import AvailabilityEngine
+
+
+def test_off_grid_booking_blocks_overlapping_slots(tmp_path):
+    store = BookingStore(path=str(tmp_path / "bookings.jsonl"), slot_minutes=30)
+    engine = AvailabilityEngine(store=store, workshops={"north": {"bays": 1}}, slot_minutes=30,
+                                durations={}, default_minutes=30)
+
+    async def scenario():
+        try:
+            await engine.book("+15550001111", "north", "2030-05-06", "09:15")
+            assert engine.free_bays("north", "2030-05-06", "09:00") == []
+            assert engine.free_bays("north", "2030-05-06", "09:30") == []
+            with pytest.raises(BookingConflict):
+                await engine.book("+15550002222", "north", "2030-05-06", "09:30")
+            return engine.next_free_slots("north", datetime.datetime(2030, 5, 6, 8, 0), n=2)
+        finally:
+            await store.close()
+
+    slots = asyncio.run(scenario())
+    assert [s["start"] for s in slots] == ["10:00", "10:30"]
@@ -0,0 +1,110 @@
+# tests/test_booking_service.py
+
+import asyncio
+import json
+import pytest
+from services.booking_service import BookingStore, BookingConflict
+
+
+def _journal(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _run(store, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await store.close()
+    return asyncio.run(main())
+
+
+def _failing_append(lines):
+    raise OSError("disk full")
+
+
+def test_concurrent_reserve_of_same_slot(tmp_path):
+    path = tmp_path / "bookings.jsonl"
+    store = BookingStore(path=str(path), slot_minutes=30)
+
+    async def race():
+        return await asyncio.gather(
+            *(store.reserve(f"+1555000000{i}", "north", "2030-05-06", "09:00", duration_min=60) for i in range(5)),
+            return_exceptions=True,
+        )
+
+    results = _run(store, race())
+    booked = [r for r in results if isinstance(r, dict)]
+    assert len(booked) == 1
+    assert all(isinstance(r, BookingConflict) for r in results if r is not booked[0])
+    assert [r["booking"]["id"] for r in _journal(path)] == [booked[0]["id"]]
+    # An overlapping start is taken too, the next free time isn't
+    assert not store.is_free("north", "2030-05-06", 0, "09:30", 30)
+    assert store.is_free("north", "2030-05-06", 0, "10:00", 30)
+
+
+def test_failed_reserve_write_rolls_back(tmp_path):
+    store = BookingStore(path=str(tmp_path / "bookings.jsonl"), slot_minutes=30)
+    store._append = _failing_append
+
+    with pytest.raises(OSError):
+        _run(store, store.reserve("+15550001111", "north", "2030-05-06", "09:00"))
+    assert store.bookings == {}
+    assert store.is_free("north", "2030-05-06", 0, "09:00", 30)
+    assert store.for_phone("+15550001111") == []
+
+
+def test_failed_cancel_write_keeps_booking(tmp_path):
+    path = tmp_path / "bookings.jsonl"
+    store = BookingStore(path=str(path), slot_minutes=30)
+
+    async def scenario():
+        booking = await store.reserve("+15550001111", "north", "2030-05-06", "09:00")
+        store._append = _failing_append
+        cancel = asyncio.create_task(store.cancel(booking["id"]))
+        # A second caller tries for the same slot while the cancel is being written
+        await asyncio.sleep(0)
+        with pytest.raises(BookingConflict):
+            await store.reserve("+15550002222", "north", "2030-05-06", "09:00")
+        with pytest.raises(OSError):
+            await cancel
+        return booking
+
+    booking = _run(store, scenario())
+    assert store.get(booking["id"]) == booking
+    assert not store.is_free("north", "2030-05-06", 0, "09:00", 30)
+    assert [b["id"] for b in store.for_phone("+15550001111")] == [booking["id"]]
+    assert [r["op"] for r in _journal(path)] == ["reserve"]
+
+
+def test_cancel_frees_slot_once_journaled(tmp_path):
+    path = tmp_path / "bookings.jsonl"
+    store = BookingStore(path=str(path), slot_minutes=30)
+
+    async def scenario():
+        booking = await store.reserve("+15550001111", "north", "2030-05-06", "09:00")
+        await store.cancel(booking["id"])
+        return await store.reserve("+15550002222", "north", "2030-05-06", "09:00")
+
+    rebooked = _run(store, scenario())
+    assert [r["op"] for r in _journal(path)] == ["reserve", "cancel", "reserve"]
+
+    reloaded = BookingStore(path=str(path), slot_minutes=30)
+    reloaded.load()
+    assert list(reloaded.bookings) == [rebooked["id"]]
+
+
+def test_off_grid_start_takes_every_slot_it_touches(tmp_path):
+    store = BookingStore(path=str(tmp_path / "bookings.jsonl"), slot_minutes=30)
+
+    async def scenario():
+        await store.reserve("+15550001111", "north", "2030-05-06", "09:15", duration_min=30)
+        for start in ("09:00", "09:30"):
+            with pytest.raises(BookingConflict):
+                await store.reserve("+15550002222", "north", "2030-05-06", start, duration_min=30)
+        return await store.reserve("+15550002222", "north", "2030-05-06", "10:00", duration_min=30)
+
+    _run(store, scenario())
+    assert not store.is_free("north", "2030-05-06", 0, "09:40", 10)
+    assert store.is_free("north", "2030-05-06", 0, "08:30", 30)
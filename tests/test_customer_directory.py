@@ -0,0 +1,44 @@
+# tests/test_customer_directory.py
+
+import json
+import os
+from services.customer_directory import CustomerDirectory
+
+
+def _write(path, records, mode="w"):
+    with open(path, mode, encoding="utf-8") as f:
+        f.writelines(json.dumps(r) + "\n" for r in records)
+
+
+def _touch_later(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def test_appended_lines_are_indexed(tmp_path):
+    path = tmp_path / "customers.jsonl"
+    _write(path, [{"id": "1", "phone": "+15550001111", "name": "Asha"}])
+    directory = CustomerDirectory(path=str(path))
+    directory.reload()
+
+    _write(path, [{"id": "2", "phone": "+15550002222", "name": "Ravi"}], mode="a")
+    _touch_later(path)
+    directory.reload()
+    assert directory.lookup("+15550002222")["name"] == "Ravi"
+    assert directory.get("1")["name"] == "Asha"
+
+
+def test_in_place_edit_is_picked_up(tmp_path):
+    path = tmp_path / "customers.jsonl"
+    _write(path, [{"id": "1", "phone": "+15550001111", "name": "Asha"},
+                  {"id": "2", "phone": "+15550002222", "name": "Ravi"}])
+    directory = CustomerDirectory(path=str(path))
+    directory.reload()
+
+    # Same inode, same or larger size: rewrite an existing row in place
+    with open(path, "r+", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "1", "phone": "+15550001111", "name": "Bela"}) + "\n")
+    _touch_later(path)
+    directory.reload()
+    assert directory.lookup("+15550001111")["name"] == "Bela"
+    assert directory.get("2")["name"] == "Ravi"
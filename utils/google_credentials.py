@@ -2,25 +2,43 @@
 
 import os
 import base64
+import json
+import logging
+import threading
 
-def setup_google_credentials_from_env():
-    """
-    Decode base64-encoded Google service account credentials from an env variable
-    and set the GOOGLE_APPLICATION_CREDENTIALS path.
-    """
-
-    base64_creds = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_BASE64")
+SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
 
-    if not base64_creds:
-        raise EnvironmentError("❌ GOOGLE_APPLICATION_CREDENTIALS_BASE64 is not set.")
+_credentials = None
+_lock = threading.Lock()
 
-    key_path = "/tmp/service_account.json"
 
-    # Decode and save to a file
-    with open(key_path, "wb") as f:
-        f.write(base64.b64decode(base64_creds))
-
-    # Set GOOGLE_APPLICATION_CREDENTIALS env for Google SDK to pick it up
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = key_path
+def load_google_credentials():
+    """
+    Service account credentials decoded from GOOGLE_APPLICATION_CREDENTIALS_BASE64
+    (or the older GOOGLE_SERVICE_ACCOUNT_BASE64), built once and kept in memory.
 
-    print("✅ Google Application Credentials set from base64.")
+    Returns None when neither variable is set, so the SDK falls back to its
+    default lookup (GOOGLE_APPLICATION_CREDENTIALS file, metadata server, ...).
+    """
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            base64_creds = (os.getenv("GOOGLE_APPLICATION_CREDENTIALS_BASE64")
+                            or os.getenv("GOOGLE_SERVICE_ACCOUNT_BASE64"))
+            if not base64_creds:
+                return None
+            from google.oauth2 import service_account
+            info = json.loads(base64.b64decode(base64_creds))
+            _credentials = service_account.Credentials.from_service_account_info(info, scopes=SCOPES)
+            logging.info("✅ Google service account credentials loaded from base64.")
+        return _credentials
+
+
+def refresh_google_credentials():
+    """Fetch an access token now (blocking) so the first Gemini connect doesn't have to."""
+    credentials = load_google_credentials()
+    if credentials is None:
+        return False
+    from google.auth.transport.requests import Request
+    credentials.refresh(Request())
+    return True